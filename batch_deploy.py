@@ -0,0 +1,230 @@
+import argparse
+import json
+import sys
+import time
+
+import rich
+from rich.console import Console
+
+import http_client
+from config_integrator import CONFIG_SOURCES, ConfigIntegrator
+from deploy_steps import deploy_tasks, load_settings, save_settings, target_dirs
+from instrumentation import dump_files
+from redeploy_planner import plan_redeploy
+from rime_manager import get_manager
+from utils import plan_backup
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BAD_PLAN = 2
+EXIT_INTERRUPTED = 130
+
+ALL_STEPS = [1, 2, 3, 4]
+
+
+def emit(event, **fields):
+    """向标准输出写一行 JSON 进度事件。"""
+    record = {"event": event, "time": round(time.time(), 3), **fields}
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def redirect_consoles():
+    """
+    将各模块的 rich 输出改写到标准错误，标准输出只保留 JSON 事件。
+    """
+    rich.get_console().file = sys.stderr
+    for module in list(sys.modules.values()):
+        console = getattr(module, "console", None)
+        if isinstance(console, Console):
+            console.file = sys.stderr
+
+
+def load_plan(args):
+    """
+    合并配置文件与命令行参数，得到部署计划。命令行参数优先。
+    计划无效时抛出 ValueError。
+    """
+    plan = {}
+    if args.plan:
+        with open(args.plan, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if not isinstance(plan, dict):
+            raise ValueError("计划文件顶层必须是 JSON 对象")
+
+    settings = load_settings()
+    http_client.configure(settings)
+    if args.source:
+        plan["source"] = args.source
+    if args.schemas:
+        plan["schemas"] = [s.strip() for s in args.schemas.split(",") if s.strip()]
+    if args.steps:
+        plan["steps"] = [int(s) for s in args.steps.split(",") if s.strip()]
+    if args.incremental:
+        plan["incremental"] = True
+
+    plan.setdefault("source", settings.get("config_source", "rime-ice"))
+    plan.setdefault("schemas", settings.get("selected_schemas"))
+    plan.setdefault("steps", ALL_STEPS)
+    plan.setdefault("incremental", False)
+
+    if plan["source"] not in CONFIG_SOURCES:
+        raise ValueError(f"未知的配置源: {plan['source']}")
+    if not plan["schemas"] or not all(isinstance(s, str) for s in plan["schemas"]):
+        raise ValueError("必须指定至少一个输入方案 (--schemas)")
+    if not plan["steps"] or any(s not in ALL_STEPS for s in plan["steps"]):
+        raise ValueError(f"步骤只能是 {ALL_STEPS} 中的值")
+    plan["steps"] = sorted(set(plan["steps"]))
+    return plan
+
+
+def dry_run(manager, plan):
+    """
+    只报告每个步骤计划进行的文件操作和传输量，不做任何修改。
+    与实际运行一样覆盖全部目标目录（见 deploy_steps.target_dirs），事件中的 dir 标明目录；
+    上游配置只在主目录下载一次，其它目录从内容存储链接，不计下载量。
+    """
+    primary, *others = target_dirs(manager)
+    integrators = [ConfigIntegrator(d) for d in (primary, *others)]
+
+    for step in plan["steps"]:
+        if step == 1:
+            emit("plan", step=1, action="install_rime")
+            continue
+        for integrator in integrators:
+            config_dir = integrator.rime_config_dir
+            if step == 2:
+                # 快照备份只复制与上次快照不同的文件，其余文件硬链接
+                emit(
+                    "plan",
+                    step=2,
+                    action="backup",
+                    dir=str(config_dir),
+                    **plan_backup(config_dir, shared=integrator.shared_files()),
+                )
+            elif step == 3:
+                base = integrator.plan_base_config(
+                    plan["source"], plan["schemas"], plan.get("selective", True)
+                )
+                if config_dir != primary:
+                    base["download_bytes"] = 0
+                emit(
+                    "plan",
+                    step=3,
+                    action="install_base_config",
+                    dir=str(config_dir),
+                    **base,
+                )
+            elif step == 4:
+                changed = integrator.apply_custom_config(plan["schemas"], dry_run=True)
+                emit(
+                    "plan",
+                    step=4,
+                    action="apply_custom_config",
+                    dir=str(config_dir),
+                    write=changed,
+                )
+
+
+def run(manager, plan):
+    """
+    按计划执行各步骤，互不依赖的步骤并行进行（见 deploy_steps.deploy_tasks）。
+    任一步骤失败即不再开始新的步骤。
+    """
+    settings = load_settings()
+    settings["config_source"] = plan["source"]
+    settings["selected_schemas"] = plan["schemas"]
+    if "selective" in plan:
+        settings["selective_install"] = plan["selective"]
+    save_settings(settings)
+
+    import step_scheduler
+    from step_scheduler import TaskFailed
+
+    try:
+        step_scheduler.run(
+            deploy_tasks(manager, plan["steps"], plan["incremental"]),
+            on_start=lambda task: emit("step_start", step=task.step, task=task.name),
+            on_end=lambda task, seconds: emit(
+                "step_end", step=task.step, task=task.name, seconds=round(seconds, 3)
+            ),
+        )
+    except TaskFailed as e:
+        emit("step_failed", step=e.task.step, task=e.task.name, error=str(e.error))
+        return EXIT_FAILED
+
+    redeploy = plan_redeploy(manager.get_config_dir())
+    emit(
+        "redeploy",
+        needed=redeploy.needed,
+        full=redeploy.full,
+        dicts=sorted(redeploy.stale_dicts),
+        prisms=sorted(redeploy.stale_prisms),
+        configs=sorted(redeploy.stale_configs),
+    )
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py deploy",
+        description="无人值守地执行部署计划，进度以 JSON 行输出到标准输出。",
+    )
+    parser.add_argument("--plan", help="JSON 格式的部署计划文件")
+    parser.add_argument("--source", help=f"配置源: {', '.join(CONFIG_SOURCES)}")
+    parser.add_argument(
+        "--schemas", help="逗号分隔的方案 ID，如 rime_ice,double_pinyin"
+    )
+    parser.add_argument("--steps", help="逗号分隔的步骤编号，默认 1,2,3,4")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Step 03 使用增量更新"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只报告计划的文件操作和传输量"
+    )
+    parser.add_argument("--metrics", help="将各步骤耗时与 I/O 统计写入该 JSON 文件")
+    parser.add_argument("--trace", help="将统计结果以 Chrome trace 格式写入该文件")
+    return parser
+
+
+def main(argv=None):
+    """批量部署入口，返回进程退出码。"""
+    args = build_parser().parse_args(argv)
+    redirect_consoles()
+
+    try:
+        plan = load_plan(args)
+    except (OSError, ValueError) as e:
+        emit("error", error=str(e))
+        return EXIT_BAD_PLAN
+
+    emit("start", plan=plan, dry_run=args.dry_run)
+    start = time.perf_counter()
+    try:
+        manager = get_manager(interactive=False)
+        if args.dry_run:
+            dry_run(manager, plan)
+            code = EXIT_OK
+        else:
+            code = run(manager, plan)
+    except KeyboardInterrupt:
+        emit("error", error="interrupted")
+        return EXIT_INTERRUPTED
+    # 最外层：任何错误都以 error 事件和退出码报告给调用方
+    except Exception as e:  # noqa: BLE001
+        emit("error", error=str(e))
+        return EXIT_FAILED
+    finally:
+        dump_files(args.metrics, args.trace)
+
+    emit(
+        "done",
+        status="ok" if code == EXIT_OK else "failed",
+        seconds=round(time.perf_counter() - start, 3),
+    )
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
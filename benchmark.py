@@ -0,0 +1,389 @@
+"""
+部署流水线基准测试。
+
+生成与 rime-ice / rime-frost 规模相近的合成归档，由本地 HTTP 服务模拟 GitHub
+（可注入延迟、带宽限制和连接中断），依次测量下载、完整安装、增量安装、
+备份与自定义配置同步的耗时、吞吐量和峰值内存；另外在新进程中测量各入口模块的导入耗时。
+
+    python benchmark.py --profile rime-frost --latency 50 --bandwidth 20000 --json out.json
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 合成归档的规模：词典文件数量与解压后的大致总字节数
+PROFILES = {
+    "rime-ice": {"dicts": 120, "bytes": 25 * 1024 * 1024},
+    "rime-frost": {"dicts": 300, "bytes": 60 * 1024 * 1024},
+}
+SCHEMAS = ["rime_ice", "double_pinyin_flypy", "double_pinyin"]
+# 测量导入耗时的入口：命令行入口（只负责分派子命令）、交互菜单、
+# 快速子命令（status / sync）、无人值守部署
+ENTRY_MODULES = ["main", "menu", "quick_commands", "batch_deploy"]
+# 只应在联网或交互时才导入的模块
+HEAVY_MODULES = ["httpx", "h2", "asyncio", "rich.progress", "rich.live"]
+
+
+def generate_archive(path: Path, profile: str, version: int = 0, seed: int = 0):
+    """
+    生成一个 GitHub 风格（带顶层目录）的合成配置归档。
+    不同 version 之间只有 3 个词典文件不同，用于测量增量更新。
+    """
+    spec = PROFILES[profile]
+    rng = random.Random(seed)
+    chars = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    syllables = ["zhong", "guo", "ren", "min", "shu", "ru", "fa", "pin", "yin", "ci"]
+    pool = [
+        "".join(rng.choices(chars, k=n))
+        + "\t"
+        + " ".join(rng.choices(syllables, k=n))
+        + f"\t{rng.randint(1, 10000)}\n"
+        for n in (rng.randint(1, 4) for _ in range(20000))
+    ]
+    lines_per_dict = spec["bytes"] // spec["dicts"] // 30
+
+    top = f"{profile}-main/"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        imports = [f"cn_dicts/d{i:03d}" for i in range(spec["dicts"])]
+        zf.writestr(
+            top + "rime_ice.dict.yaml",
+            "---\nname: rime_ice\nimport_tables:\n"
+            + "".join(f"  - {name}\n" for name in imports)
+            + "...\n",
+        )
+        for schema_id in SCHEMAS:
+            zf.writestr(
+                top + f"{schema_id}.schema.yaml",
+                f"schema:\n  schema_id: {schema_id}\n"
+                "engine:\n  translators:\n    - lua_translator@*date_translator\n"
+                "translator:\n  dictionary: rime_ice\n",
+            )
+        zf.writestr(top + "default.yaml", "schema_list:\n  - schema: rime_ice\n")
+        zf.writestr(top + "lua/date_translator.lua", "return {}\n")
+        for i, name in enumerate(imports):
+            file_rng = random.Random(f"{seed}-{i}-{version if i < 3 else 0}")
+            body = "".join(file_rng.choices(pool, k=lines_per_dict))
+            zf.writestr(top + f"{name}.dict.yaml", f"---\nname: d{i:03d}\n...\n" + body)
+
+
+class FakeGitHub:
+    """
+    在本地端口上提供文件下载，支持 Range / ETag / If-None-Match，
+    并可注入首字节延迟、带宽上限和按概率中断连接。
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, fail_rate=0.0, seed=0):
+        self.files = {}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def publish(self, name, data: bytes):
+        etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+        self.files[name] = (data, etag, formatdate(time.time(), usegmt=True))
+        return f"{self.base_url}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(body=False)
+
+            def do_GET(self):
+                self._serve(body=True)
+
+            def _serve(self, body):
+                fake.requests += 1
+                entry = fake.files.get(self.path.lstrip("/"))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if entry is None:
+                    self.send_error(404)
+                    return
+                data, etag, modified = entry
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                start, end = 0, len(data) - 1
+                rng = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if rng and rng.startswith("bytes=") and if_range in (None, etag):
+                    first, _, last = rng[6:].partition("-")
+                    start = int(first)
+                    end = int(last) if last else end
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{end}/{len(data)}"
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if not body:
+                    return
+
+                payload = memoryview(data)[start : end + 1]
+                cut = len(payload)
+                if fake.fail_rate and fake.rng.random() < fake.fail_rate:
+                    cut = fake.rng.randint(0, len(payload) // 2)
+
+                block = 64 * 1024
+                try:
+                    for offset in range(0, cut, block):
+                        chunk = payload[offset : min(offset + block, cut)]
+                        self.wfile.write(chunk)
+                        fake.bytes_sent += len(chunk)
+                        if fake.bandwidth:
+                            time.sleep(len(chunk) / fake.bandwidth)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                if cut < len(payload):
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+
+        return Handler
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存 (MB)，不支持的平台返回 None。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(name, func, results, size=None):
+    """执行一个基准用例并记录耗时、I/O 统计和峰值内存。"""
+    from instrumentation import recorder
+
+    start = time.perf_counter()
+    with recorder.span(f"bench:{name}") as span:
+        func()
+    seconds = time.perf_counter() - start
+    # 只需要本用例的计数，不保留各次运行的 Span
+    recorder.spans.clear()
+
+    counters = dict(span.counters)
+    moved = size if size is not None else counters.get("bytes_written", 0)
+    result = {
+        "case": name,
+        "seconds": round(seconds, 4),
+        "throughput_mb_s": round(moved / seconds / 1e6, 2) if moved else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **counters,
+    }
+    results.append(result)
+    print(
+        f"{name:<22} {seconds:8.3f}s  "
+        f"{result['throughput_mb_s'] or '-':>8} MB/s  "
+        f"rss {result['peak_rss_mb'] or '-'} MB",
+        file=sys.stderr,
+    )
+
+
+def measure_import(module, repeat=5):
+    """
+    在全新的解释器进程中导入 module，返回导入耗时的中位数（秒）
+    以及导入后已加载的重型模块。
+    """
+    probe = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps([seconds, heavy]))\n"
+    )
+    samples, heavy = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        seconds, heavy = json.loads(output.splitlines()[-1])
+        samples.append(seconds)
+    return statistics.median(samples), heavy
+
+
+def run_import_cases(results, repeat=5):
+    """记录各入口模块的导入耗时，用于发现拖慢启动的导入。"""
+    for module in ENTRY_MODULES:
+        seconds, heavy = measure_import(module, repeat)
+        results.append(
+            {
+                "case": f"import_{module}",
+                "seconds": round(seconds, 4),
+                "heavy_modules": heavy,
+            }
+        )
+        print(
+            f"{'import_' + module:<22} {seconds:8.3f}s  "
+            f"heavy: {', '.join(heavy) or '-'}",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rime 部署流水线基准测试")
+    parser.add_argument("--profile", choices=PROFILES, default="rime-ice")
+    parser.add_argument("--latency", type=float, default=0, help="首字节延迟 (ms)")
+    parser.add_argument("--bandwidth", type=float, help="带宽上限 (KB/s)")
+    parser.add_argument("--fail-rate", type=float, default=0, help="连接中断概率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="将结果写入该 JSON 文件")
+    parser.add_argument(
+        "--import-repeat", type=int, default=5, help="每个入口测量导入耗时的次数"
+    )
+    parser.add_argument(
+        "--imports-only", action="store_true", help="只测量入口模块的导入耗时"
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    run_import_cases(results, args.import_repeat)
+    if args.imports_only:
+        json.dump({"results": results}, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+        return
+
+    import rich
+    from rich.console import Console
+
+    import config_integrator
+    import utils
+    from blob_store import BlobStore
+    from download_cache import DownloadCache
+    from mirror_scheduler import MirrorScheduler
+    from utils import backup_dir
+
+    # 只输出基准结果，关闭各模块的日志和进度条
+    rich.get_console().quiet = True
+    for module in list(sys.modules.values()):
+        console = getattr(module, "console", None)
+        if isinstance(console, Console):
+            console.quiet = True
+
+    work = Path(tempfile.mkdtemp(prefix="rime-bench-"))
+    try:
+        print(f"生成 {args.profile} 规模的合成归档...", file=sys.stderr)
+        v1, v2 = work / "v1.zip", work / "v2.zip"
+        generate_archive(v1, args.profile, version=0, seed=args.seed)
+        generate_archive(v2, args.profile, version=1, seed=args.seed)
+        archive_size = v1.stat().st_size
+        with zipfile.ZipFile(v1) as zf:
+            tree_size = sum(i.file_size for i in zf.infolist())
+
+        # 让基准测试的下载、安装和镜像健康记录都只发生在临时目录中
+        cache = DownloadCache(work / "cache")
+        utils.scheduler = MirrorScheduler(work / "mirrors.json")
+        utils.blobs = config_integrator.blobs = BlobStore(work / "blobs")
+        config_integrator.fetch_cached = cache.fetch
+        config_integrator.CONFIG_SOURCES["bench"] = {"name": "benchmark", "url": ""}
+        rime_dir = work / "Rime"
+        integrator = config_integrator.ConfigIntegrator(rime_dir)
+
+        with FakeGitHub(
+            latency=args.latency / 1000,
+            bandwidth=args.bandwidth * 1024 if args.bandwidth else None,
+            fail_rate=args.fail_rate,
+            seed=args.seed,
+        ) as server:
+            url = server.publish("main.zip", v1.read_bytes())
+            config_integrator.CONFIG_SOURCES["bench"]["url"] = url
+
+            run_case("download_cold", lambda: cache.fetch(url), results, archive_size)
+            run_case("download_revalidate", lambda: cache.fetch(url), results, 0)
+            run_case(
+                "install_full",
+                lambda: integrator.install_base_config("bench"),
+                results,
+                tree_size,
+            )
+            run_case("backup_snapshot", lambda: backup_dir(rime_dir), results)
+            run_case("backup_unchanged", lambda: backup_dir(rime_dir), results)
+
+            server.publish("main.zip", v2.read_bytes())
+            run_case(
+                "install_incremental",
+                lambda: integrator.install_base_config("bench", incremental=True),
+                results,
+            )
+            run_case(
+                "custom_sync_cold",
+                lambda: integrator.apply_custom_config(SCHEMAS),
+                results,
+            )
+            run_case(
+                "custom_sync_warm",
+                lambda: integrator.apply_custom_config(SCHEMAS),
+                results,
+            )
+            network = {"requests": server.requests, "bytes_sent": server.bytes_sent}
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {"profile": args.profile, "args": vars(args), "network": network}
+    report["results"] = results
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+
+
+if __name__ == "__main__":
+    main()
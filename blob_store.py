@@ -0,0 +1,248 @@
+"""
+内容寻址的文件存储。
+
+安装的每个上游文件按 SHA-256 保存一份只读对象，再硬链接到 Rime 目录。
+rime-ice 与 rime-frost 之间、相邻上游版本之间相同的文件因此只占一份磁盘空间，
+切换配置源或回到旧版本时，已有的内容只需建立链接而不必重新写入；
+快照备份和事务式安装的历史版本同样链接到这些对象，保留多个版本的磁盘占用只随差异增长。
+
+对象创建时的大小和 mtime 记录在索引中，不再变化；用户原地修改了某个链接时
+（所有共享该对象的目录都会看到修改）两者不再一致，该对象即不再被当作可共享的原始内容。
+上游中供用户直接编辑的文件（EDITABLE_FILES）不链接，每个目录各自保存一份。
+Windows 上无法把对象设为只读（只读文件不能被替换或删除），不使用存储。
+"""
+
+import errno
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from platformdirs import user_cache_dir
+
+from instrumentation import count
+from materialize import FSYNC, atomic_write
+
+BLOB_DIR = Path(user_cache_dir("rime-auto-deploy")) / "blobs"
+# 只被存储自身引用（链接数为 1）的对象超过该总大小时，从最久未使用的开始清理
+UNREFERENCED_MAX_BYTES = 256 * 1024 * 1024
+# 对象只读，避免原地修改 Rime 目录中的文件时改坏所有共享该内容的版本。
+# Windows 上只读文件无法被替换或删除，对象得不到保护，因此不使用存储
+SUPPORTED = sys.platform != "win32"
+# 上游中用户通常会直接编辑的文件（按文件名匹配），写入普通文件而不链接到存储
+EDITABLE_FILES = ["custom_phrase*.txt", "*.custom.yaml", "user.yaml"]
+# 对象索引：{SHA-256: [大小, 创建时的 mtime_ns, 最近使用时间]}
+INDEX_NAME = "index.json"
+
+
+def is_editable(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in EDITABLE_FILES)
+
+
+class BlobStore:
+    def __init__(self, root: Path = BLOB_DIR, max_unreferenced=UNREFERENCED_MAX_BYTES):
+        self.root = Path(root)
+        self.max_unreferenced = max_unreferenced
+        # 文件系统不支持硬链接（或与 Rime 目录不在同一文件系统）时停用，直接写入
+        self.enabled = SUPPORTED
+        self.index = None
+        self.lock = threading.Lock()
+
+    def _load_index(self):
+        """调用方需持有 self.lock。"""
+        if self.index is not None:
+            return self.index
+        self.index = {}
+        try:
+            with open(self.root / INDEX_NAME, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return self.index
+
+    def _record(self, digest: str, st):
+        with self.lock:
+            self._load_index()[digest] = [st.st_size, st.st_mtime_ns, time.time()]
+
+    def _touch(self, digest: str):
+        """记录最近使用时间（用于清理），不修改对象本身的 mtime。"""
+        with self.lock:
+            entry = self._load_index().get(digest)
+            if entry is not None:
+                entry[2] = time.time()
+
+    def intact(self, digest: str, st=None) -> bool:
+        """对象存在，且大小和 mtime 与创建时记录的一致（没有被原地修改）。"""
+        if st is None:
+            try:
+                st = self.path(digest).stat()
+            except OSError:
+                return False
+        with self.lock:
+            entry = self._load_index().get(digest)
+        return entry is not None and [st.st_size, st.st_mtime_ns] == entry[:2]
+
+    def save_index(self):
+        with self.lock:
+            if self.index is None:
+                return
+            data = json.dumps(self.index, separators=(",", ":")).encode("utf-8")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.root / INDEX_NAME, data, fsync=False)
+        except OSError:
+            pass
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def _commit(self, tmp_path: Path, digest: str) -> bool:
+        """
+        将写好的临时文件放到对象路径上；已有相同且完好的对象时丢弃临时文件。返回是否新增。
+        被原地修改过的对象会被替换，仍链接着它的目录不受影响。
+        """
+        path = self.path(digest)
+        if self.intact(digest):
+            os.unlink(tmp_path)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+        self._record(digest, path.stat())
+        return True
+
+    def _temp(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        return os.fdopen(fd, "wb"), Path(name)
+
+    def put(self, data: bytes, digest: str | None = None) -> str:
+        """将 data 存为对象，返回 SHA-256。"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if self.intact(digest):
+            self._touch(digest)
+            return digest
+        f, tmp_path = self._temp()
+        try:
+            with f:
+                f.write(data)
+                if FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+            if self._commit(tmp_path, digest):
+                count(blobs_added=1, bytes_written=len(data))
+            return digest
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def link(self, digest: str, dest: Path) -> bool:
+        """
+        将对象硬链接为 dest（先链接到临时名再原子替换）。
+        对象不存在或已被修改、dest 是供用户编辑的文件、或无法链接时返回 False，
+        由调用方直接写入；文件系统不支持硬链接时同时停用存储。
+        """
+        blob = self.path(digest)
+        if is_editable(dest.name) or not self.intact(digest):
+            return False
+        tmp_path = dest.with_name(f".{dest.name}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            os.link(blob, tmp_path)
+        except FileNotFoundError:
+            # 对象不在存储中（安装时存储不可用）
+            return False
+        except OSError as e:
+            # 跨文件系统只影响这一个目标目录
+            if e.errno != errno.EXDEV:
+                self.enabled = False
+            return False
+        # 不修改对象的 mtime（会影响所有链接到它的目录），最近使用时间只记在索引中；
+        # 重新部署判断所需的写入时间由安装清单记录
+        self._touch(digest)
+        os.replace(tmp_path, dest)
+        count(files_linked=1)
+        return True
+
+    def write(self, dest: Path, data: bytes, digest: str | None = None) -> str:
+        """通过存储写入 dest，存储不可用时退回普通的原子写入。返回 SHA-256。"""
+        if self.enabled and not is_editable(dest.name):
+            digest = self.put(data, digest)
+            if self.link(digest, dest):
+                return digest
+        atomic_write(dest, data)
+        return digest or hashlib.sha256(data).hexdigest()
+
+    def _linked_stat(self, digest: str | None, path: Path):
+        """path 与该对象是同一 inode 时返回对象的 stat，否则返回 None。"""
+        if not digest:
+            return None
+        try:
+            st, blob_st = path.stat(), self.path(digest).stat()
+        except OSError:
+            return None
+        if (st.st_dev, st.st_ino) != (blob_st.st_dev, blob_st.st_ino):
+            return None
+        return blob_st
+
+    def holds(self, digest: str | None, path: Path) -> bool:
+        """
+        path 是否就是该对象（同一 inode）且对象未被修改，即可安全地直接硬链接。
+        """
+        blob_st = self._linked_stat(digest, path)
+        return blob_st is not None and self.intact(digest, blob_st)
+
+    def trusted(self, digest: str | None, path: Path) -> bool:
+        """
+        增量安装能否相信清单中 path 的内容仍为 digest（调用方已确认 path 存在）：
+        链接到存储的文件要求对象未被修改；单独保存的文件（供用户编辑的文件、
+        存储不可用时写入的文件）沿用清单的记录。
+        """
+        blob_st = self._linked_stat(digest, path)
+        return blob_st is None or self.intact(digest, blob_st)
+
+    def prune(self):
+        """
+        清理不再被任何 Rime 目录、备份或历史版本引用的对象，
+        只保留最近使用的 max_unreferenced 字节，便于来回切换配置源。
+        同时保存对象索引。
+        """
+        if not self.root.exists():
+            return
+        with self.lock:
+            index = self._load_index()
+        unreferenced = []
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                # 中断的写入留下的临时文件
+                if (
+                    sub.name.startswith(".tmp-")
+                    and time.time() - sub.stat().st_mtime > 3600
+                ):
+                    sub.unlink(missing_ok=True)
+                continue
+            for entry in os.scandir(sub):
+                # Windows 上 scandir 的结果不含链接数
+                st = os.stat(entry.path)
+                if st.st_nlink == 1:
+                    digest = sub.name + entry.name
+                    used = index.get(digest, [0, 0, st.st_mtime])[2]
+                    unreferenced.append((used, st.st_size, entry.path, digest))
+        total = sum(size for _, size, _, _ in unreferenced)
+        for _, size, path, digest in sorted(unreferenced):
+            if total <= self.max_unreferenced:
+                break
+            os.unlink(path)
+            with self.lock:
+                index.pop(digest, None)
+            total -= size
+            count(blobs_pruned=1)
+        self.save_index()
+
+
+blobs = BlobStore()
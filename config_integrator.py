@@ -1,117 +1,740 @@
-import shutil
-import tempfile
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
 from pathlib import Path
+
 from rich.console import Console
-from utils import download_file, extract_zip, backup_dir
+
+from blob_store import blobs
+from download_cache import DownloadCache, fetch_cached
+from git_source import GitSource, git_available
+from http_client import lan_cache_url, transfer_errors
+from instrumentation import count, traced
+from materialize import Materializer, atomic_write, copy_file
+from mirror_scheduler import scheduler
+from schema_resolver import SchemaResolver, resolve_schema_files
+from transaction import ConfigTransaction
+from utils import (
+    backup_dir,
+    install_zip,
+    plan_zip,
+    prune_backups,
+    remote_size,
+    unique_backup_path,
+    zip_members,
+)
+from yaml_patch import MergeCache, PatchDocument, write_if_changed
 
 console = Console()
 
+# 记录上次安装的上游文件及其哈希，用于增量更新
+MANIFEST_NAME = ".rime_auto_deploy_manifest.json"
+
+# 将 switches 列表中的第一个元素（通常是 ascii_mode）的重置状态设为 1，即默认英文
+DEFAULT_ENGLISH_KEY = "switches/@0/reset"
+
 CONFIG_SOURCES = {
     "rime-ice": {
         "name": "雾凇拼音 (Rime-Ice)",
         "url": "https://github.com/iDvel/rime-ice/archive/refs/heads/main.zip",
+        "repo": "https://github.com/iDvel/rime-ice.git",
+        "branch": "main",
     },
     "rime-frost": {
         "name": "白霜拼音 (Rime-Frost)",
         "url": "https://github.com/gaboolic/rime-frost/archive/refs/heads/master.zip",
+        "repo": "https://github.com/gaboolic/rime-frost.git",
+        "branch": "master",
     },
 }
 
+# 局域网缓存服务上配置源归档的路径（见 lan_cache.py）
+LAN_SOURCE_PATH = "/sources/{source_id}.zip"
+
+# 用户自定义配置所在目录
+CUSTOM_CONFIG_DIR = Path(__file__).parent / "custom_config"
+
+
+def custom_config_fingerprint(selected_schemas=None, custom_dir=CUSTOM_CONFIG_DIR):
+    """
+    由 custom_config 中各文件的名称、大小、mtime 以及所选方案组成的指纹。
+    与上次同步时记录的指纹相同，说明同步的输入没有变化。
+    """
+    h = hashlib.sha256(",".join(selected_schemas or []).encode("utf-8"))
+    if custom_dir.exists():
+        for item in sorted(custom_dir.iterdir()):
+            if item.is_file():
+                st = item.stat()
+                h.update(f"\0{item.name}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def install_times(old_manifest, files, written):
+    """
+    各文件写入本目录的时间（纳秒）：本次写入的为现在，其余沿用上次的记录。
+    从内容存储链接的文件保留对象创建时的 mtime，可能早于 build/ 中的产物，
+    重新部署判断以这里记录的时间为准（见 redeploy_planner）。
+    """
+    old = (old_manifest or {}).get("installed_at", {})
+    now = time.time_ns()
+    return {
+        rel: now if rel in written else old[rel]
+        for rel in files
+        if rel in written or rel in old
+    }
+
+
+class FetchedSource:
+    """
+    已获取到本地的上游配置：下载缓存中的归档，
+    或（git 模式下）已拉取到本地浅克隆中的提交。
+    """
+
+    def __init__(self, source_id, zip_path=None, git=None, commit=None, sha256=None):
+        self.source_id = source_id
+        self.zip_path = zip_path
+        self.git = git
+        self.commit = commit
+        # 归档的 SHA-256（下载时已计算，未知时为 None）
+        self.sha256 = sha256
+
+
+class FileBackup:
+    """
+    增量更新时，将即将被覆盖或删除的文件备份到带时间戳的
+    {目录名}_partial_backup_{时间} 目录中（第一次需要时才创建）。
+    这些目录只含部分文件，与完整快照分开命名和清理。
+    old_files 为上次安装的清单，仍与内容存储共享对象的文件直接硬链接。
+    """
+
+    def __init__(self, rime_config_dir: Path, old_files, enabled=True):
+        self.rime_config_dir = rime_config_dir
+        self.old_files = old_files
+        self.enabled = enabled
+        self.path = None
+        self.lock = threading.Lock()
+
+    def __call__(self, rel):
+        current = self.rime_config_dir / rel
+        if not self.enabled or not current.exists():
+            return
+        with self.lock:
+            if self.path is None:
+                self.path = unique_backup_path(self.rime_config_dir, "partial_backup")
+                self.path.mkdir(parents=True)
+            dest = self.path / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+        if blobs.holds(self.old_files.get(rel), current):
+            # 内容存储中的只读对象，直接链接
+            dest.unlink(missing_ok=True)
+            os.link(current, dest)
+        else:
+            copy_file(current, dest, fsync=False)
+
+    def report(self):
+        if self.path is not None:
+            console.print(f"[yellow]已将被替换的文件备份至: {self.path}[/yellow]")
+            prune_backups(self.rime_config_dir, kind="partial_backup")
+
 
 class ConfigIntegrator:
-    def __init__(self, rime_config_dir: Path):
+    def __init__(self, rime_config_dir: Path, backup=True):
         self.rime_config_dir = rime_config_dir
+        # 事务式安装时上一版本本身就是备份，无需另外复制
+        self.backup = backup
+
+    @traced("fetch_base_config")
+    def fetch_base_config(
+        self, source_id="rime-ice", fetch_mode="archive", expected_sha256=None
+    ):
+        """
+        下载上游配置（或拉取 git 增量），不读写 Rime 配置目录，
+        因此可以与安装输入法、备份等步骤同时进行。
+        归档在下载过程中即校验完整性；给出 expected_sha256 时内容必须与之一致。
+        """
+        source = CONFIG_SOURCES.get(source_id, CONFIG_SOURCES["rime-ice"])
+        if fetch_mode == "git" and "repo" in source and git_available():
+            git = GitSource(source["repo"], source["branch"])
+            return FetchedSource(source_id, git=git, commit=git.fetch())
+        if fetch_mode == "git":
+            console.print("[yellow]未找到 git 或配置源不支持，改为下载归档。[/yellow]")
+        zip_path, sha256 = self._fetch_archive(source_id, source, expected_sha256)
+        return FetchedSource(source_id, zip_path=zip_path, sha256=sha256)
+
+    @traced("install_base_config")
+    def install_base_config(
+        self,
+        source_id="rime-ice",
+        selected_schemas=None,
+        incremental=False,
+        selective=True,
+        fetch_mode="archive",
+        installed_commit=None,
+        transactional=False,
+        fetched=None,
+    ):
+        """
+        下载上游仓库并安装到 Rime 配置目录。
+        incremental=True 时，如果目录中存在上次安装留下的清单，
+        只写入新增/变化的文件并删除上游已移除的文件。
+        selective=True 且选择了方案时，只安装这些方案依赖的文件。
+        fetch_mode="git" 时通过本地浅克隆只拉取增量对象；
+        installed_commit 与清单记录的提交一致时，只检查两次提交之间变化的文件。
+        transactional=True 时在暂存目录中完成安装后再整体切换，失败时 Rime 目录保持不变。
+        已通过 fetch_base_config 获取过上游配置时，由 fetched 传入，不再重新下载。
+        返回安装的提交 SHA（非 git 模式时为 None）。
+        """
+        if fetched is None:
+            fetched = self.fetch_base_config(source_id, fetch_mode)
+        source_id = fetched.source_id
+
+        if transactional:
+            with ConfigTransaction(self.rime_config_dir) as staged:
+                return ConfigIntegrator(staged, backup=False).install_base_config(
+                    source_id,
+                    selected_schemas,
+                    incremental,
+                    selective,
+                    installed_commit=installed_commit,
+                    fetched=fetched,
+                )
 
-    def install_base_config(self, source_id="rime-ice", selected_schemas=None):
         source = CONFIG_SOURCES.get(source_id, CONFIG_SOURCES["rime-ice"])
         console.print(
             f"[cyan]开始安装/更新 {source['name']} 基础文件到 {self.rime_config_dir}...[/cyan]"
         )
 
-        # 1. 备份现有配置
-        backup_dir(self.rime_config_dir)
-
-        # 确保目录存在
-        self.rime_config_dir.mkdir(parents=True, exist_ok=True)
-
-        # 2. 下载并解压
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            zip_path = temp_path / f"{source_id}.zip"
+        manifest = self.load_manifest() if incremental else None
+        if incremental and manifest is None:
+            console.print("[dim]未找到安装清单，将执行完整安装。[/dim]")
+
+        git, commit = fetched.git, fetched.commit
+        upstream_changed = None
+        if (
+            git is not None
+            and manifest is not None
+            and installed_commit
+            and manifest.get("commit") == installed_commit
+        ):
+            upstream_changed = git.changed_paths(installed_commit, commit)
+            if upstream_changed is not None:
+                console.print(
+                    f"[dim]{installed_commit[:8]}..{commit[:8]}: {len(upstream_changed)} 个文件有变化。[/dim]"
+                )
 
-            console.print(f"[dim]正在通过 GitHub 下载 {source['name']} 配置...[/dim]")
-            download_file(source["url"], zip_path)
+        # 只有 git 模式需要导出归档；下载的归档自带顶层目录，配置源也不一定有 branch
+        prefix = archive_path = None
+        if git is not None:
+            prefix = f"{source_id}-{source['branch']}"
+            archive_path = git.path.with_suffix(".zip")
+        try:
+            if upstream_changed is not None:
+                self._install_git_delta(
+                    git,
+                    commit,
+                    archive_path,
+                    prefix,
+                    source_id,
+                    selected_schemas,
+                    manifest,
+                    selective,
+                    upstream_changed,
+                )
+            else:
+                zip_path = fetched.zip_path
+                if git is not None:
+                    zip_path = git.archive(commit, archive_path, prefix=prefix)
+                self._install_archive(
+                    zip_path, source_id, selected_schemas, manifest, selective, commit
+                )
+        finally:
+            if archive_path is not None:
+                archive_path.unlink(missing_ok=True)
+        if commit is not None:
+            git.pin(commit, source_id)
+
+        console.print(f"[green]{source['name']} 基础文件安装/更新完成。[/green]")
+        if blobs.enabled:
+            console.print(
+                "[dim]从上游安装的文件为只读（与备份和历史版本共享同一份内容），"
+                "个性化修改请放在 custom_config 中。[/dim]"
+            )
 
-            extract_path = temp_path / "extracted"
-            extract_zip(zip_path, extract_path)
+        # 3. 如果用户在 Step 03 选择了模式，生成一个基础配置
+        if selected_schemas:
+            console.print(
+                f"[cyan]正在根据选择初始化方案: {', '.join(selected_schemas)}[/cyan]"
+            )
+            self.write_base_config(selected_schemas)
+        blobs.prune()
+        return commit
+
+    @traced("replicate_base_config")
+    def replicate_base_config(
+        self,
+        primary_dir: Path,
+        selected_schemas=None,
+        incremental=False,
+        transactional=False,
+    ):
+        """
+        将主目录中刚安装的基础配置同步到本目录（多目标部署中的其它 Rime 目录）。
+        不再读取归档和解析方案依赖：按主目录的清单，从内容存储直接硬链接每个文件，
+        目标目录与存储不在同一文件系统时才复制主目录中的文件。
+        incremental、transactional 的含义与 install_base_config 相同。
+        返回主目录安装的提交。
+        """
+        manifest = ConfigIntegrator(primary_dir).load_manifest()
+        if manifest is None:
+            raise RuntimeError(f"{primary_dir} 中没有安装清单，无法同步基础配置")
+
+        if transactional:
+            with ConfigTransaction(self.rime_config_dir) as staged:
+                return ConfigIntegrator(staged, backup=False).replicate_base_config(
+                    primary_dir, selected_schemas, incremental
+                )
 
-            source_dir = next(extract_path.iterdir())
-            if not source_dir.is_dir():
-                source_dir = extract_path
+        console.print(f"[cyan]正在将基础文件同步到 {self.rime_config_dir}...[/cyan]")
+        old_manifest = self.load_manifest()
+        if incremental and old_manifest is None:
+            console.print("[dim]未找到安装清单，将执行完整安装。[/dim]")
+        old_files = (old_manifest or {}).get("files", {})
+        if old_manifest is None or not incremental:
+            # 与完整安装一致：先备份整个目录，之后不再逐个备份
+            if self.backup:
+                backup_dir(self.rime_config_dir, shared=self.shared_files())
+            backup_file = FileBackup(self.rime_config_dir, old_files, enabled=False)
+        else:
+            backup_file = FileBackup(self.rime_config_dir, old_files, self.backup)
+        self.rime_config_dir.mkdir(parents=True, exist_ok=True)
 
-            console.print("[dim]正在将基础文件复制到配置目录...[/dim]")
+        files = manifest["files"]
+
+        def link_member(item):
+            """返回 (相对路径, 是否写入)。"""
+            rel, digest = item
+            dest = self.rime_config_dir / rel
+            if blobs.holds(digest, dest):
+                return rel, False
+            # 增量模式下信任清单（与 _install_incremental 相同）
+            if (
+                incremental
+                and old_files.get(rel) == digest
+                and dest.exists()
+                and blobs.trusted(digest, dest)
+            ):
+                return rel, False
+            backup_file(rel)
+            if not blobs.link(digest, dest):
+                data = (primary_dir / rel).read_bytes()
+                atomic_write(dest, data)
+                count(bytes_written=len(data))
+            count(files_written=1)
+            return rel, True
+
+        with Materializer() as materializer:
+            materializer.makedirs(self.rime_config_dir / rel for rel in files)
+            written = {
+                rel
+                for rel, wrote in materializer.map(link_member, files.items())
+                if wrote
+            }
+
+        removed = [rel for rel in old_files if rel not in files]
+        for rel in removed:
+            backup_file(rel)
+            (self.rime_config_dir / rel).unlink(missing_ok=True)
+        self.save_manifest(
+            manifest["source"],
+            files,
+            manifest.get("commit"),
+            manifest.get("schemas"),
+            install_times(old_manifest, files, written),
+        )
+        blobs.prune()
 
-            try:
-                shutil.copytree(source_dir, self.rime_config_dir, dirs_exist_ok=True)
+        console.print(
+            f"[dim]已写入 {len(written)} 个文件，跳过 {len(files) - len(written)} 个未变化的文件，"
+            f"删除 {len(removed)} 个。[/dim]"
+        )
+        backup_file.report()
+        if selected_schemas:
+            self.write_base_config(selected_schemas)
+        return manifest.get("commit")
+
+    def _install_archive(
+        self,
+        zip_path,
+        source_id,
+        selected_schemas,
+        manifest,
+        selective,
+        commit,
+    ):
+        """按所选方案解析需要的文件，然后执行完整或增量安装。"""
+        include = None
+        if selective and selected_schemas:
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                include = resolve_schema_files(zip_ref, selected_schemas)
+            if include is not None:
                 console.print(
-                    f"[green]{source['name']} 基础文件安装/更新完成。[/green]"
+                    f"[dim]按所选方案解析依赖，需要安装 {len(include)} 个文件。[/dim]"
                 )
-            except Exception as e:
-                console.print(f"[red]复制文件失败: {e}[/red]")
-                raise
 
-        # 3. 如果用户在 Step 03 选择了模式，生成一个基础配置
-        if selected_schemas:
+        # 清单中记录安装时所依据的方案（完整安装为 None），修改方案后据此判断是否需要重新安装
+        schemas = sorted(selected_schemas) if include is not None else None
+        if manifest is not None:
+            self._install_incremental(
+                zip_path, manifest, source_id, include, commit, schemas
+            )
+        else:
+            self._install_full(zip_path, source_id, include, commit, schemas)
+
+    def _install_git_delta(
+        self,
+        git,
+        commit,
+        archive_path,
+        prefix,
+        source_id,
+        selected_schemas,
+        manifest,
+        selective,
+        upstream_changed,
+    ):
+        """
+        git 模式的增量升级：方案依赖直接从本地仓库解析，只导出两次提交之间变化的文件，
+        以及（修改了方案后）新需要的或目录中缺失的文件；
+        其余文件沿用清单中记录的哈希，既不导出也不读取。
+        """
+        old_files = manifest.get("files", {})
+        include = None
+        with git.tree(commit) as tree:
+            if selective and selected_schemas:
+                resolver = SchemaResolver(tree.names, tree.read)
+                include = resolver.resolve(selected_schemas)
+            needed = tree.names if include is None else include
+        if include is not None:
             console.print(
-                f"[cyan]正在根据选择初始化方案: {', '.join(selected_schemas)}[/cyan]"
+                f"[dim]按所选方案解析依赖，需要安装 {len(include)} 个文件。[/dim]"
             )
-            self.write_base_config(selected_schemas)
+
+        carried = {
+            rel: old_files[rel]
+            for rel in needed
+            if rel in old_files
+            and rel not in upstream_changed
+            and (self.rime_config_dir / rel).exists()
+            and blobs.trusted(old_files[rel], self.rime_config_dir / rel)
+        }
+        wanted = set(needed) - set(carried)
+        zip_path = None
+        if wanted:
+            zip_path = git.archive(commit, archive_path, prefix, paths=wanted)
+        schemas = sorted(selected_schemas) if include is not None else None
+        self._install_incremental(
+            zip_path, manifest, source_id, wanted, commit, schemas, carried
+        )
+
+    def plan_base_config(
+        self, source_id="rime-ice", selected_schemas=None, selective=True
+    ):
+        """
+        不下载、不写入，估算 install_base_config 的传输量和文件操作。
+        只有归档已在下载缓存中时才能给出具体的文件列表。
+        """
+        source = CONFIG_SOURCES.get(source_id, CONFIG_SOURCES["rime-ice"])
+        urls = self._source_urls(source_id, source)
+        cache = DownloadCache()
+        zip_path = next(filter(None, map(cache.lookup, urls)), None)
+        plan = {
+            "url": urls[0],
+            "cached": zip_path is not None,
+            # 已缓存时只需一次条件请求，上游未变化则不传输
+            "download_bytes": 0 if zip_path else remote_size(urls[0]),
+        }
+        if zip_path is None:
+            return plan
+
+        include = None
+        if selective and selected_schemas:
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                include = resolve_schema_files(zip_ref, selected_schemas)
+        to_write, write_bytes, skipped, files = plan_zip(
+            zip_path, self.rime_config_dir, include
+        )
+        old_files = (self.load_manifest() or {}).get("files", {})
+        plan.update(
+            write=to_write,
+            write_bytes=write_bytes,
+            skip=skipped,
+            delete=sorted(rel for rel in old_files if rel not in files),
+        )
+        return plan
+
+    def _source_urls(self, source_id, source):
+        """配置了局域网缓存时优先从缓存服务获取，其次是上游地址。"""
+        urls = [source["url"]]
+        lan = lan_cache_url()
+        if lan and source_id in CONFIG_SOURCES:
+            urls.insert(0, lan + LAN_SOURCE_PATH.format(source_id=source_id))
+        return urls
+
+    def _fetch_archive(self, source_id, source, expected_sha256=None):
+        """
+        依次尝试局域网缓存和上游，返回下载缓存中的归档路径及其 SHA-256。
+        最近连续失败（已熔断）的局域网缓存会被直接跳过，
+        返回内容校验失败的局域网缓存同样回退到上游。
+        """
+        *lan_urls, upstream = self._source_urls(source_id, source)
+        for url in lan_urls:
+            if scheduler.is_open(url):
+                continue
+            console.print(f"[dim]正在从局域网缓存获取 {source['name']} 配置...[/dim]")
+            try:
+                return self._cached_with_digest(url, expected_sha256)
+            except transfer_errors() as e:
+                console.print(f"[yellow]局域网缓存不可用，改为从上游下载: {e}[/yellow]")
+
+        console.print(f"[dim]正在通过 GitHub 下载 {source['name']} 配置...[/dim]")
+        return self._cached_with_digest(upstream, expected_sha256)
+
+    @staticmethod
+    def _cached_with_digest(url, expected_sha256=None):
+        """下载（或复用缓存），返回路径和下载时记录在该缓存索引中的 SHA-256。"""
+        path = fetch_cached(url, expected_sha256)
+        return path, DownloadCache(path.parent).sha256(url)
+
+    def _install_full(
+        self, zip_path: Path, source_id, include=None, commit=None, schemas=None
+    ):
+        """
+        完整安装：备份整个目录，然后将归档成员直接写入配置目录。
+        上次安装过、但新归档中已不存在的文件会被删除（例如切换了配置源）。
+        """
+        old_manifest = self.load_manifest() or {}
+
+        # 1. 备份现有配置
+        if self.backup:
+            backup_dir(self.rime_config_dir, shared=self.shared_files())
+
+        # 确保目录存在
+        self.rime_config_dir.mkdir(parents=True, exist_ok=True)
+
+        # 2. 直接从 Zip 流式写入，无需先解压到临时目录
+        console.print("[dim]正在将基础文件写入配置目录...[/dim]")
+        written = set()
+        files = install_zip(zip_path, self.rime_config_dir, include, written)
+        for rel in old_manifest.get("files", {}):
+            if rel not in files:
+                (self.rime_config_dir / rel).unlink(missing_ok=True)
+        self.save_manifest(
+            source_id,
+            files,
+            commit,
+            schemas,
+            install_times(old_manifest, files, written),
+        )
+
+    def _install_incremental(
+        self,
+        zip_path: Path,
+        manifest,
+        source_id,
+        include=None,
+        commit=None,
+        schemas=None,
+        carried=None,
+    ):
+        """
+        增量安装：对比清单中的哈希，只写入变化的文件。
+        carried 为已知未变化、不需要从归档读取的文件及其哈希（git 增量升级），
+        此时 zip_path 只包含其余文件，也可以为 None。
+        被覆盖或删除的文件会先备份到带时间戳的目录中。
+        """
+        old_files = manifest.get("files", {})
+        new_files = dict(carried or {})
+        added, changed = [], []
+        backup_file = FileBackup(self.rime_config_dir, old_files, self.backup)
+
+        def install_member(member):
+            """返回 (相对路径, SHA-256, 是否写入)。"""
+            rel, info = member
+            dest = self.rime_config_dir / rel
+            data = zip_ref.read(info)
+            digest = hashlib.sha256(data).hexdigest()
+            if (
+                old_files.get(rel) == digest
+                and dest.exists()
+                and blobs.trusted(digest, dest)
+            ):
+                return rel, digest, False
+
+            backup_file(rel)
+            blobs.write(dest, data, digest)
+            count(files_written=1)
+            return rel, digest, True
+
+        with contextlib.ExitStack() as stack:
+            materializer = stack.enter_context(Materializer())
+            members = []
+            if zip_path is not None:
+                zip_ref = stack.enter_context(zipfile.ZipFile(zip_path, "r"))
+                members = [
+                    (rel, info)
+                    for rel, info in zip_members(zip_ref)
+                    if include is None or rel in include
+                ]
+            materializer.makedirs(self.rime_config_dir / rel for rel, _ in members)
+            for rel, digest, wrote in materializer.map(install_member, members):
+                new_files[rel] = digest
+                if wrote:
+                    (changed if rel in old_files else added).append(rel)
+
+        # 只删除上次由本工具安装、且上游已移除（或所选方案不再需要）的文件，
+        # 用户自己的文件不受影响
+        removed = [rel for rel in old_files if rel not in new_files]
+        for rel in removed:
+            backup_file(rel)
+            (self.rime_config_dir / rel).unlink(missing_ok=True)
+
+        self.save_manifest(
+            source_id,
+            new_files,
+            commit,
+            schemas,
+            install_times(manifest, new_files, {*added, *changed}),
+        )
+
+        console.print(
+            f"[dim]增量更新: 新增 {len(added)}，修改 {len(changed)}，删除 {len(removed)} 个文件。[/dim]"
+        )
+        backup_file.report()
+
+    def shared_files(self):
+        """
+        已安装文件中仍与内容存储共享完好对象的 {相对路径: SHA-256}，
+        备份时可以直接硬链接（被替换或原地修改过的文件不在其中）。
+        """
+        files = (self.load_manifest() or {}).get("files", {})
+        return {
+            rel: digest
+            for rel, digest in files.items()
+            if blobs.holds(digest, self.rime_config_dir / rel)
+        }
+
+    def base_outdated(self, source_id, selected_schemas):
+        """
+        已安装的基础文件是否缺少 source_id 下 selected_schemas 需要的文件：
+        配置源不同，或上次按方案安装时没有包含其中某些方案。
+        此时只同步自定义配置会让 default.custom.yaml 引用不存在的方案，需要先重新执行 Step 03。
+        没有安装清单（未通过本工具安装基础配置）时返回 False。
+        """
+        manifest = self.load_manifest()
+        if manifest is None:
+            return False
+        if manifest.get("source") != source_id:
+            return True
+        # 旧版本的清单没有记录方案，无法确认包含了哪些方案的文件
+        if "schemas" not in manifest:
+            return True
+        installed = manifest["schemas"]
+        return installed is not None and not set(selected_schemas or []) <= set(
+            installed
+        )
+
+    def load_manifest(self):
+        """
+        读取上次安装记录的文件清单，不存在或损坏时返回 None。
+        """
+        manifest_path = self.rime_config_dir / MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(
+        self, source_id, files, commit=None, schemas=None, installed_at=None
+    ):
+        """
+        记录本次安装的每个文件的 SHA-256，以及（git 模式下）对应的提交。
+        schemas 为按方案安装时所依据的方案列表，完整安装时为 None；
+        installed_at 为各文件写入的时间，见 install_times。
+        """
+        manifest_path = self.rime_config_dir / MANIFEST_NAME
+        # 原子替换：清单可能与历史版本共享硬链接，不能原地改写
+        data = json.dumps(
+            {
+                "source": source_id,
+                "commit": commit,
+                "files": files,
+                "schemas": schemas,
+                "installed_at": installed_at or {},
+            },
+            ensure_ascii=False,
+            indent=1,
+            sort_keys=True,
+        )
+        atomic_write(manifest_path, data.encode("utf-8"))
 
     def write_base_config(self, selected_schemas):
         """
         在下载完仓库后，立即生成一个最基础的 default.custom.yaml。
         """
         dest_path = self.rime_config_dir / "default.custom.yaml"
-        schemas_yaml = "\n".join([f"    - schema: {s}" for s in selected_schemas])
-
-        content = f"""patch:
-  "menu/page_size": 9
-  schema_list:
-{schemas_yaml}
-"""
-        with open(dest_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        console.print(f"[dim]已生成基础方案配置文件: {dest_path.name}[/dim]")
-
-    def apply_custom_config(self, selected_schemas=None):
+        doc = PatchDocument()
+        doc.set("menu/page_size", 9)
+        doc.set("schema_list", [{"schema": s} for s in selected_schemas])
+        if write_if_changed(dest_path, doc.dump()):
+            console.print(f"[dim]已生成基础方案配置文件: {dest_path.name}[/dim]")
+
+    @traced("apply_custom_config")
+    def apply_custom_config(self, selected_schemas=None, dry_run=False, only=None):
         """
         将项目根目录下 custom_config 文件夹内的所有配置文件同步到 Rime 目录。
-        如果包含 default.custom.yaml，则自动注入 schema_list。
+        如果包含 default.custom.yaml，则自动注入 schema_list；
+        选中方案的 *.custom.yaml 会合并默认英文设置。
+        内容与 Rime 目录中一致的文件不会被重写，以免触发不必要的重新部署。
+        only 为 custom_config 中的文件名集合时只同步这些文件（监视模式使用），不输出汇总。
+        返回发生变化的目标文件名列表；dry_run=True 时只计算、不写入。
         """
         import sys
 
-        project_root = Path(__file__).parent
-        local_custom_dir = project_root / "custom_config"
+        local_custom_dir = CUSTOM_CONFIG_DIR
 
         if not local_custom_dir.exists():
-            local_custom_dir.mkdir(parents=True, exist_ok=True)
-            console.print(f"[yellow]提示: 已创建 {local_custom_dir} 目录。[/yellow]")
-            return
-
-        console.print(
-            f"\n[cyan]正在同步本地 {local_custom_dir.name} 执行配置部署...[/cyan]"
-        )
+            if not dry_run:
+                local_custom_dir.mkdir(parents=True, exist_ok=True)
+                console.print(
+                    f"[yellow]提示: 已创建 {local_custom_dir} 目录。[/yellow]"
+                )
+            return []
 
-        # 构建要注入的 YAML 字符串
-        schemas_yaml = ""
-        if selected_schemas:
-            schemas_yaml = "  schema_list:\n" + "\n".join(
-                [f"    - schema: {s}" for s in selected_schemas]
+        if only is None and not dry_run:
+            console.print(
+                f"\n[cyan]正在同步本地 {local_custom_dir.name} 执行配置部署...[/cyan]"
             )
 
+        if not dry_run:
+            self.rime_config_dir.mkdir(parents=True, exist_ok=True)
+        selected_schemas = selected_schemas or []
+        schema_patches = {f"{s}.custom.yaml" for s in selected_schemas}
+        cache = MergeCache(self.rime_config_dir)
+        merge_params = ",".join(selected_schemas)
+
         try:
-            count = 0
-            for item in local_custom_dir.iterdir():
+            processed = 0
+            synced = set()
+            changed = []
+            jobs = []
+            for item in sorted(local_custom_dir.iterdir()):
                 if item.is_file() and item.suffix in [".yaml", ".yml"]:
                     # 1. 平台过滤
                     if sys.platform == "win32" and "squirrel.custom" in item.name:
@@ -131,71 +754,94 @@ class ConfigIntegrator:
                         dest_name = dest_name[:-3] + "yaml"
 
                     dest_path = self.rime_config_dir / dest_name
+                    synced.add(dest_name)
+                    processed += 1
+                    if only is not None and item.name not in only:
+                        continue
 
-                    content = ""
-                    with open(item, "r", encoding="utf-8") as f:
-                        content = f.read()
-
-                    # 3. 如果是 default.custom 且用户选了方案，尝试注入
-                    if "default.custom" in item.name and selected_schemas:
-                        if "schema_list:" not in content:
-                            # 在 patch: 后面注入
-                            if "patch:" in content:
-                                content = content.replace(
-                                    "patch:", f"patch:\n{schemas_yaml}"
-                                )
-                                console.print(
-                                    f"[dim]已在 {item.name} 中自动注入当前勾选的方案[/dim]"
-                                )
-                            else:
-                                content = f"patch:\n{schemas_yaml}\n" + content
-
-                    with open(dest_path, "w", encoding="utf-8") as f:
-                        f.write(content)
-
+                    key = cache.key(item, merge_params)
+                    if cache.fresh(dest_path, key):
+                        console.print(f" [dim]-[/dim] 未变化: [dim]{dest_name}[/dim]")
+                        continue
+                    jobs.append((item, dest_name, dest_path, key))
+
+            def sync_file(job):
+                """合并并写入一个文件，返回 (是否写入, 是否注入了方案列表)。"""
+                item, dest_name, dest_path, _ = job
+                with open(item, "r", encoding="utf-8") as f:
+                    content = f.read()
+
+                # 3. 需要合并的文件解析为数据后再注入，其余文件原样复制
+                injected = False
+                is_default = dest_name == "default.custom.yaml"
+                if (is_default and selected_schemas) or dest_name in schema_patches:
+                    doc = PatchDocument(content)
+                    if is_default:
+                        injected = doc.setdefault(
+                            "schema_list", [{"schema": s} for s in selected_schemas]
+                        )
+                    if dest_name in schema_patches:
+                        doc.setdefault(DEFAULT_ENGLISH_KEY, 1)
+                    content = doc.dump()
+                return write_if_changed(dest_path, content, dry_run=dry_run), injected
+
+            # 各文件的读取、合并与写入并发进行，输出和缓存记录按原顺序处理
+            with Materializer() as materializer:
+                results = list(materializer.map(sync_file, jobs))
+            for (item, dest_name, dest_path, key), (wrote, injected) in zip(
+                jobs, results
+            ):
+                if injected and not dry_run:
                     console.print(
-                        f" [green]√[/green] 已同步到 Rime: [bold]{dest_name}[/bold]"
+                        f"[dim]已在 {item.name} 中自动注入当前勾选的方案[/dim]"
                     )
-                    count += 1
+                if wrote:
+                    changed.append(dest_name)
+                    if not dry_run:
+                        console.print(
+                            f" [green]√[/green] 已同步到 Rime: [bold]{dest_name}[/bold]"
+                        )
+                else:
+                    console.print(f" [dim]-[/dim] 未变化: [dim]{dest_name}[/dim]")
+                if not dry_run:
+                    cache.record(dest_path, key)
 
             # 4. 确保每个选中的方案都有默认英文 patch
-            if selected_schemas:
-                for schema_id in selected_schemas:
-                    self._ensure_default_english(schema_id)
-
+            for schema_id in selected_schemas:
+                if f"{schema_id}.custom.yaml" not in synced:
+                    if self._ensure_default_english(schema_id, cache, dry_run):
+                        changed.append(f"{schema_id}.custom.yaml")
+
+            if dry_run:
+                return changed
+            cache.save()
+            if only is not None:
+                return changed
             console.print(
-                f"\n[bold green]自定义配置同步完成！共处理 {count} 个文件。[/bold green]"
+                f"\n[bold green]自定义配置同步完成！共处理 {processed} 个文件。[/bold green]"
             )
             console.print(
                 "[dim]提示: 请稍后在任务栏 Rime 图标上选择“部署/重新部署”以使配置生效。[/dim]\n"
             )
+            return changed
         except Exception as e:
             console.print(f"[red]同步自定义配置失败: {e}[/red]")
             raise
 
-    def _ensure_default_english(self, schema_id):
+    def _ensure_default_english(self, schema_id, cache=None, dry_run=False):
         """
-        为指定方案注入默认英文配置。
+        为指定方案注入默认英文配置，返回 True 表示文件发生了变化。
         """
         dest_path = self.rime_config_dir / f"{schema_id}.custom.yaml"
-        patch_content = '  # 找到 switches 列表中的第一个元素（通常是 ascii_mode），将其重置状态设为 1\n  "switches/@0/reset": 1'
-
-        content = ""
-        if dest_path.exists():
-            with open(dest_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
-        if '"switches/@0/reset": 1' in content:
-            return
-
-        if not content.strip():
-            content = f"patch:\n{patch_content}\n"
-        elif "patch:" in content:
-            # 在 patch: 后面注入，保持 yaml 层级
-            content = content.replace("patch:", f"patch:\n{patch_content}")
-        else:
-            content = f"patch:\n{patch_content}\n" + content
-
-        with open(dest_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        console.print(f"[dim]已在 {schema_id}.custom.yaml 中注入默认英文配置[/dim]")
+        key = MergeCache.key(None, DEFAULT_ENGLISH_KEY)
+        if cache is not None and cache.fresh(dest_path, key):
+            return False
+
+        doc = PatchDocument.load(dest_path)
+        changed = doc.setdefault(DEFAULT_ENGLISH_KEY, 1)
+        if changed and not dry_run:
+            write_if_changed(dest_path, doc.dump())
+            console.print(f"[dim]已在 {schema_id}.custom.yaml 中注入默认英文配置[/dim]")
+        if cache is not None and not dry_run:
+            cache.record(dest_path, key)
+        return changed
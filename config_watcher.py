@@ -0,0 +1,269 @@
+"""
+监视模式：custom_config 中的文件保存后自动同步到 Rime 目录。
+
+    python main.py watch [--poll] [--debounce 0.3]
+
+Linux 上使用 inotify，空闲时进程阻塞在内核中，不占用 CPU；其它平台每秒检查一次
+文件的大小和修改时间。连续的保存（编辑器先写临时文件再重命名等）在安静 debounce 秒后
+合并为一次同步，且只重新合并发生变化的文件。settings.json 中的方案变化时重新同步全部文件。
+"""
+
+import argparse
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+
+from config_integrator import (
+    CUSTOM_CONFIG_DIR,
+    ConfigIntegrator,
+    custom_config_fingerprint,
+)
+from deploy_steps import finish_deploy, target_dirs
+from rime_manager import get_manager
+from settings_store import store
+
+console = Console()
+
+# 最后一次文件变化后等待多久再同步（秒）
+DEBOUNCE = 0.3
+# 轮询模式下两次检查的间隔（秒）
+POLL_INTERVAL = 1.0
+
+# inotify 事件：写入后关闭、移入/移出（重命名保存）、删除
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_custom_file(name: str) -> bool:
+    return name.endswith((".yaml", ".yml")) and not name.startswith(".")
+
+
+class InotifyWatcher:
+    """
+    通过 ctypes 调用 Linux inotify。targets 为 {目录: 文件名过滤函数}。
+    """
+
+    def __init__(self, targets):
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.dirs = {}
+        for directory, accept in targets.items():
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), WATCH_MASK
+            )
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"无法监视 {directory}")
+            self.dirs[wd] = (Path(directory), accept)
+
+    def wait(self, timeout=None):
+        """等待文件变化，返回变化的路径集合；超时返回空集合。"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, _mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = (
+                data[offset : offset + length]
+                .rstrip(b"\0")
+                .decode("utf-8", "surrogateescape")
+            )
+            offset += length
+            if wd in self.dirs and name:
+                directory, accept = self.dirs[wd]
+                if accept(name):
+                    changed.add(directory / name)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    定期比较目录中文件的大小和修改时间，用于不支持 inotify 的平台。
+    """
+
+    def __init__(self, targets, interval=POLL_INTERVAL):
+        self.targets = {Path(d): accept for d, accept in targets.items()}
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for directory, accept in self.targets.items():
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if accept(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    snapshot[directory / entry.name] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = (
+                self.interval
+                if deadline is None
+                else min(self.interval, deadline - time.monotonic())
+            )
+            if remaining > 0:
+                time.sleep(remaining)
+            current = self._scan()
+            changed = {
+                path
+                for path in current.keys() | self.snapshot.keys()
+                if current.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = current
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(targets, poll=False):
+    """Linux 上优先使用 inotify，失败或其它平台时退回轮询。"""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(targets)
+        except (OSError, AttributeError) as e:
+            console.print(f"[dim]inotify 不可用，改为轮询: {e}[/dim]")
+    return PollingWatcher(targets)
+
+
+def collect_changes(watcher, debounce=DEBOUNCE):
+    """阻塞到第一次变化，再等待 debounce 秒内没有新的变化，返回合并后的路径集合。"""
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+class ConfigWatcher:
+    def __init__(self, manager, debounce=DEBOUNCE, poll=False):
+        self.manager = manager
+        self.config_dirs = target_dirs(manager)
+        self.debounce = debounce
+        self.poll = poll
+        self.selected = store.load().get("selected_schemas")
+
+    def sync(self, only=None):
+        """
+        将 custom_config 同步到每个目标目录（only 为文件名集合时只同步这些文件），
+        出错时继续监视。
+        """
+        changed = False
+        try:
+            fingerprint = custom_config_fingerprint(self.selected)
+            for config_dir in self.config_dirs:
+                integrator = ConfigIntegrator(config_dir)
+                if integrator.apply_custom_config(self.selected, only=only):
+                    changed = True
+                store.record_sync(config_dir, fingerprint)
+        # 监视进程长期运行，一次同步失败不应使其退出
+        except Exception as e:  # noqa: BLE001
+            console.print(f"[red]同步失败，等待下一次修改: {e}[/red]")
+            return
+        if changed:
+            finish_deploy(self.manager)
+
+    def handle(self, changed):
+        """根据变化的文件决定同步范围。"""
+        if any(path.name == store.path.name for path in changed):
+            selected = store.load().get("selected_schemas")
+            if selected != self.selected:
+                self.selected = selected
+                console.print(
+                    f"[cyan]方案已变为 {', '.join(selected or [])}，重新同步全部文件。[/cyan]"
+                )
+                self.sync()
+                return
+
+        names = {
+            path.name
+            for path in changed
+            if path.parent == CUSTOM_CONFIG_DIR and path.exists()
+        }
+        if names:
+            console.print(
+                f"[dim]{time.strftime('%H:%M:%S')} 检测到修改: {', '.join(sorted(names))}[/dim]"
+            )
+            self.sync(only=names)
+
+    def run(self):
+        CUSTOM_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        fingerprint = custom_config_fingerprint(self.selected)
+        if any(store.last_sync(d) != fingerprint for d in self.config_dirs):
+            self.sync()
+
+        watcher = make_watcher(
+            {
+                CUSTOM_CONFIG_DIR: is_custom_file,
+                store.path.parent: lambda name: name == store.path.name,
+            },
+            self.poll,
+        )
+        console.print(
+            f"[green]正在监视 {CUSTOM_CONFIG_DIR}（{type(watcher).__name__}），"
+            "保存后自动同步，Ctrl-C 退出。[/green]"
+        )
+        try:
+            while True:
+                self.handle(collect_changes(watcher, self.debounce))
+        finally:
+            watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py watch",
+        description="监视 custom_config，文件保存后自动同步到 Rime 目录。",
+    )
+    parser.add_argument(
+        "--poll", action="store_true", help="不使用 inotify，改为定期检查文件"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE,
+        help="最后一次修改后等待多久再同步（秒）",
+    )
+    args = parser.parse_args(argv)
+
+    if not store.load().get("selected_schemas"):
+        console.print(
+            "[red]尚未选择输入方案，请先运行 `python main.py` 完成初始设置。[/red]"
+        )
+        return 2
+    try:
+        ConfigWatcher(get_manager(), args.debounce, args.poll).run()
+    except KeyboardInterrupt:
+        console.print("\n[yellow]已停止监视。[/yellow]")
+    return 0
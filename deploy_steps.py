@@ -0,0 +1,266 @@
+"""
+部署各步骤的实现与任务依赖图，交互菜单、无人值守部署和快速子命令共用。
+不导入交互提示和面板，子命令导入本模块时不会加载菜单用到的模块。
+"""
+
+import os
+from pathlib import Path
+
+from rich.console import Console
+
+from config_integrator import ConfigIntegrator, custom_config_fingerprint
+from instrumentation import traced
+from redeploy_planner import plan_redeploy
+from settings_store import store
+from utils import file_sha256
+
+console = Console()
+
+
+def load_settings():
+    """返回设置的副本（进程内缓存，文件变化时才重新读取）"""
+    return store.load()
+
+
+def save_settings(settings):
+    """保存设置到本地文件"""
+    try:
+        store.save(settings)
+    except OSError as e:
+        console.print(f"[red]保存设置失败: {e}[/red]")
+
+
+def target_dirs(manager):
+    """
+    需要部署的全部 Rime 目录：输入法管理器给出的目录（第一个为主目录，
+    Linux 上还包括其它已在使用 Rime 的框架），以及 settings.json 中
+    extra_targets 列出的目录（如手机端输入法的同步文件夹）。
+    """
+    dirs = list(manager.get_config_dirs())
+    dirs += [Path(d).expanduser() for d in load_settings().get("extra_targets", [])]
+    return list(dict.fromkeys(Path(os.path.abspath(d)) for d in dirs))
+
+
+@traced("step_01")
+def run_step_01(manager):
+    """Step 01: 安装 Rime 输入法"""
+    console.print("\n[bold]Step 01: 安装 Rime 输入法[/bold]")
+    try:
+        manager.install_rime()
+        console.print(
+            "[yellow]提示: 请确保已将 Rime 设置为系统输入法（Windows 可能需要注销并重新登录）。[/yellow]"
+        )
+    except Exception as e:
+        console.print(f"[red]安装发生错误: {e}[/red]")
+        raise
+
+
+@traced("step_02")
+def run_step_02(manager, config_dir=None):
+    """Step 02: 备份 Rime 默认配置"""
+    console.print("\n[bold]Step 02: 备份 Rime 默认配置[/bold]")
+    try:
+        config_dir = config_dir or manager.get_config_dir()
+        from utils import BACKUP_KEEP, backup_dir
+
+        settings = load_settings()
+        backup_dir(
+            config_dir,
+            keep=settings.get("backup_keep", BACKUP_KEEP),
+            keep_days=settings.get("backup_keep_days"),
+            shared=ConfigIntegrator(config_dir).shared_files(),
+        )
+    except Exception as e:
+        console.print(f"[red]备份发生错误: {e}[/red]")
+        raise
+
+
+def run_download(manager):
+    """下载 Step 03 所需的上游配置，不修改 Rime 目录"""
+    settings = load_settings()
+    source_id = settings.get("config_source", "rime-ice")
+    integrator = ConfigIntegrator(manager.get_config_dir())
+    try:
+        return integrator.fetch_base_config(
+            source_id=source_id,
+            fetch_mode=settings.get("fetch_mode", "archive"),
+            expected_sha256=settings.get("trusted_digests", {}).get(source_id),
+        )
+    except Exception as e:
+        console.print(f"[red]配置下载失败: {e}[/red]")
+        raise
+
+
+@traced("step_03")
+def run_step_03(manager, incremental=False, fetched=None):
+    """Step 03: 自动安装 Rime 配置 (拉取上游仓库)"""
+    settings = load_settings()
+    source_id = settings.get("config_source", "rime-ice")
+
+    console.print(f"\n[bold]Step 03: 自动安装 {source_id} 配置 (拉取上游仓库)[/bold]")
+    manager.stop_rime()
+    if fetched is None:
+        fetched = run_download(manager)
+    config_dir = manager.get_config_dir()
+    integrator = ConfigIntegrator(config_dir)
+    selected = settings.get("selected_schemas")
+    try:
+        commit = integrator.install_base_config(
+            source_id=source_id,
+            selected_schemas=selected,
+            incremental=incremental,
+            selective=settings.get("selective_install", True),
+            installed_commit=store.installed(source_id).get("commit"),
+            transactional=settings.get("transactional_install", False),
+            fetched=fetched,
+        )
+    except Exception as e:
+        console.print(f"[red]配置下载失败: {e}[/red]")
+        raise
+
+    # 记录已安装的提交与归档摘要，下次升级时只检查两次提交之间变化的文件。
+    # 摘要在下载时已经算好，只有旧版本的下载缓存才需要重新读取归档
+    archive_sha256 = fetched.sha256
+    if archive_sha256 is None and fetched.zip_path:
+        archive_sha256 = file_sha256(fetched.zip_path)
+    store.record_install(source_id, commit=commit, archive_sha256=archive_sha256)
+
+
+@traced("step_03_replicate")
+def run_replicate(manager, config_dir, incremental=False):
+    """Step 03（其它目标）: 将主目录中安装好的基础配置同步到 config_dir"""
+    settings = load_settings()
+    try:
+        ConfigIntegrator(config_dir).replicate_base_config(
+            manager.get_config_dir(),
+            settings.get("selected_schemas"),
+            incremental=incremental,
+            transactional=settings.get("transactional_install", False),
+        )
+    except Exception as e:
+        console.print(f"[red]同步基础配置到 {config_dir} 失败: {e}[/red]")
+        raise
+
+
+@traced("step_04")
+def run_step_04(manager, config_dir=None):
+    """Step 04: 同步自定义配置文件 (从本地 custom_config 目录)"""
+    console.print(
+        "\n[bold]Step 04: 同步自定义配置文件 (从本地 custom_config 目录)[/bold]"
+    )
+
+    # 自动获取已保存的方案，尚未设定时才询问
+    selected = load_settings().get("selected_schemas")
+    if not selected:
+        from menu import select_schemas
+
+        selected = select_schemas()
+
+    config_dir = config_dir or manager.get_config_dir()
+    integrator = ConfigIntegrator(config_dir)
+    try:
+        fingerprint = custom_config_fingerprint(selected)
+        integrator.apply_custom_config(selected_schemas=selected)
+        store.record_sync(config_dir, fingerprint)
+    except Exception as e:
+        console.print(f"[red]应用自定义设置失败: {e}[/red]")
+        raise
+
+
+def deploy_tasks(manager, steps=(1, 2, 3, 4), incremental=False):
+    """
+    将所选步骤拆分为带依赖关系的任务:
+    下载上游配置与备份同时进行，无人值守时还与安装输入法同时进行；
+    备份在安装输入法之后（安装程序可能生成默认配置）；
+    写入配置等待下载、安装和备份全部完成，同步自定义配置在其后。
+    有多个目标目录时，归档只在主目录中下载、解压和解析一次，
+    其它目录在主目录安装完成后同时从内容存储链接文件，各自备份和同步自定义配置。
+    只同步自定义配置、但已安装的基础文件不包含当前所选方案时（修改了配置源或方案），
+    先增量执行 Step 03。
+    """
+    from step_scheduler import Task
+
+    tasks = []
+    primary, *others = target_dirs(manager)
+    settings = load_settings()
+    if (
+        4 in steps
+        and 3 not in steps
+        and ConfigIntegrator(primary).base_outdated(
+            settings.get("config_source", "rime-ice"),
+            settings.get("selected_schemas"),
+        )
+    ):
+        console.print(
+            "[yellow]已安装的基础文件不包含当前所选方案，将先增量更新基础配置。[/yellow]"
+        )
+        steps, incremental = [*steps, 3], True
+
+    def add(name, step, func, after=()):
+        if step in steps:
+            added = {task.name for task in tasks}
+            tasks.append(Task(name, func, [a for a in after if a in added], step))
+
+    add("install_rime", 1, lambda results: run_step_01(manager))
+    add("backup", 2, lambda results: run_step_02(manager), after=["install_rime"])
+    # 交互模式下安装输入法可能询问 sudo 密码或确认安装，下载进度条会覆盖这些提示，
+    # 因此先完成安装再开始下载；无人值守时没有提示，两者同时进行
+    add(
+        "download",
+        3,
+        lambda results: run_download(manager),
+        after=[] if not manager.interactive else ["install_rime"],
+    )
+    add(
+        "install_config",
+        3,
+        lambda results: run_step_03(manager, incremental, results["download"]),
+        after=["install_rime", "backup", "download"],
+    )
+    add(
+        "sync_custom",
+        4,
+        lambda results: run_step_04(manager, primary),
+        after=["install_rime", "backup", "install_config"],
+    )
+    for i, config_dir in enumerate(others, 1):
+        add(
+            f"backup[{i}]",
+            2,
+            lambda results, d=config_dir: run_step_02(manager, d),
+            after=["install_rime"],
+        )
+        add(
+            f"install_config[{i}]",
+            3,
+            lambda results, d=config_dir: run_replicate(manager, d, incremental),
+            after=["install_config", f"backup[{i}]"],
+        )
+        add(
+            f"sync_custom[{i}]",
+            4,
+            lambda results, d=config_dir: run_step_04(manager, d),
+            after=["install_rime", f"backup[{i}]", f"install_config[{i}]"],
+        )
+    return tasks
+
+
+def run_steps(manager, steps, incremental=False):
+    """在所有目标目录上执行所选步骤（见 deploy_tasks）"""
+    import step_scheduler
+
+    step_scheduler.run(deploy_tasks(manager, steps, incremental))
+
+
+def finish_deploy(manager):
+    """根据各目标目录 build/ 中过期的产物判断是否需要重新部署"""
+    dirs = target_dirs(manager)
+    needed = False
+    for config_dir in dirs:
+        plan = plan_redeploy(config_dir)
+        if len(dirs) > 1:
+            console.print(f"[dim]{config_dir}:[/dim]")
+        plan.print()
+        needed = needed or plan.needed
+    if needed:
+        manager.post_install_deploy()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from platformdirs import user_cache_dir
+from rich.console import Console
+
+from integrity import StreamVerifier, digest_from_headers
+from utils import download_file
+
+console = Console()
+
+CACHE_DIR = Path(user_cache_dir("rime-auto-deploy")) / "downloads"
+# 缓存总大小上限，超出后按最近使用时间淘汰
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class DownloadCache:
+    """
+    以 URL 为键的持久化下载缓存。
+    再次获取时通过 If-None-Match / If-Modified-Since 向服务器确认，
+    收到 304 时直接复用本地文件。
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / "index.json"
+
+    def fetch(self, url: str, expected_sha256=None, check_zip=None) -> Path:
+        """
+        返回 URL 对应的本地缓存文件路径，必要时下载或更新。
+        下载时同时计算 SHA-256 并记入索引；.zip 文件（或 check_zip=True）边下载边校验结构和 CRC。
+        给出 expected_sha256（或服务器发送了 Repr-Digest）时内容必须与之一致，
+        已缓存的文件与 expected_sha256 不符时重新下载。
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        index = self._load_index()
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        path = self.cache_dir / f"{key}.bin"
+
+        entry = index.get(url)
+        if entry and expected_sha256 and entry.get("sha256") != expected_sha256:
+            entry = None
+        headers = {}
+        if entry and path.exists():
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        else:
+            entry = None
+
+        if check_zip is None:
+            check_zip = urlsplit(url).path.endswith(".zip")
+        verifiers = []
+
+        def verify(resp_headers):
+            verifiers.append(
+                StreamVerifier(
+                    expected_sha256 or digest_from_headers(resp_headers), check_zip
+                )
+            )
+            return verifiers[-1]
+
+        part_path = path.with_suffix(".part")
+        resp_headers = download_file(
+            url,
+            part_path,
+            headers=headers,
+            size_hint=entry["size"] if entry else None,
+            verify=verify,
+        )
+
+        if resp_headers is None and entry is not None:
+            console.print("[dim]上游未变化，使用本地缓存。[/dim]")
+        else:
+            os.replace(part_path, path)
+            entry = {
+                "file": path.name,
+                "etag": resp_headers.get("ETag") if resp_headers else None,
+                "last_modified": (
+                    resp_headers.get("Last-Modified") if resp_headers else None
+                ),
+                "size": path.stat().st_size,
+                "sha256": verifiers[-1].hexdigest() if verifiers else None,
+            }
+
+        entry["last_used"] = time.time()
+        index[url] = entry
+        self._evict(index, keep=url)
+        self._save_index(index)
+        return path
+
+    def lookup(self, url: str):
+        """
+        不访问网络，返回 URL 已缓存的本地文件路径；未缓存时返回 None。
+        """
+        entry = self._load_index().get(url) if self.cache_dir.exists() else None
+        return self.cache_dir / entry["file"] if entry else None
+
+    def sha256(self, url: str):
+        """返回下载时记录的 SHA-256，未缓存或旧版本的缓存项返回 None。"""
+        entry = self._load_index().get(url) if self.cache_dir.exists() else None
+        return entry.get("sha256") if entry else None
+
+    def _evict(self, index, keep=None):
+        """
+        总大小超过上限时，按最近使用时间从旧到新删除缓存项。
+        """
+        total = sum(e.get("size", 0) for e in index.values())
+        for url, entry in sorted(index.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            (self.cache_dir / entry["file"]).unlink(missing_ok=True)
+            total -= entry.get("size", 0)
+            del index[url]
+            console.print(f"[dim]已清理下载缓存: {url}[/dim]")
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 丢弃文件已被删除的条目
+        return {
+            url: e for url, e in index.items() if (self.cache_dir / e["file"]).exists()
+        }
+
+    def _save_index(self, index):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+
+def fetch_cached(url: str, expected_sha256=None) -> Path:
+    """使用默认缓存获取文件。"""
+    return DownloadCache().fetch(url, expected_sha256)
@@ -0,0 +1,162 @@
+import hashlib
+import shutil
+import subprocess
+from pathlib import Path
+
+from platformdirs import user_cache_dir
+from rich.console import Console
+
+from instrumentation import annotate, traced
+
+console = Console()
+
+GIT_CACHE_DIR = Path(user_cache_dir("rime-auto-deploy")) / "git"
+# 增量导出的文件数超过此值时改为导出整个提交（避免命令行参数过长）
+ARCHIVE_PATHS_MAX = 2000
+
+
+def git_available() -> bool:
+    return shutil.which("git") is not None
+
+
+class GitSource:
+    """
+    在缓存目录中维护上游仓库的浅克隆（裸仓库，只保留最新提交）。
+    升级时只拉取新提交相对本地已有对象的增量，
+    并通过两次提交之间的差异得知哪些文件发生了变化。
+    """
+
+    def __init__(self, repo: str, branch: str, cache_dir: Path = GIT_CACHE_DIR):
+        self.repo = repo
+        self.branch = branch
+        key = hashlib.sha256(f"{repo}#{branch}".encode("utf-8")).hexdigest()[:16]
+        self.path = Path(cache_dir) / f"{key}.git"
+
+    def _git(self, *args):
+        """在本地仓库中执行 git 命令，失败时抛出带错误输出的 RuntimeError。"""
+        result = subprocess.run(
+            ["git", "-C", str(self.path), *args],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"git {args[0]} 失败: {result.stderr.strip()}")
+        return result.stdout
+
+    @traced("git_fetch")
+    def fetch(self) -> str:
+        """
+        克隆或更新本地仓库，返回分支最新提交的 SHA。
+        """
+        annotate(repo=self.repo, branch=self.branch)
+        ref = f"refs/heads/{self.branch}"
+        if not (self.path / "HEAD").exists():
+            console.print(f"[dim]正在浅克隆 {self.repo} ({self.branch})...[/dim]")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                ["git", "init", "--bare", "--quiet", str(self.path)], check=True
+            )
+            self._git("remote", "add", "origin", self.repo)
+        else:
+            console.print(f"[dim]正在拉取 {self.repo} 的更新...[/dim]")
+        self._git("fetch", "--depth", "1", "--no-tags", "origin", f"+{ref}:{ref}")
+        return self.resolve(ref)
+
+    def resolve(self, rev: str):
+        """返回 rev 对应的提交 SHA；本地仓库中没有该提交时返回 None。"""
+        try:
+            return self._git(
+                "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"
+            ).strip()
+        except RuntimeError:
+            return None
+
+    def changed_paths(self, old: str, new: str):
+        """
+        返回两次提交之间新增、修改或删除的文件路径集合。
+        旧提交已不在本地仓库中时返回 None。
+        """
+        if self.resolve(old) is None:
+            return None
+        output = self._git("diff", "--name-only", "--no-renames", "-z", old, new)
+        return {p for p in output.split("\0") if p}
+
+    def tree(self, commit: str) -> "GitTree":
+        return GitTree(self, commit)
+
+    def pin(self, commit: str, name: str):
+        """
+        用一个引用保留已安装的提交，下次升级时仍可与之比较。
+        """
+        self._git("update-ref", f"refs/installed/{name}", commit)
+
+    @traced("git_archive")
+    def archive(self, commit: str, dest: Path, prefix: str, paths=None):
+        """
+        将提交导出为不压缩的 Zip（带 GitHub 归档风格的顶层目录），
+        以便复用基于归档的安装流程。导出完全在本地进行。
+        给出 paths 时只导出这些文件（增量升级只需要变化的文件）。
+        """
+        pathspec = []
+        if paths is not None and len(paths) <= ARCHIVE_PATHS_MAX:
+            annotate(paths=len(paths))
+            pathspec = ["--", *(f":(literal){p}" for p in sorted(paths))]
+        with open(dest, "wb") as f:
+            subprocess.run(
+                [
+                    "git",
+                    "-C",
+                    str(self.path),
+                    "archive",
+                    "--format=zip",
+                    "-0",
+                    f"--prefix={prefix}/",
+                    commit,
+                    *pathspec,
+                ],
+                check=True,
+                stdout=f,
+            )
+        return dest
+
+
+class GitTree:
+    """
+    某次提交的文件列表，并可按需读取其中的文件（不导出整个提交）。
+    文件内容通过一个常驻的 git cat-file --batch 进程读取。
+    """
+
+    def __init__(self, source: GitSource, commit: str):
+        self.source = source
+        self.commit = commit
+        output = source._git("ls-tree", "-r", "-z", "--name-only", commit)
+        self.names = {p for p in output.split("\0") if p}
+        self.proc = None
+
+    def read(self, rel: str) -> bytes:
+        if self.proc is None:
+            self.proc = subprocess.Popen(
+                ["git", "-C", str(self.source.path), "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        self.proc.stdin.write(f"{self.commit}:{rel}\n".encode("utf-8"))
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(rel)
+        data = self.proc.stdout.read(int(header[2]))
+        self.proc.stdout.read(1)  # 内容之后的换行
+        return data
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,86 @@
+import atexit
+import importlib.util
+import threading
+
+# httpx 在第一次需要联网时才导入，不联网的命令（同步、状态查询等）启动更快
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+_lock = threading.Lock()
+_client = None
+_config = {"proxy": None, "mirrors": None, "lan_cache": None}
+
+
+def configure(settings: dict):
+    """
+    从 settings.json 读取网络设置:
+    proxy   - 代理地址，如 http://127.0.0.1:7890
+    mirrors - GitHub 镜像前缀列表，覆盖内置的镜像列表
+    lan_cache - 局域网缓存服务地址，如 http://10.0.0.5:8765
+    代理变化时会重建共享客户端。
+    """
+    global _client
+    proxy = settings.get("proxy") or None
+    mirror_list = settings.get("mirrors")
+    with _lock:
+        if proxy != _config["proxy"] and _client is not None:
+            _client.close()
+            _client = None
+        _config["proxy"] = proxy
+        _config["mirrors"] = list(mirror_list) if mirror_list is not None else None
+        _config["lan_cache"] = (settings.get("lan_cache") or "").rstrip("/") or None
+
+
+def mirrors(default):
+    """返回配置的镜像列表，未配置时返回 default。"""
+    return _config["mirrors"] if _config["mirrors"] is not None else default
+
+
+def lan_cache_url():
+    """返回配置的局域网缓存服务地址，未配置时返回 None。"""
+    return _config["lan_cache"]
+
+
+def get_client():
+    """
+    返回进程内共享的 httpx 客户端。连接会在下载、重试、镜像之间复用，
+    安装了 h2 时启用 HTTP/2。
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+
+            _client = httpx.Client(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=32,
+                    max_keepalive_connections=16,
+                    keepalive_expiry=60.0,
+                ),
+                http2=HTTP2,
+                proxy=_config["proxy"],
+                follow_redirects=True,
+            )
+        return _client
+
+
+def transfer_errors():
+    """
+    下载过程中可能出现、应按“该地址暂时不可用”处理的异常类型：
+    网络错误、文件读写错误、下载流程自身抛出的 RuntimeError（内容不完整、校验失败等）
+    以及响应头格式错误。
+    """
+    import httpx
+
+    return (httpx.HTTPError, httpx.InvalidURL, OSError, RuntimeError, ValueError)
+
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_client)
@@ -0,0 +1,251 @@
+"""
+快速探测输入法是否已安装、相关进程是否在运行，避免每次部署都调用包管理器。
+
+软件包查询（dpkg-query、pacman -Q、rpm -q）比安装命令快得多，结果还会连同
+软件包数据库和查询程序的指纹一起缓存：数据库没有变化（没有安装或卸载过软件）时，
+连查询命令也不再执行。所有外部命令都通过 PATH 查找，可以用同名的桩脚本替换来测试。
+"""
+
+import csv
+import json
+import os
+import plistlib
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+from platformdirs import user_cache_dir
+
+from instrumentation import count
+from materialize import atomic_write
+
+PROBE_FILE = Path(user_cache_dir("rime-auto-deploy")) / "install_probe.json"
+# 单次查询命令的超时（秒）
+QUERY_TIMEOUT = 10
+
+
+def _parse_dpkg(out: str):
+    status, _, version = out.partition("\t")
+    return version.strip() if status.endswith(" installed") else None
+
+
+# 查询软件包的命令、对应的软件包数据库文件（其变化时缓存失效）以及输出的解析方式。
+# rpm 的数据库是目录中的单个文件（新版为 rpmdb.sqlite，旧版为 Packages），
+# 安装软件时目录本身的 mtime 不一定变化
+PACKAGE_QUERIES = {
+    "dpkg-query": (
+        ["-W", "-f=${Status}\t${Version}"],
+        ["/var/lib/dpkg/status"],
+        _parse_dpkg,
+    ),
+    "pacman": (
+        ["-Q"],
+        ["/var/lib/pacman/local"],
+        lambda out: (out.split() or [None])[-1],
+    ),
+    "rpm": (
+        ["-q", "--qf", "%{VERSION}-%{RELEASE}"],
+        [
+            "/var/lib/rpm/rpmdb.sqlite",
+            "/var/lib/rpm/rpmdb.sqlite-wal",
+            "/var/lib/rpm/Packages",
+        ],
+        lambda out: out.strip(),
+    ),
+}
+
+# 配置需要的最低版本（雾凇拼音等用到 librime 1.8 之后的功能），
+# 已安装的版本低于此版本时按需要升级处理；未列出的软件包不检查版本
+MIN_VERSIONS = {
+    "Weasel": "0.15.0",
+    "Squirrel": "0.16.0",
+    "fcitx5-rime": "5.0.0",
+    "ibus-rime": "1.5.0",
+    "fcitx-rime": "0.3.2",
+}
+
+# macOS 上 Squirrel 的安装位置
+SQUIRREL_APPS = [
+    Path("/Library/Input Methods/Squirrel.app"),
+    Path.home() / "Library" / "Input Methods" / "Squirrel.app",
+]
+
+
+def version_key(version: str):
+    """按数字比较版本号，如 0.15.0 > 0.9.30；忽略 dpkg/rpm 版本号开头的 epoch（1:）。"""
+    version = re.sub(r"^\d+:", "", version)
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+
+def is_outdated(name: str, version: str | None) -> bool:
+    """已安装的 version 低于 MIN_VERSIONS 中的最低版本时为 True，版本未知时不作判断。"""
+    minimum = MIN_VERSIONS.get(name)
+    if minimum is None or not version:
+        return False
+    return version_key(version) < version_key(minimum)
+
+
+def path_fingerprint(*paths) -> str:
+    """由各路径的 mtime 和大小组成的指纹，不存在的路径也记入其中。"""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append(f"{path}:-")
+    return "|".join(parts)
+
+
+class ProbeCache:
+    """
+    探测结果按 (键, 指纹) 缓存在用户缓存目录中，指纹变化时重新探测。
+    结果为 {"installed": bool, "version": str | None}。
+    """
+
+    def __init__(self, path: Path = PROBE_FILE):
+        self.path = Path(path)
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, key, fingerprint, probe):
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                count(probe_cache_hits=1)
+                return entry["result"]
+        result = probe()
+        count(probes=1)
+        # 探测本身失败（None）时不缓存，下次重试
+        if result is None:
+            return result
+        with self.lock:
+            self.entries[key] = {"fingerprint": fingerprint, "result": result}
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                data = json.dumps(self.entries, ensure_ascii=False, indent=1)
+                atomic_write(self.path, data.encode("utf-8"), fsync=False)
+            except OSError:
+                pass
+        return result
+
+
+probe_cache = ProbeCache()
+
+
+def _run_query(exe, args, package, parse):
+    try:
+        result = subprocess.run(
+            [exe, *args, package],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            timeout=QUERY_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    version = parse(result.stdout) if result.returncode == 0 else None
+    return {"installed": version is not None, "version": version}
+
+
+def probe_package(package: str, binary: str | None = None):
+    """
+    查询 Linux 软件包是否已安装。binary 为该软件包必然依赖的程序（如 fcitx5），
+    不在 PATH 中时无需查询即可断定未安装。
+    没有可用的查询命令时返回 None（状态未知）。
+    """
+    if binary is not None and shutil.which(binary) is None:
+        return {"installed": False, "version": None}
+    for tool, (args, databases, parse) in PACKAGE_QUERIES.items():
+        exe = shutil.which(tool)
+        if exe is None:
+            continue
+        result = probe_cache.get(
+            f"{tool}:{package}",
+            path_fingerprint(exe, *databases),
+            lambda: _run_query(exe, args, package, parse),
+        )
+        # 查询命令本身执行失败时不作结论，换下一个
+        if result is not None:
+            return result
+    return None
+
+
+def _find_weasel(roots):
+    found = [
+        exe.parent.name.removeprefix("weasel-")
+        for root in roots
+        for exe in root.glob("weasel-*/WeaselDeployer.exe")
+    ]
+    if not found:
+        return {"installed": False, "version": None}
+    return {"installed": True, "version": max(found, key=version_key)}
+
+
+def probe_weasel():
+    """在 Program Files\\Rime 下查找已安装的小狼毫。"""
+    roots = [
+        Path(os.environ[var]) / "Rime"
+        for var in ("ProgramFiles", "ProgramFiles(x86)")
+        if os.environ.get(var)
+    ]
+    return probe_cache.get(
+        "weasel", path_fingerprint(*roots), lambda: _find_weasel(roots)
+    )
+
+
+def _read_squirrel(plists):
+    for plist in plists:
+        try:
+            with open(plist, "rb") as f:
+                info = plistlib.load(f)
+        except (OSError, plistlib.InvalidFileException):
+            continue
+        return {"installed": True, "version": info.get("CFBundleShortVersionString")}
+    return {"installed": False, "version": None}
+
+
+def probe_squirrel():
+    """检查系统或用户的 Input Methods 目录中是否有鼠须管。"""
+    plists = [app / "Contents" / "Info.plist" for app in SQUIRREL_APPS]
+    return probe_cache.get(
+        "squirrel", path_fingerprint(*plists), lambda: _read_squirrel(plists)
+    )
+
+
+def running_processes(names):
+    """
+    通过一次 tasklist 调用返回 names 中正在运行的进程名（Windows）。
+    进程状态随时变化，不缓存；无法查询时返回 None。
+    """
+    exe = shutil.which("tasklist")
+    if exe is None:
+        return None
+    try:
+        result = subprocess.run(
+            [exe, "/FO", "CSV", "/NH"],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            timeout=QUERY_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    running = {row[0].lower() for row in csv.reader(result.stdout.splitlines()) if row}
+    return [name for name in names if name.lower() in running]
@@ -0,0 +1,189 @@
+import functools
+import json
+import os
+import platform
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 设置这些环境变量后，程序退出前会把统计结果写入对应文件
+METRICS_ENV = "RIME_AUTO_DEPLOY_METRICS"
+TRACE_ENV = "RIME_AUTO_DEPLOY_TRACE"
+# 最多保留的 Span 数量；监视模式等长期运行的进程只保留最近的记录
+MAX_SPANS = 10000
+
+
+class Span:
+    """
+    一段被计时的操作。计数器（下载字节、写入字节、文件数、重试次数等）
+    会同时累加到所有外层 Span 上，因此每个步骤都能看到其内部操作的总量。
+    """
+
+    def __init__(self, name, parent=None, **args):
+        self.name = name
+        self.parent = parent
+        self.args = args
+        self.counters = {}
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def add(self, **counters):
+        with _lock:
+            span = self
+            while span is not None:
+                for key, value in counters.items():
+                    span.counters[key] = span.counters.get(key, 0) + value
+                span = span.parent
+
+    @property
+    def seconds(self):
+        return (self.end or time.perf_counter()) - self.start
+
+
+_lock = threading.Lock()
+
+
+class Recorder:
+    """
+    收集本进程中最近的 MAX_SPANS 个 Span，可导出为 JSON 或 Chrome trace
+    （chrome://tracing / Perfetto 可直接打开）。
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+
+    def current(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **args):
+        stack = self._local.__dict__.setdefault("stack", [])
+        span = Span(name, parent=self.current(), **args)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with _lock:
+                self.spans.append(span)
+
+    def to_json(self):
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, {"count": 0, "seconds": 0.0})
+            total["count"] += 1
+            total["seconds"] += span.seconds
+            for key, value in span.counters.items():
+                total[key] = total.get(key, 0) + value
+        return {
+            "host": platform.node(),
+            "platform": platform.system(),
+            "spans": [
+                {
+                    "name": span.name,
+                    "start": round(span.start - self.origin, 6),
+                    "seconds": round(span.seconds, 6),
+                    "parent": span.parent.name if span.parent else None,
+                    "args": span.args,
+                    "counters": span.counters,
+                }
+                for span in sorted(self.spans, key=lambda s: s.start)
+            ],
+            "totals": totals,
+        }
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": "rime-auto-deploy",
+                    "ph": "X",
+                    "ts": round((span.start - self.origin) * 1e6),
+                    "dur": round(span.seconds * 1e6),
+                    "pid": pid,
+                    "tid": span.tid,
+                    "args": {**span.args, **span.counters},
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def dump(self, path, chrome_trace=False):
+        data = self.to_chrome_trace() if chrome_trace else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, default=str)
+
+
+recorder = Recorder()
+span = recorder.span
+current_span = recorder.current
+
+
+def count(**counters):
+    """累加到当前线程正在进行的 Span 上；没有 Span 时忽略。"""
+    current = recorder.current()
+    if current is not None:
+        current.add(**counters)
+
+
+def annotate(**args):
+    """为当前线程正在进行的 Span 附加说明字段（如 URL、路径）。"""
+    current = recorder.current()
+    if current is not None:
+        current.args.update(args)
+
+
+def in_current_span(func):
+    """
+    包装 func，使其在其它线程（如线程池）中运行时，
+    计数仍累加到调用本函数时所在的 Span 上。
+    """
+    parent = recorder.current()
+    if parent is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = recorder._local.__dict__.setdefault("stack", [])
+        stack.append(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+
+    return wrapper
+
+
+def traced(name):
+    """将函数调用记录为一个 Span 的装饰器。"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with recorder.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def dump_files(metrics_path=None, trace_path=None):
+    """
+    将统计结果写入 JSON 与 Chrome trace 文件，未指定路径时读取环境变量。
+    """
+    metrics_path = metrics_path or os.environ.get(METRICS_ENV)
+    trace_path = trace_path or os.environ.get(TRACE_ENV)
+    if metrics_path:
+        recorder.dump(metrics_path)
+    if trace_path:
+        recorder.dump(trace_path, chrome_trace=True)
@@ -0,0 +1,327 @@
+"""
+下载过程中的完整性校验。
+
+StreamVerifier 在下载循环中逐块接收数据：同时计算 SHA-256，并（对 Zip 归档）
+按顺序解析每个成员的本地文件头、解压计算 CRC32，最后核对中央目录与目录结束记录。
+截断、篡改或错位的内容在传输过程中就会被发现，不需要下载完成后再读一遍文件，
+也不会等到解压、甚至备份和写入 Rime 目录之后才失败。
+"""
+
+import base64
+import hashlib
+import struct
+import zlib
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+LOCAL_SIG = 0x04034B50
+CENTRAL_SIG = 0x02014B50
+END_SIG = 0x06054B50
+ZIP64_END_SIG = 0x06064B50
+ZIP64_LOCATOR_SIG = 0x07064B50
+DESCRIPTOR_SIG = 0x08074B50
+# 通用标志位 3: CRC 和大小写在成员数据之后的数据描述符中
+FLAG_DESCRIPTOR = 0x08
+ZIP64_EXTRA_ID = 0x0001
+STORED, DEFLATED = 0, 8
+# 中央目录中取此值的字段实际记录在 Zip64 扩展字段中，不作比较
+ZIP64_MARK = 0xFFFFFFFF
+
+
+class IntegrityError(RuntimeError):
+    """下载内容与期望的摘要不符，或不是完整、有效的 Zip 归档。"""
+
+
+def digest_from_headers(headers):
+    """
+    从响应头 Repr-Digest（RFC 9530）中读取 SHA-256 摘要（十六进制），没有时返回 None。
+    局域网缓存服务会发送该响应头。
+    """
+    value = headers.get("Repr-Digest") if headers is not None else None
+    for item in (value or "").split(","):
+        name, _, encoded = item.strip().partition("=")
+        if name.strip().lower() == "sha-256" and encoded.startswith(":"):
+            try:
+                return base64.b64decode(encoded.strip(":")).hex()
+            except ValueError:
+                return None
+    return None
+
+
+def repr_digest(sha256_hex: str) -> str:
+    """生成 Repr-Digest 响应头的值。"""
+    return "sha-256=:" + base64.b64encode(bytes.fromhex(sha256_hex)).decode() + ":"
+
+
+def _has_zip64(extra: bytes) -> bool:
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        if header_id == ZIP64_EXTRA_ID:
+            return True
+        pos += 4 + size
+    return False
+
+
+class ZipStreamChecker:
+    """
+    按到达顺序解析 Zip 数据，每个成员解压后核对 CRC32 和大小，
+    最后核对中央目录中的每一项与本地文件头一致、目录结束记录中的数量和偏移正确。
+    只保存当前解析所需的少量数据，内存占用与归档大小无关。
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.offset = 0  # self.buf[0] 在归档中的位置
+        self.state = self._header
+        self.members = []  # (偏移, 文件名, CRC32, 压缩后大小)
+        self.member = None
+        self.central_offset = None
+        self.central_count = 0
+
+    def feed(self, data):
+        self.buf += data
+        # 每个状态处理函数在数据不足时返回 False
+        while self.state():
+            pass
+
+    def finish(self):
+        if self.state != self._done:
+            raise IntegrityError("Zip 归档不完整（没有读到中央目录结束记录）")
+
+    def _take(self, n) -> bytes:
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        self.offset += n
+        return data
+
+    def _header(self):
+        if len(self.buf) < 4:
+            return False
+        (sig,) = struct.unpack_from("<I", self.buf)
+        if sig == LOCAL_SIG:
+            return self._local_header()
+        if sig == CENTRAL_SIG or sig == END_SIG:
+            self.central_offset = self.offset
+            self.state = self._central
+            return True
+        raise IntegrityError(f"位置 {self.offset} 处不是有效的 Zip 成员头")
+
+    def _local_header(self):
+        if len(self.buf) < LOCAL_HEADER.size:
+            return False
+        fields = LOCAL_HEADER.unpack_from(self.buf)
+        _, _, flags, method, _, _, crc, csize, usize, name_len, extra_len = fields
+        if len(self.buf) < LOCAL_HEADER.size + name_len + extra_len:
+            return False
+        offset = self.offset
+        self._take(LOCAL_HEADER.size)
+        name = self._take(name_len)
+        extra = self._take(extra_len)
+        if method not in (STORED, DEFLATED):
+            raise IntegrityError(
+                f"不支持的压缩方式 {method}: {name.decode(errors='replace')}"
+            )
+        streamed = bool(flags & FLAG_DESCRIPTOR)
+        if streamed and method == STORED:
+            raise IntegrityError(
+                f"未记录大小的非压缩成员: {name.decode(errors='replace')}"
+            )
+        self.member = {
+            "offset": offset,
+            "name": name,
+            "streamed": streamed,
+            "zip64": _has_zip64(extra),
+            "crc": crc,
+            "csize": csize,
+            "usize": usize,
+            "remaining": None if streamed else csize,
+            "consumed": 0,
+            "actual_crc": 0,
+            "actual_size": 0,
+            "inflater": zlib.decompressobj(-15) if method == DEFLATED else None,
+        }
+        self.state = self._data
+        return True
+
+    def _inflate(self, data):
+        member = self.member
+        if member["inflater"] is not None:
+            try:
+                data = member["inflater"].decompress(data)
+            except zlib.error as e:
+                raise IntegrityError(
+                    f"压缩数据损坏: {member['name'].decode(errors='replace')}: {e}"
+                ) from e
+        member["actual_crc"] = zlib.crc32(data, member["actual_crc"])
+        member["actual_size"] += len(data)
+
+    def _data(self):
+        member = self.member
+        if not self.buf:
+            return False
+        if not member["streamed"]:
+            n = min(member["remaining"], len(self.buf))
+            self._inflate(self._take(n))
+            member["remaining"] -= n
+            member["consumed"] += n
+            if member["remaining"]:
+                return False
+            inflater = member["inflater"]
+            if inflater is not None and (not inflater.eof or inflater.unused_data):
+                raise IntegrityError(
+                    f"压缩数据不完整: {member['name'].decode(errors='replace')}"
+                )
+            self._end_member(member["crc"], member["csize"], member["usize"])
+            return True
+
+        # 大小未知：解压到压缩流结束为止，多余的数据属于数据描述符
+        inflater = member["inflater"]
+        data = self._take(len(self.buf))
+        self._inflate(data)
+        if not inflater.eof:
+            member["consumed"] += len(data)
+            return False
+        unused = inflater.unused_data
+        member["consumed"] += len(data) - len(unused)
+        self.buf[:0] = unused
+        self.offset -= len(unused)
+        self.state = self._descriptor
+        return True
+
+    def _descriptor(self):
+        member = self.member
+        size_format = "<Q" if member["zip64"] else "<I"
+        size_len = struct.calcsize(size_format)
+        needed = 4 + 4 + 2 * size_len
+        if len(self.buf) < needed:
+            return False
+        (first,) = struct.unpack_from("<I", self.buf)
+        if first == DESCRIPTOR_SIG:
+            self._take(4)
+        crc = struct.unpack("<I", self._take(4))[0]
+        csize = struct.unpack(size_format, self._take(size_len))[0]
+        usize = struct.unpack(size_format, self._take(size_len))[0]
+        self._end_member(crc, csize, usize)
+        return True
+
+    def _end_member(self, crc, csize, usize):
+        member = self.member
+        name = member["name"]
+        if member["actual_crc"] != crc:
+            raise IntegrityError(f"CRC 校验失败: {name.decode(errors='replace')}")
+        if member["actual_size"] != usize and usize != ZIP64_MARK:
+            raise IntegrityError(f"解压后大小不符: {name.decode(errors='replace')}")
+        if member["consumed"] != csize and csize != ZIP64_MARK:
+            raise IntegrityError(f"压缩后大小不符: {name.decode(errors='replace')}")
+        self.members.append((member["offset"], name, crc, member["consumed"]))
+        self.member = None
+        self.state = self._header
+        return True
+
+    def _central(self):
+        if len(self.buf) < 4:
+            return False
+        (sig,) = struct.unpack_from("<I", self.buf)
+        if sig == CENTRAL_SIG:
+            return self._central_entry()
+        if sig == ZIP64_END_SIG:
+            if len(self.buf) < 12:
+                return False
+            (size,) = struct.unpack_from("<Q", self.buf, 4)
+            if len(self.buf) < 12 + size:
+                return False
+            self._take(12 + size)
+            return True
+        if sig == ZIP64_LOCATOR_SIG:
+            if len(self.buf) < 20:
+                return False
+            self._take(20)
+            return True
+        if sig == END_SIG:
+            return self._end_record()
+        raise IntegrityError(f"位置 {self.offset} 处不是有效的中央目录项")
+
+    def _central_entry(self):
+        if len(self.buf) < CENTRAL_HEADER.size:
+            return False
+        fields = CENTRAL_HEADER.unpack_from(self.buf)
+        crc, csize = fields[7], fields[8]
+        name_len, extra_len, comment_len = fields[10], fields[11], fields[12]
+        offset = fields[16]
+        if len(self.buf) < CENTRAL_HEADER.size + name_len + extra_len + comment_len:
+            return False
+        self._take(CENTRAL_HEADER.size)
+        name = self._take(name_len)
+        self._take(extra_len + comment_len)
+
+        index = self.central_count
+        self.central_count += 1
+        if index >= len(self.members):
+            raise IntegrityError("中央目录中的成员多于归档中的实际成员")
+        local_offset, local_name, local_crc, local_csize = self.members[index]
+        if (
+            name != local_name
+            or crc != local_crc
+            or (csize != ZIP64_MARK and csize != local_csize)
+            or (offset != ZIP64_MARK and offset != local_offset)
+        ):
+            raise IntegrityError(
+                f"中央目录与成员不一致: {name.decode(errors='replace')}"
+            )
+        return True
+
+    def _end_record(self):
+        if len(self.buf) < END_RECORD.size:
+            return False
+        fields = END_RECORD.unpack_from(self.buf)
+        total, directory_offset, comment_len = fields[4], fields[6], fields[7]
+        if len(self.buf) < END_RECORD.size + comment_len:
+            return False
+        self._take(END_RECORD.size + comment_len)
+        if self.central_count != len(self.members) or (
+            total != 0xFFFF and total != len(self.members)
+        ):
+            raise IntegrityError("中央目录的成员数量与归档不符")
+        if directory_offset != ZIP64_MARK and directory_offset != self.central_offset:
+            raise IntegrityError("中央目录的位置与记录不符")
+        self.state = self._done
+        return True
+
+    def _done(self):
+        if self.buf:
+            raise IntegrityError("Zip 归档结束后还有多余的数据")
+        return False
+
+
+class StreamVerifier:
+    """
+    在下载循环中逐块调用 update，传输结束后调用 finish。
+    expected_sha256 为期望的摘要（来自配置或服务器的 Repr-Digest），不符时 finish 抛出 IntegrityError；
+    check_zip=True 时同时校验 Zip 结构，损坏的内容在 update 中即抛出异常。
+    """
+
+    def __init__(self, expected_sha256=None, check_zip=False):
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.hash = hashlib.sha256()
+        self.zip = ZipStreamChecker() if check_zip else None
+
+    def update(self, chunk):
+        self.hash.update(chunk)
+        if self.zip is not None:
+            self.zip.feed(chunk)
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+    def finish(self) -> str:
+        """完成校验，返回内容的 SHA-256。"""
+        if self.zip is not None:
+            self.zip.finish()
+        digest = self.hexdigest()
+        if self.expected_sha256 and digest != self.expected_sha256:
+            raise IntegrityError(
+                f"SHA-256 不符: 期望 {self.expected_sha256[:16]}…，实际 {digest[:16]}…"
+            )
+        return digest
@@ -0,0 +1,219 @@
+"""
+局域网制品缓存。
+
+在一台机器上运行 `python main.py serve`，它会按需从上游下载配置源归档并缓存，
+再通过 HTTP 提供给局域网内的其它机器。其它机器在 settings.json 中设置
+"lan_cache": "http://<该机器地址>:8765" 后，安装基础配置时会先从这里获取，
+不可用时再回退到上游。整个机房只需要一次外网下载。
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from rich.console import Console
+
+import http_client
+from config_integrator import CONFIG_SOURCES, LAN_SOURCE_PATH
+from deploy_steps import load_settings
+from download_cache import DownloadCache
+from integrity import repr_digest
+from utils import file_sha256
+
+console = Console()
+
+LAN_PORT = 8765
+# 两次向上游确认更新之间的最短间隔（秒），期间所有请求直接使用本地缓存
+UPSTREAM_TTL = 600
+
+
+def source_path(source_id: str) -> str:
+    """配置源归档在缓存服务上的路径。"""
+    return LAN_SOURCE_PATH.format(source_id=source_id)
+
+
+class LanCache:
+    """
+    按配置源维护上游归档的本地副本及其 ETag。
+    同一时间只向上游发起一次下载，其余请求等待其完成后共用结果。
+    """
+
+    def __init__(self, cache: DownloadCache | None = None, ttl=UPSTREAM_TTL):
+        self.cache = cache or DownloadCache()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, source_id: str):
+        """
+        返回 (路径, ETag, SHA-256)，必要时先向上游确认或下载。
+        上游不可用时使用已缓存的旧版本；从未下载过时抛出异常。
+        """
+        url = CONFIG_SOURCES[source_id]["url"]
+        with self.lock:
+            entry = self.entries.get(source_id)
+            if entry and time.monotonic() - entry["checked"] < self.ttl:
+                return entry["path"], entry["etag"], entry["sha256"]
+
+            try:
+                path = self.cache.fetch(url)
+            except Exception as e:
+                path = self.cache.lookup(url)
+                if path is None:
+                    raise
+                console.print(f"[yellow]上游不可用，继续提供缓存版本: {e}[/yellow]")
+
+            stat = path.stat()
+            if not entry or entry["stat"] != (stat.st_size, stat.st_mtime_ns):
+                # 下载时已记录摘要，只有旧版本的缓存项才需要重新读取文件
+                sha256 = self.cache.sha256(url) or file_sha256(path)
+                entry = {
+                    "path": path,
+                    "stat": (stat.st_size, stat.st_mtime_ns),
+                    "etag": '"' + sha256[:32] + '"',
+                    "sha256": sha256,
+                }
+            entry["checked"] = time.monotonic()
+            self.entries[source_id] = entry
+            return entry["path"], entry["etag"], entry["sha256"]
+
+
+def make_handler(lan_cache: LanCache):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            console.print(f"[dim]{self.client_address[0]} {format % args}[/dim]")
+
+        def do_HEAD(self):
+            self._serve(body=False)
+
+        def do_GET(self):
+            self._serve(body=True)
+
+        def _send_json(self, data, status=200):
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _serve(self, body):
+            if self.path in ("/", "/sources"):
+                self._send_json(
+                    {
+                        sid: {"name": s["name"], "path": source_path(sid)}
+                        for sid, s in CONFIG_SOURCES.items()
+                    }
+                )
+                return
+
+            source_id = self.path.removeprefix("/sources/").removesuffix(".zip")
+            if self.path != source_path(source_id) or source_id not in CONFIG_SOURCES:
+                self.send_error(404)
+                return
+
+            try:
+                path, etag, sha256 = lan_cache.get(source_id)
+            except http_client.transfer_errors() as e:
+                self.send_error(502, f"upstream unavailable: {e}")
+                return
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            size = path.stat().st_size
+            start, end = 0, size - 1
+            requested = self.headers.get("Range", "")
+            if_range = self.headers.get("If-Range")
+            if requested.startswith("bytes=") and if_range in (None, etag):
+                first, _, last = requested[6:].partition("-")
+                try:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else end
+                except ValueError:
+                    start, end = 0, size - 1
+                if start > end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            # 完整文件的摘要，客户端下载时据此校验（RFC 9530）
+            self.send_header("Repr-Digest", repr_digest(sha256))
+            self.send_header(
+                "Last-Modified", formatdate(path.stat().st_mtime, usegmt=True)
+            )
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if not body:
+                return
+
+            with open(path, "rb") as f:
+                try:
+                    # 由内核直接把文件内容发送到套接字
+                    self.wfile.flush()
+                    self.connection.sendfile(f, start, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+    return Handler
+
+
+def serve(host="0.0.0.0", port=LAN_PORT, ttl=UPSTREAM_TTL, cache_dir=None):
+    """启动缓存服务，直到 Ctrl-C。"""
+    cache = DownloadCache(Path(cache_dir)) if cache_dir else DownloadCache()
+    server = ThreadingHTTPServer((host, port), make_handler(LanCache(cache, ttl)))
+    console.print(
+        f"[green]局域网缓存已启动: http://{host}:{server.server_port}[/green]\n"
+        f"[dim]其它机器可在 settings.json 中设置 "
+        f'"lan_cache": "http://<本机地址>:{server.server_port}"[/dim]'
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[yellow]局域网缓存已停止。[/yellow]")
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py serve",
+        description="在局域网内提供配置源归档的缓存，供其它机器部署时使用。",
+    )
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=LAN_PORT, help="监听端口")
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=UPSTREAM_TTL,
+        help="两次向上游确认更新的最短间隔（秒）",
+    )
+    parser.add_argument("--cache-dir", help="归档缓存目录，默认使用用户缓存目录")
+    args = parser.parse_args(argv)
+    # 向上游下载时同样使用 settings.json 中的代理和镜像
+    http_client.configure(load_settings())
+    serve(args.host, args.port, args.ttl, args.cache_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from platformdirs import user_cache_dir
+from rich.console import Console
+
+from http_client import get_client, mirrors, transfer_errors
+
+console = Console()
+
+# 内置的 GitHub 镜像前缀，可在 settings.json 中通过 mirrors 覆盖
+DEFAULT_MIRRORS = [
+    "https://ghproxy.net/",
+    "https://mirror.ghproxy.com/",
+]
+
+# 各主机的健康记录，跨运行保留
+HEALTH_FILE = Path(user_cache_dir("rime-auto-deploy")) / "mirrors.json"
+
+# 指数滑动平均系数，越大越看重最近一次测量
+ALPHA = 0.3
+# 没有记录的主机按以下数值估算
+DEFAULT_LATENCY = 1.0
+DEFAULT_THROUGHPUT = 1024 * 1024
+DEFAULT_SUCCESS = 0.7
+# 不知道文件大小时按该大小估算完成时间
+DEFAULT_SIZE = 16 * 1024 * 1024
+
+# 记录超过该时间（秒）的主机在下载前重新探测
+PROBE_INTERVAL = 6 * 3600
+PROBE_TIMEOUT = 3.0
+
+# 连续失败达到阈值后熔断，熔断时长从 CIRCUIT_BASE 起每次翻倍
+CIRCUIT_THRESHOLD = 3
+CIRCUIT_BASE = 60.0
+CIRCUIT_MAX = 6 * 3600.0
+
+
+def host_of(url: str) -> str:
+    """
+    镜像地址形如 https://ghproxy.net/https://github.com/...，
+    按最前面的主机名统计。
+    """
+    return urlsplit(url).netloc
+
+
+class MirrorScheduler:
+    """
+    为每个主机记录首字节延迟、吞吐量和成功率，按预计完成时间排列候选地址。
+    长时间未使用的主机会先用极小的 Range 请求并发探测；
+    连续失败的主机会被熔断一段时间，期间不再尝试。
+    """
+
+    def __init__(self, path: Path = HEALTH_FILE):
+        self.path = Path(path)
+        self.hosts = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.hosts is not None:
+            return
+        self.hosts = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.hosts = json.load(f)
+            except (OSError, ValueError):
+                self.hosts = {}
+
+    def _entry(self, url):
+        self._load()
+        return self.hosts.setdefault(
+            host_of(url),
+            {
+                "latency": DEFAULT_LATENCY,
+                "throughput": DEFAULT_THROUGHPUT,
+                "success": DEFAULT_SUCCESS,
+                "failures": 0,
+                "open_until": 0,
+                "checked": 0,
+            },
+        )
+
+    def record_success(self, url: str, latency: float):
+        """记录一次成功的请求及其首字节延迟，并关闭熔断。"""
+        with self.lock:
+            entry = self._entry(url)
+            entry["latency"] += ALPHA * (latency - entry["latency"])
+            entry["success"] += ALPHA * (1 - entry["success"])
+            entry["failures"] = 0
+            entry["open_until"] = 0
+            entry["checked"] = time.time()
+            self.dirty = True
+
+    def record_transfer(self, url: str, size: int, seconds: float):
+        """记录一次完整传输的吞吐量。"""
+        if size <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            entry = self._entry(url)
+            entry["throughput"] += ALPHA * (size / seconds - entry["throughput"])
+            self.dirty = True
+
+    def record_failure(self, url: str):
+        """记录一次失败；连续失败过多时熔断该主机。"""
+        with self.lock:
+            entry = self._entry(url)
+            entry["success"] += ALPHA * (0 - entry["success"])
+            entry["failures"] += 1
+            entry["checked"] = time.time()
+            over = entry["failures"] - CIRCUIT_THRESHOLD
+            if over >= 0:
+                entry["open_until"] = time.time() + min(
+                    CIRCUIT_BASE * 2**over, CIRCUIT_MAX
+                )
+            self.dirty = True
+
+    def expected_seconds(self, url: str, size: int | None = None) -> float:
+        """
+        预计完成时间: (延迟 + 大小 / 吞吐量) / 成功率，
+        成功率低的主机相当于需要多次尝试。
+        """
+        size = size or DEFAULT_SIZE
+        with self.lock:
+            entry = self._entry(url)
+        return (entry["latency"] + size / entry["throughput"]) / max(
+            entry["success"], 0.05
+        )
+
+    def is_open(self, url: str, now=None) -> bool:
+        """主机是否处于熔断状态。"""
+        with self.lock:
+            entry = self._entry(url)
+        return entry["open_until"] > (now or time.time())
+
+    def probe(self, urls):
+        """
+        并发发送 1 字节的 Range 请求，测量各地址的延迟。
+        探测建立的连接会留在共享客户端的连接池中，供随后的下载复用。
+        """
+        client = get_client()
+        errors = transfer_errors()
+
+        def probe_one(url):
+            start = time.perf_counter()
+            try:
+                with client.stream(
+                    "GET",
+                    url,
+                    headers={"Range": "bytes=0-0", "Accept-Encoding": "identity"},
+                    timeout=PROBE_TIMEOUT,
+                ) as response:
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"HTTP {response.status_code}")
+                self.record_success(url, time.perf_counter() - start)
+            except errors:
+                self.record_failure(url)
+
+        threads = [
+            threading.Thread(target=probe_one, args=(url,), daemon=True) for url in urls
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(PROBE_TIMEOUT + 1)
+
+    def order(self, urls, size: int | None = None):
+        """
+        过滤掉熔断中的地址（全部熔断时按最早恢复的顺序全部保留），
+        探测记录过期的地址，然后按预计完成时间从快到慢排序。
+        """
+        now = time.time()
+        available = [u for u in urls if not self.is_open(u, now)]
+        if not available:
+            with self.lock:
+                return sorted(urls, key=lambda u: self._entry(u)["open_until"])
+        if len(available) < len(urls):
+            skipped = ", ".join(host_of(u) for u in urls if u not in available)
+            console.print(f"[dim]暂时跳过连续失败的地址: {skipped}[/dim]")
+
+        if len(available) > 1:
+            with self.lock:
+                stale = [
+                    u
+                    for u in available
+                    if now - self._entry(u)["checked"] > PROBE_INTERVAL
+                ]
+            if stale:
+                self.probe(stale)
+                available = [u for u in available if not self.is_open(u)] or available
+
+        return sorted(available, key=lambda u: self.expected_seconds(u, size))
+
+    def candidates(self, url: str, size: int | None = None):
+        """返回源地址以及（GitHub 地址的）镜像地址，按预计完成时间排序。"""
+        urls = [url]
+        if "github.com" in url:
+            urls += [f"{mirror}{url}" for mirror in mirrors(DEFAULT_MIRRORS)]
+        return self.order(urls, size)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.hosts, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+
+scheduler = MirrorScheduler()
+atexit.register(scheduler.save)
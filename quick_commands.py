@@ -0,0 +1,123 @@
+"""
+不需要联网和交互的快速子命令，适合放在登录脚本或定时任务中：
+
+    python main.py status [--json]    查看当前设置、已安装版本和是否需要重新部署
+    python main.py sync [--no-deploy] 只同步 custom_config，必要时重新部署
+
+这些命令不会导入 httpx、进度条、asyncio 等只在下载和交互中用到的模块。
+"""
+
+import argparse
+import json
+
+from rich.console import Console
+
+from config_integrator import ConfigIntegrator, custom_config_fingerprint
+from deploy_steps import finish_deploy, load_settings, target_dirs
+from instrumentation import dump_files
+from redeploy_planner import plan_redeploy
+from rime_manager import get_manager
+from settings_store import store
+from transaction import list_generations
+
+console = Console()
+
+
+def status(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py status",
+        description="查看当前设置、已安装的配置版本以及是否需要重新部署。",
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    manager = get_manager()
+    config_dir = manager.get_config_dir()
+    manifest = ConfigIntegrator(config_dir).load_manifest() or {}
+    redeploy = plan_redeploy(config_dir)
+    installed = store.installed(manifest.get("source"))
+    fingerprint = custom_config_fingerprint(settings.get("selected_schemas"))
+    info = {
+        "config_dir": str(config_dir),
+        "targets": [str(d) for d in target_dirs(manager)],
+        "config_source": settings.get("config_source"),
+        "selected_schemas": settings.get("selected_schemas"),
+        "installed_source": manifest.get("source"),
+        "installed_commit": manifest.get("commit"),
+        "installed_files": len(manifest.get("files", {})),
+        "installed_archive_sha256": installed.get("archive_sha256"),
+        "custom_config_changed": store.last_sync(config_dir) != fingerprint,
+        "generations": [p.name for p in list_generations(config_dir)],
+        "redeploy_needed": redeploy.needed,
+    }
+
+    if args.json:
+        print(json.dumps(info, ensure_ascii=False, indent=1))
+        return 0
+
+    console.print(f"配置目录: {info['config_dir']}")
+    for target in info["targets"][1:]:
+        console.print(f"[dim]同时部署到: {target}[/dim]")
+    console.print(
+        f"配置源: {info['config_source'] or '未设定'} | "
+        f"已选方案: {', '.join(info['selected_schemas'] or ['未设定'])}"
+    )
+    if manifest:
+        commit = info["installed_commit"]
+        console.print(
+            f"已安装: {info['installed_source']}"
+            + (f" ({commit[:8]})" if commit else "")
+            + f"，{info['installed_files']} 个文件"
+        )
+    else:
+        console.print("[dim]未找到安装清单，尚未通过本工具安装基础配置。[/dim]")
+    if info["custom_config_changed"]:
+        console.print("[yellow]custom_config 自上次同步后有变化。[/yellow]")
+    if info["generations"]:
+        console.print(f"[dim]可回滚的历史版本: {len(info['generations'])} 个[/dim]")
+    redeploy.print()
+    return 0
+
+
+def sync(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py sync",
+        description="将 custom_config 同步到 Rime 目录，有需要时重新部署。",
+    )
+    parser.add_argument(
+        "--no-deploy", action="store_true", help="只同步文件，不触发重新部署"
+    )
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    selected = settings.get("selected_schemas")
+    if not selected:
+        console.print(
+            "[red]尚未选择输入方案，请先运行 `python main.py` 完成初始设置。[/red]"
+        )
+        return 2
+
+    manager = get_manager()
+    source = settings.get("config_source", "rime-ice")
+    if ConfigIntegrator(manager.get_config_dir()).base_outdated(source, selected):
+        # sync 不联网，无法补装缺少的方案文件
+        console.print(
+            "[yellow]已安装的基础文件不包含当前所选方案，"
+            "请运行 `python main.py` 在升级模式中更新 Rime 配置。[/yellow]"
+        )
+    try:
+        fingerprint = custom_config_fingerprint(selected)
+        for config_dir in target_dirs(manager):
+            ConfigIntegrator(config_dir).apply_custom_config(selected)
+            store.record_sync(config_dir, fingerprint)
+        if args.no_deploy:
+            return 0
+        finish_deploy(manager)
+    # 最外层：任何错误都以退出码报告
+    except Exception as e:  # noqa: BLE001
+        console.print(f"[red]同步失败: {e}[/red]")
+        return 1
+    finally:
+        dump_files()
+    return 0
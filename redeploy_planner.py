@@ -0,0 +1,235 @@
+import json
+from pathlib import Path
+
+import yaml
+from rich.console import Console
+
+from config_integrator import MANIFEST_NAME
+
+console = Console()
+
+# 由 Rime 编译到 build/ 中的前端配置
+FRONTEND_CONFIGS = ["default", "weasel", "squirrel"]
+# 会改变拼写棱镜的补丁键前缀
+PRISM_PATCH_KEYS = ("speller", "translator/dictionary", "translator/prism")
+
+
+class RedeployPlan:
+    """
+    一次同步之后 build/ 中需要重新生成的产物。
+    stale_dicts: 需要重新编译的词典（.table.bin / .reverse.bin）
+    stale_prisms: 需要重新生成的拼写棱镜（.prism.bin）
+    stale_configs: 只需重新编译的配置（build/ 下的 *.yaml）
+    full: build/ 不存在或无法判断，需要完整部署
+    """
+
+    def __init__(self):
+        self.stale_dicts = set()
+        self.stale_prisms = set()
+        self.stale_configs = set()
+        self.full = False
+
+    @property
+    def needed(self):
+        return self.full or bool(
+            self.stale_dicts or self.stale_prisms or self.stale_configs
+        )
+
+    @property
+    def config_only(self):
+        return not self.full and not self.stale_dicts and not self.stale_prisms
+
+    def print(self):
+        if self.full:
+            console.print("[yellow]未找到已编译的 build/ 目录，需要完整部署。[/yellow]")
+        elif not self.needed:
+            console.print("[green]没有影响已编译产物的变化，无需重新部署。[/green]")
+        elif self.config_only:
+            console.print(
+                f"[cyan]仅需重新编译配置 (较快): {', '.join(sorted(self.stale_configs))}[/cyan]"
+            )
+        else:
+            if self.stale_dicts:
+                console.print(
+                    f"[yellow]需要重新编译词典: {', '.join(sorted(self.stale_dicts))}[/yellow]"
+                )
+            if self.stale_prisms:
+                console.print(
+                    f"[yellow]需要重新生成棱镜: {', '.join(sorted(self.stale_prisms))}[/yellow]"
+                )
+            if self.stale_configs:
+                console.print(
+                    f"[dim]需要重新编译配置: {', '.join(sorted(self.stale_configs))}[/dim]"
+                )
+
+
+class RedeployPlanner:
+    """
+    对比 Rime 目录中的源文件与 build/ 中编译产物的修改时间，
+    推算哪些产物已经过期。源文件 → 产物的对应关系：
+
+    - X.dict.yaml（及其 import_tables）→ X.table.bin、X.reverse.bin
+    - 方案 S 的 S.schema.yaml、主词典及修改拼写运算的补丁 → 棱镜 .prism.bin
+    - S.schema.yaml、S.custom.yaml 以及共享的 yaml → build/S.schema.yaml
+    - default/weasel/squirrel 的 .yaml 与 .custom.yaml → build/ 下的同名配置
+    """
+
+    def __init__(self, rime_config_dir: Path):
+        self.rime_config_dir = rime_config_dir
+        self.build_dir = rime_config_dir / "build"
+        self._dict_sources = {}
+        self.installed_at = self._install_times()
+
+    def _install_times(self):
+        """
+        安装清单中记录的各文件写入时间（纳秒）。从内容存储链接的文件保留对象创建时的 mtime，
+        可能早于 build/ 中的产物，因此以两者中较晚的为准。
+        """
+        try:
+            with open(self.rime_config_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+                times = json.load(f).get("installed_at")
+        except (OSError, ValueError, AttributeError):
+            return {}
+        return times if isinstance(times, dict) else {}
+
+    def plan(self) -> RedeployPlan:
+        plan = RedeployPlan()
+        if not self.build_dir.is_dir():
+            plan.full = True
+            return plan
+
+        shared = self._mtime(
+            *[
+                p
+                for p in self.rime_config_dir.glob("*.yaml")
+                if not p.name.endswith((".schema.yaml", ".dict.yaml", ".custom.yaml"))
+            ]
+        )
+
+        schema_ids = {
+            p.name[: -len(".schema.yaml")] for p in self.build_dir.glob("*.schema.yaml")
+        }
+        schema_ids.update(self._schema_list())
+
+        for schema_id in schema_ids:
+            schema_path = self.rime_config_dir / f"{schema_id}.schema.yaml"
+            if not schema_path.exists():
+                continue
+            custom_path = self.rime_config_dir / f"{schema_id}.custom.yaml"
+            schema_mtime = self._mtime(schema_path, custom_path)
+            # 只有修改了拼写运算或词典的补丁才会影响棱镜
+            prism_sources = [schema_path]
+            patch = self._load_yaml(custom_path).get("patch") or {}
+            if any(str(k).startswith(PRISM_PATCH_KEYS) for k in patch):
+                prism_sources.append(custom_path)
+
+            compiled = self.build_dir / schema_path.name
+            if self._stale(compiled.name, max(schema_mtime, shared)):
+                plan.stale_configs.add(compiled.name)
+
+            data = self._load_yaml(schema_path)
+            translator = data.get("translator") or {}
+            for dict_name in self._dictionaries(data):
+                dict_files = self._dict_files(dict_name)
+                if not dict_files:
+                    # 词典位于 Rime 共享目录中，不受本次同步影响
+                    continue
+                dict_mtime = self._mtime(*dict_files)
+                for suffix in (".table.bin", ".reverse.bin"):
+                    if self._stale(f"{dict_name}{suffix}", dict_mtime):
+                        plan.stale_dicts.add(dict_name)
+
+            main_dict = translator.get("dictionary")
+            if main_dict and self._dict_files(main_dict):
+                prism = translator.get("prism") or main_dict
+                prism_mtime = self._mtime(*prism_sources, *self._dict_files(main_dict))
+                if self._stale(f"{prism}.prism.bin", prism_mtime):
+                    plan.stale_prisms.add(prism)
+
+        for name in FRONTEND_CONFIGS:
+            compiled = self.build_dir / f"{name}.yaml"
+            sources = (
+                self.rime_config_dir / f"{name}.yaml",
+                self.rime_config_dir / f"{name}.custom.yaml",
+            )
+            if compiled.exists() and self._mtime(*sources) > compiled.stat().st_mtime:
+                plan.stale_configs.add(compiled.name)
+
+        return plan
+
+    def _schema_list(self):
+        """default.custom.yaml 中启用的方案（可能尚未编译过）。"""
+        data = self._load_yaml(self.rime_config_dir / "default.custom.yaml")
+        patch = data.get("patch") or {}
+        for item in patch.get("schema_list") or []:
+            if isinstance(item, dict) and item.get("schema"):
+                yield str(item["schema"])
+
+    def _stale(self, artifact, source_mtime):
+        path = self.build_dir / artifact
+        return not path.exists() or source_mtime > path.stat().st_mtime
+
+    def _dict_files(self, dict_name):
+        """词典文件及其 import_tables 递归引用的全部词典文件。"""
+        if dict_name in self._dict_sources:
+            return self._dict_sources[dict_name]
+
+        self._dict_sources[dict_name] = []
+        path = self.rime_config_dir / f"{dict_name}.dict.yaml"
+        if not path.exists():
+            return []
+
+        files = [path]
+        header = []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.strip() == "...":
+                    break
+                header.append(line)
+        try:
+            data = yaml.safe_load("".join(header)) or {}
+        except yaml.YAMLError:
+            data = {}
+        if isinstance(data, dict):
+            for table in data.get("import_tables") or []:
+                files += self._dict_files(str(table))
+
+        self._dict_sources[dict_name] = files
+        return files
+
+    def _dictionaries(self, node):
+        """方案中所有 dictionary 引用（主翻译器、反查、英文等）。"""
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "dictionary" and isinstance(value, str) and value:
+                    yield value
+                else:
+                    yield from self._dictionaries(value)
+        elif isinstance(node, list):
+            for value in node:
+                yield from self._dictionaries(value)
+
+    def _mtime(self, *paths):
+        latest = 0
+        for p in paths:
+            if p.exists():
+                rel = p.relative_to(self.rime_config_dir).as_posix()
+                installed = self.installed_at.get(rel, 0) / 1e9
+                latest = max(latest, p.stat().st_mtime, installed)
+        return latest
+
+    @staticmethod
+    def _load_yaml(path: Path):
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+        except yaml.YAMLError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+
+def plan_redeploy(rime_config_dir: Path) -> RedeployPlan:
+    """计算 Rime 目录需要重新编译的产物，见 RedeployPlanner。"""
+    return RedeployPlanner(rime_config_dir).plan()
@@ -1,17 +1,47 @@
-import platform
-import subprocess
 import os
+import platform
 import shutil
+import subprocess
+import sys
 from pathlib import Path
+
 from rich.console import Console
 
+from install_probe import (
+    is_outdated,
+    probe_package,
+    probe_squirrel,
+    probe_weasel,
+    running_processes,
+)
+
 console = Console()
 
 
 class RimeManager:
+    # 无人值守（批量部署）时为 False：包管理器使用非交互参数、sudo 不询问密码，
+    # 安装失败时抛出异常而不是只输出提示
+    interactive = True
+
     def install_rime(self):
         raise NotImplementedError
 
+    def run_installer(self, cmd, **kwargs):
+        """
+        运行安装命令，失败时抛出 CalledProcessError。
+        无人值守时不提供输入（需要确认的提示会直接失败而不是一直等待），
+        输出写到标准错误，标准输出留给 JSON 进度事件。
+        """
+        if not self.interactive:
+            kwargs.update(stdin=subprocess.DEVNULL, stdout=sys.stderr)
+        return subprocess.run(cmd, check=True, **kwargs)
+
+    def install_failed(self, message):
+        """安装失败：交互模式下提示手动安装，无人值守时抛出异常使该步骤失败。"""
+        if not self.interactive:
+            raise RuntimeError(message)
+        console.print(f"[yellow]{message}[/yellow]")
+
     def stop_rime(self):
         """尝试停止 Rime 服务/进程。"""
         pass
@@ -19,39 +49,74 @@ class RimeManager:
     def get_config_dir(self) -> Path:
         raise NotImplementedError
 
+    def get_config_dirs(self) -> list[Path]:
+        """需要部署的全部 Rime 配置目录，第一个为主目录。"""
+        return [self.get_config_dir()]
+
     def post_install_deploy(self):
         """如果可用，运行部署命令。"""
         pass
 
 
+def report_installed(name, status) -> str | None:
+    """
+    输出探测结果。已安装且版本满足要求时返回 "current"（跳过安装），
+    已安装但低于 MIN_VERSIONS 中的最低版本时返回 "outdated"（需要升级），
+    未安装或无法探测时返回 None。
+    """
+    if status is None or not status["installed"]:
+        return None
+    version = f" {status['version']}" if status["version"] else ""
+    if is_outdated(name, status["version"]):
+        console.print(f"[yellow]{name}{version} 版本过低，将进行升级。[/yellow]")
+        return "outdated"
+    console.print(f"[green]{name}{version} 已安装，跳过安装。[/green]")
+    return "current"
+
+
 class WindowsRimeManager(RimeManager):
     def stop_rime(self):
-        console.print("[cyan]正在尝试停止 Weasel 服务以解除文件占用...[/cyan]")
-        # 终止 WeaselServer 和 WeaselDeployer
+        # 终止 WeaselServer 和 WeaselDeployer，只处理正在运行的进程
         processes = ["WeaselServer.exe", "WeaselDeployer.exe"]
-        for proc in processes:
-            try:
-                subprocess.run(
-                    ["taskkill", "/F", "/IM", proc],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            except Exception:
-                pass
+        running = running_processes(processes)
+        if running is None:
+            running = processes
+        if not running:
+            return
+        console.print("[cyan]正在尝试停止 Weasel 服务以解除文件占用...[/cyan]")
+        command = ["taskkill", "/F"]
+        for proc in running:
+            command += ["/IM", proc]
+        try:
+            subprocess.run(
+                command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            pass
 
     def install_rime(self):
         console.print("[cyan]正在检查 Weasel (小狼毫)...[/cyan]")
-        # 简单检查 WeaselDeployer.exe 是否存在于常见路径，或尝试使用 winget
-        # 如果可用，使用 winget 更干净
+        # 先检查 Program Files 中是否已有 WeaselDeployer.exe，没有或版本过低时才调用 winget
+        state = report_installed("Weasel", probe_weasel())
+        if state == "current":
+            return
+        action = "upgrade" if state == "outdated" else "install"
+        command = ["winget", action, "Rime.Weasel", "-e", "--source", "winget"]
+        if not self.interactive:
+            command += [
+                "--silent",
+                "--disable-interactivity",
+                "--accept-package-agreements",
+                "--accept-source-agreements",
+            ]
         try:
-            subprocess.run(
-                ["winget", "install", "Rime.Weasel", "-e", "--source", "winget"],
-                check=True,
-            )
+            self.run_installer(command)
             console.print("[green]Weasel 已通过 Winget 成功安装。[/green]")
-        except subprocess.CalledProcessError:
-            console.print(
-                "[yellow]Winget 安装失败或 Weasel 已安装。如果不存在，请确保手动安装 Weasel。[/yellow]"
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            self.install_failed(
+                "Winget 安装失败或 Weasel 已安装。如果不存在，请确保手动安装 Weasel。"
             )
 
     def get_config_dir(self) -> Path:
@@ -65,65 +130,116 @@ class WindowsRimeManager(RimeManager):
 class MacRimeManager(RimeManager):
     def install_rime(self):
         console.print("[cyan]正在检查 Squirrel (鼠须管)...[/cyan]")
+        state = report_installed("Squirrel", probe_squirrel())
+        if state == "current":
+            return
+        action = "upgrade" if state == "outdated" else "install"
+        env = None
+        if not self.interactive:
+            # Homebrew 的非交互模式：不等待确认，需要密码时直接失败
+            env = {**os.environ, "NONINTERACTIVE": "1"}
         try:
-            subprocess.run(["brew", "install", "--cask", "squirrel"], check=True)
+            self.run_installer(["brew", action, "--cask", "squirrel"], env=env)
             console.print("[green]Squirrel 已通过 Homebrew 成功安装。[/green]")
         except subprocess.CalledProcessError:
-            console.print(
-                "[yellow]Homebrew 安装失败。请确保手动安装 Squirrel。[/yellow]"
-            )
+            self.install_failed("Homebrew 安装失败。请确保手动安装 Squirrel。")
         except FileNotFoundError:
-            console.print(
-                "[red]未找到 Homebrew。请安装 Homebrew 或手动安装 Squirrel。[/red]"
+            self.install_failed(
+                "未找到 Homebrew。请安装 Homebrew 或手动安装 Squirrel。"
             )
 
     def get_config_dir(self) -> Path:
         return Path.home() / "Library" / "Rime"
 
 
+# Linux 上各输入法框架的 Rime 配置目录（相对于用户主目录）、对应的软件包，
+# 以及该软件包必然依赖的框架程序
+LINUX_FRONTENDS = {
+    "fcitx5": (Path(".local/share/fcitx5/rime"), "fcitx5-rime", "fcitx5"),
+    "ibus": (Path(".config/ibus/rime"), "ibus-rime", "ibus-daemon"),
+    "fcitx": (Path(".config/fcitx/rime"), "fcitx-rime", "fcitx"),
+}
+
+
 class LinuxRimeManager(RimeManager):
-    def __init__(self):
-        self.variant = "fcitx5"  # 默认为 fcitx5
+    def __init__(self, variant=None):
+        # 未指定时使用第一个已有 Rime 目录的框架，都没有时默认为 fcitx5
+        self.variant = variant or next(
+            (name for name in LINUX_FRONTENDS if self._frontend_dir(name).exists()),
+            "fcitx5",
+        )
+
+    @staticmethod
+    def _frontend_dir(variant) -> Path:
+        return Path.home() / LINUX_FRONTENDS[variant][0]
 
     def install_rime(self):
+        _, package, binary = LINUX_FRONTENDS[self.variant]
         console.print("[cyan]Linux Rime 安装[/cyan]")
-        console.print("检测到 Linux。正在尝试安装 fcitx5-rime (推荐)...")
+        # 查询软件包数据库（结果缓存），已安装且版本满足要求时不再调用 sudo 和包管理器
+        state = report_installed(package, probe_package(package, binary))
+        if state == "current":
+            return
+        if state == "outdated":
+            console.print(f"检测到 Linux。正在尝试升级 {package}...")
+        else:
+            console.print(f"检测到 Linux。正在尝试安装 {package}...")
+        # apt install 和 pacman -S 对已安装的软件包即为升级，dnf 需要 upgrade
+        dnf_action = "upgrade" if state == "outdated" else "install"
 
         # 简单的包管理器检测
-        pkg_managers = {
-            "apt": ["sudo", "apt", "install", "fcitx5-rime"],
-            "pacman": ["sudo", "pacman", "-S", "fcitx5-rime"],
-            "dnf": ["sudo", "dnf", "install", "fcitx5-rime"],
-        }
+        if self.interactive:
+            pkg_managers = {
+                "apt": ["sudo", "apt", "install", package],
+                "pacman": ["sudo", "pacman", "-S", package],
+                "dnf": ["sudo", "dnf", dnf_action, package],
+            }
+        else:
+            # sudo -n 需要密码时立即失败；包管理器自动确认
+            pkg_managers = {
+                "apt": ["sudo", "-n", "apt-get", "install", "-y", package],
+                "pacman": ["sudo", "-n", "pacman", "-S", "--noconfirm", package],
+                "dnf": ["sudo", "-n", "dnf", dnf_action, "-y", package],
+            }
 
         installed = False
         for mgr, cmd in pkg_managers.items():
             if shutil.which(mgr):
                 try:
                     console.print(f"正在运行: {' '.join(cmd)}")
-                    subprocess.run(cmd, check=True)
+                    self.run_installer(cmd)
                     installed = True
                     break
                 except subprocess.CalledProcessError:
                     console.print(f"[red]通过 {mgr} 安装失败。[/red]")
 
         if not installed:
-            console.print(
-                "[yellow]无法检测到支持的包管理器或安装失败。请手动安装 'fcitx5-rime'。[/yellow]"
+            self.install_failed(
+                f"无法检测到支持的包管理器或安装失败。请手动安装 '{package}'。"
             )
 
     def get_config_dir(self) -> Path:
-        # Fcitx5 rime 路径
-        return Path.home() / ".local" / "share" / "fcitx5" / "rime"
+        return self._frontend_dir(self.variant)
+
+    def get_config_dirs(self) -> list[Path]:
+        """主框架的目录，以及其它已在使用 Rime 的框架（目录已存在）的目录。"""
+        return [self.get_config_dir()] + [
+            self._frontend_dir(name)
+            for name in LINUX_FRONTENDS
+            if name != self.variant and self._frontend_dir(name).exists()
+        ]
 
 
-def get_manager() -> RimeManager:
+def get_manager(interactive=True) -> RimeManager:
+    """interactive=False 用于无人值守部署，见 RimeManager.interactive。"""
     system = platform.system()
     if system == "Windows":
-        return WindowsRimeManager()
+        manager = WindowsRimeManager()
     elif system == "Darwin":
-        return MacRimeManager()
+        manager = MacRimeManager()
     elif system == "Linux":
-        return LinuxRimeManager()
+        manager = LinuxRimeManager()
     else:
         raise OSError(f"不支持的操作系统: {system}")
+    manager.interactive = interactive
+    return manager
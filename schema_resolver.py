@@ -0,0 +1,176 @@
+import json
+import posixpath
+import re
+import zipfile
+
+import yaml
+from rich.console import Console
+
+from utils import zip_members
+
+console = Console()
+
+# engine 组件中 librime-lua 的模块引用，如 lua_translator@*date_translator
+LUA_COMPONENT_RE = re.compile(r"^lua_\w+@\*(.+)$")
+# Lua 脚本中的 require("module")
+LUA_REQUIRE_RE = re.compile(r"""require\s*\(?\s*["']([\w./]+)["']""")
+
+
+class SchemaResolver:
+    """
+    解析上游归档（或 git 提交）中的方案依赖，计算所选方案实际需要的文件集合。
+
+    顶层的普通配置文件（default.yaml、symbols 等）总是安装；
+    *.schema.yaml、*.dict.yaml 以及 cn_dicts/、opencc/、lua/ 等子目录中的文件
+    只有被所选方案直接或间接引用时才安装。
+    """
+
+    def __init__(self, members, read):
+        """members 为全部文件的相对路径，read(rel) 返回文件内容（bytes）。"""
+        self.members = set(members)
+        self.read_member = read
+        self.needed = set()
+        # 已解析过引用的 yaml 文件（顶层 yaml 虽然总会安装，仍需检查其中的引用）
+        self.walked = set()
+
+    def resolve(self, selected_schemas):
+        """
+        返回所选方案依赖闭包中的文件相对路径集合。
+        如果某个方案在归档中不存在，返回 None 表示需要完整安装。
+        """
+        for schema_id in selected_schemas:
+            if f"{schema_id}.schema.yaml" not in self.members:
+                console.print(
+                    f"[yellow]归档中未找到方案 {schema_id}，将执行完整安装。[/yellow]"
+                )
+                return None
+
+        for rel in self.members:
+            if "/" not in rel and not rel.endswith((".schema.yaml", ".dict.yaml")):
+                self.needed.add(rel)
+
+        for schema_id in selected_schemas:
+            self._add_schema(schema_id)
+        return self.needed
+
+    def _add(self, rel):
+        """记录一个文件，返回 True 表示该文件存在且第一次被加入。"""
+        rel = posixpath.normpath(rel)
+        if rel not in self.members or rel in self.needed:
+            return False
+        self.needed.add(rel)
+        return True
+
+    def _read(self, rel):
+        return self.read_member(rel).decode("utf-8", errors="replace")
+
+    def _add_schema(self, schema_id):
+        rel = f"{schema_id}.schema.yaml"
+        if not self._add(rel):
+            return
+        data = self._load_yaml(self._read(rel))
+        deps = (data.get("schema") or {}).get("dependencies") or []
+        for dep in deps:
+            self._add_schema(str(dep))
+        self._walk(data)
+
+    def _add_yaml(self, name):
+        """被 __include / __patch / import_preset 引用的 yaml 文件。"""
+        rel = posixpath.normpath(name if name.endswith(".yaml") else f"{name}.yaml")
+        if rel not in self.members or rel in self.walked:
+            return
+        self.walked.add(rel)
+        self.needed.add(rel)
+        self._walk(self._load_yaml(self._read(rel)))
+
+    def _add_dict(self, name):
+        rel = f"{name}.dict.yaml"
+        if not self._add(rel):
+            return
+        # 词典正文可能有几十 MB，只解析 --- 与 ... 之间的头部
+        header = []
+        for line in self._read(rel).splitlines():
+            if line.strip() == "...":
+                break
+            header.append(line)
+        data = self._load_yaml("\n".join(header))
+        for table in data.get("import_tables") or []:
+            self._add_dict(str(table))
+
+    def _add_opencc(self, name):
+        rel = f"opencc/{name}"
+        if not self._add(rel) or not rel.endswith(".json"):
+            return
+        try:
+            config = json.loads(self._read(rel))
+        except ValueError:
+            return
+        for file_name in self._opencc_files(config):
+            self._add(f"opencc/{file_name}")
+
+    def _opencc_files(self, node):
+        """递归找出 OpenCC 配置中所有 dict.file 引用。"""
+        if isinstance(node, dict):
+            if isinstance(node.get("file"), str):
+                yield node["file"]
+            for value in node.values():
+                yield from self._opencc_files(value)
+        elif isinstance(node, list):
+            for value in node:
+                yield from self._opencc_files(value)
+
+    def _add_lua(self, module):
+        path = module.replace(".", "/")
+        for rel in (f"lua/{path}.lua", f"lua/{path}/init.lua"):
+            if self._add(rel):
+                for required in LUA_REQUIRE_RE.findall(self._read(rel)):
+                    self._add_lua(required)
+
+    def _walk(self, node):
+        """遍历方案数据，按键名识别其中引用的文件。"""
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str):
+                    self._reference(str(key), value)
+                elif key in ("__include", "__patch") and isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, str):
+                            self._reference(key, item)
+                self._walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                if isinstance(value, str):
+                    match = LUA_COMPONENT_RE.match(value)
+                    if match:
+                        # *module*function@namespace -> module
+                        self._add_lua(re.split(r"[*@]", match.group(1))[0])
+                else:
+                    self._walk(value)
+
+    def _reference(self, key, value):
+        if key == "dictionary" and value:
+            self._add_dict(value)
+        elif key == "opencc_config":
+            self._add_opencc(value)
+        elif key == "import_preset":
+            self._add_yaml(value)
+        elif key in ("__include", "__patch") and ":" in value:
+            # file:/path 形式引用其它文件，不带文件名的是当前文件内部引用
+            file_name = value.split(":", 1)[0]
+            if file_name:
+                self._add_yaml(file_name)
+
+    @staticmethod
+    def _load_yaml(text):
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+
+def resolve_schema_files(zip_ref: zipfile.ZipFile, selected_schemas):
+    """计算归档中所选方案需要安装的文件集合，见 SchemaResolver。"""
+    members = dict(zip_members(zip_ref))
+    resolver = SchemaResolver(members, lambda rel: zip_ref.read(members[rel]))
+    return resolver.resolve(selected_schemas)
@@ -0,0 +1,139 @@
+import copy
+import json
+import threading
+import time
+from pathlib import Path
+
+from rich.console import Console
+
+from materialize import atomic_write
+
+console = Console()
+
+SETTINGS_FILE = Path(__file__).parent / "settings.json"
+SCHEMA_VERSION = 1
+
+# settings.json 中已知的键及其类型；类型不符的值在读取时丢弃，按未设置处理
+#   config_source / selected_schemas      - 基础配置源与启用的方案
+#   fetch_mode / selective_install / transactional_install
+#   backup_keep / backup_keep_days        - 备份保留策略
+#   proxy / mirrors / lan_cache           - 网络设置（见 http_client.configure）
+#   trusted_digests                       - 各配置源归档期望的 SHA-256，下载内容不符时换地址重试
+#   extra_targets                         - 主 Rime 目录之外还要部署的目录
+#   installed                             - 各配置源已安装的提交和归档摘要
+#   last_sync                             - 各 Rime 目录上次同步 custom_config 时的输入指纹
+SCHEMA = {
+    "version": int,
+    "config_source": str,
+    "selected_schemas": list,
+    "fetch_mode": str,
+    "selective_install": bool,
+    "transactional_install": bool,
+    "backup_keep": int,
+    "backup_keep_days": (int, float),
+    "proxy": str,
+    "mirrors": list,
+    "lan_cache": str,
+    "trusted_digests": dict,
+    "extra_targets": list,
+    "installed": dict,
+    "last_sync": dict,
+}
+
+
+def migrate(settings: dict) -> dict:
+    """将旧版本（没有 version 字段）的设置转换为当前结构。"""
+    for key, expected in SCHEMA.items():
+        if key in settings and not isinstance(settings[key], expected):
+            console.print(f"[yellow]忽略 settings.json 中类型不正确的 {key}。[/yellow]")
+            del settings[key]
+    settings["version"] = SCHEMA_VERSION
+    return settings
+
+
+class SettingsStore:
+    """
+    settings.json 在进程内只解析一次，之后每次读取只检查文件的 mtime 和大小，
+    被其它进程修改过时才重新解析。写入通过临时文件原子替换，不会留下写了一半的文件。
+    """
+
+    def __init__(self, path: Path = SETTINGS_FILE):
+        self.path = Path(path)
+        self.data = None
+        self.stat = None
+        self.lock = threading.RLock()
+
+    def _file_stat(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        stat = self._file_stat()
+        if self.data is not None and stat == self.stat:
+            return
+        data = {}
+        if stat is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if not isinstance(data, dict):
+                data = {}
+        self.data = migrate(data)
+        self.stat = stat
+
+    def load(self) -> dict:
+        """返回当前设置的副本，调用方修改后通过 save 写回。"""
+        with self.lock:
+            self._refresh()
+            return copy.deepcopy(self.data)
+
+    def save(self, settings: dict):
+        with self.lock:
+            data = migrate(copy.deepcopy(settings))
+            payload = json.dumps(data, ensure_ascii=False, indent=4)
+            atomic_write(self.path, payload.encode("utf-8"))
+            self.data = data
+            self.stat = self._file_stat()
+
+    def update(self, func):
+        """在锁内读取、修改并写回设置，避免并行的步骤互相覆盖。"""
+        with self.lock:
+            settings = self.load()
+            func(settings)
+            self.save(settings)
+
+    def installed(self, source_id: str) -> dict:
+        """返回配置源已安装的记录: commit、archive_sha256、time。"""
+        return self.load().get("installed", {}).get(source_id, {})
+
+    def record_install(self, source_id: str, commit=None, archive_sha256=None):
+        def change(settings):
+            settings.setdefault("installed", {})[source_id] = {
+                "commit": commit,
+                "archive_sha256": archive_sha256,
+                "time": round(time.time()),
+            }
+
+        self.update(change)
+
+    def last_sync(self, config_dir: Path):
+        """返回该 Rime 目录上次同步 custom_config 时的输入指纹，未同步过时返回 None。"""
+        entry = self.load().get("last_sync", {}).get(str(config_dir))
+        return entry["fingerprint"] if entry else None
+
+    def record_sync(self, config_dir: Path, fingerprint: str):
+        def change(settings):
+            settings.setdefault("last_sync", {})[str(config_dir)] = {
+                "fingerprint": fingerprint,
+                "time": round(time.time()),
+            }
+
+        self.update(change)
+
+
+store = SettingsStore()
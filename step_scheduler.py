@@ -0,0 +1,104 @@
+"""
+按依赖关系并行执行部署步骤。
+
+每个任务声明它依赖的任务，依赖全部完成后立即在线程中开始执行；
+互不依赖的任务（例如下载上游配置与安装输入法、备份）同时进行，
+总耗时接近最长的一条依赖链，而不是所有步骤之和。
+"""
+
+import asyncio
+import time
+
+from instrumentation import in_current_span
+
+
+class Task:
+    """
+    name: 任务名，供其它任务在 after 中引用
+    func: 以已完成任务的结果字典为参数的函数，在线程中执行
+    after: 必须先完成的任务名
+    step: 对应的步骤编号（Step 01~04），用于进度报告
+    """
+
+    def __init__(self, name, func, after=(), step=None):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.step = step
+
+
+class TaskFailed(Exception):
+    """某个任务失败；依赖它的任务不会执行，已在执行的其它任务会等待其结束。"""
+
+    def __init__(self, task, error):
+        super().__init__(f"{task.name}: {error}")
+        self.task = task
+        self.error = error
+
+
+def _check(tasks):
+    names = {task.name for task in tasks}
+    if len(names) != len(tasks):
+        raise ValueError("任务名重复")
+    for task in tasks:
+        missing = set(task.after) - names
+        if missing:
+            raise ValueError(f"{task.name} 依赖未知的任务: {', '.join(missing)}")
+
+    # 拓扑排序检查循环依赖
+    done = set()
+    pending = list(tasks)
+    while pending:
+        ready = [t for t in pending if set(t.after) <= done]
+        if not ready:
+            raise ValueError(
+                f"任务之间存在循环依赖: {', '.join(t.name for t in pending)}"
+            )
+        done.update(t.name for t in ready)
+        pending = [t for t in pending if t.name not in done]
+
+
+async def run_tasks(tasks, on_start=None, on_end=None):
+    """
+    执行 tasks 直到全部完成，返回 {任务名: 结果}。
+    on_start(task) / on_end(task, seconds) 在任务开始和结束时调用。
+    任一任务失败时不再启动新任务，等待已开始的任务结束后抛出 TaskFailed。
+    """
+    tasks = list(tasks)
+    _check(tasks)
+    results = {}
+    finished = {task.name: asyncio.Event() for task in tasks}
+    failures = []
+
+    async def run(task):
+        for name in task.after:
+            await finished[name].wait()
+        if failures or any(name not in results for name in task.after):
+            finished[task.name].set()
+            return
+        if on_start:
+            on_start(task)
+        start = time.perf_counter()
+        try:
+            # 在线程中执行时，计数仍累加到调用方所在的 Span 上
+            results[task.name] = await asyncio.to_thread(
+                in_current_span(task.func), results
+            )
+        # 任务的任何异常都记录下来，由调用方以 TaskFailed 抛出
+        except Exception as e:  # noqa: BLE001
+            failures.append(TaskFailed(task, e))
+        else:
+            if on_end:
+                on_end(task, time.perf_counter() - start)
+        finally:
+            finished[task.name].set()
+
+    await asyncio.gather(*(run(task) for task in tasks))
+    if failures:
+        raise failures[0]
+    return results
+
+
+def run(tasks, on_start=None, on_end=None):
+    """run_tasks 的同步入口。"""
+    return asyncio.run(run_tasks(tasks, on_start, on_end))
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 各模块在导入时确定用户缓存目录（内容存储、探测缓存、git 浅克隆、镜像健康记录），
+# 测试期间指向临时目录，不读写真实的缓存
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="rime-auto-deploy-tests-")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    """每个测试使用独立的镜像健康记录，熔断状态不互相影响。"""
+    import utils
+    from mirror_scheduler import MirrorScheduler
+
+    scheduler = MirrorScheduler(tmp_path / "mirrors.json")
+    monkeypatch.setattr(utils, "scheduler", scheduler)
+    return scheduler
+
+
+@pytest.fixture
+def blob_store(tmp_path, monkeypatch):
+    """每个测试使用独立的内容存储。"""
+    import blob_store
+    import config_integrator
+    import utils
+
+    store = blob_store.BlobStore(tmp_path / "blobs")
+    for module in (blob_store, utils, config_integrator):
+        monkeypatch.setattr(module, "blobs", store)
+    return store
@@ -0,0 +1,93 @@
+import os
+
+import utils
+from config_integrator import FileBackup
+from utils import SNAPSHOT_MARKER, backup_dir, prune_backups
+
+
+def make_rime_dir(root, files):
+    rime_dir = root / "Rime"
+    for rel, text in files.items():
+        path = rime_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return rime_dir
+
+
+def backups(rime_dir, kind="backup"):
+    return utils._list_backups(rime_dir, kind)
+
+
+def test_partial_backup_never_lands_in_a_snapshot(tmp_path):
+    rime_dir = make_rime_dir(tmp_path, {"a.yaml": "a\n", "b.yaml": "b\n"})
+    backup_dir(rime_dir)
+    backup_file = FileBackup(rime_dir, {})
+    # 与快照在同一秒内创建
+    backup_file("a.yaml")
+
+    [snapshot] = backups(rime_dir)
+    [partial] = backups(rime_dir, "partial_backup")
+    assert (snapshot / SNAPSHOT_MARKER).exists()
+    assert sorted(os.listdir(partial)) == ["a.yaml"]
+
+
+def test_partial_backups_do_not_count_toward_snapshot_retention(tmp_path):
+    rime_dir = make_rime_dir(tmp_path, {"a.yaml": "a\n"})
+    for i in range(3):
+        (rime_dir / "a.yaml").write_text(f"{i}\n")
+        backup_dir(rime_dir)
+        FileBackup(rime_dir, {})("a.yaml")
+    # 没有标记文件的目录（如旧版本整体移走的备份）既不计数也不清理
+    legacy = tmp_path / "Rime_backup_19990101_000000"
+    legacy.mkdir()
+
+    prune_backups(rime_dir, keep=2)
+    snapshots = [p for p in backups(rime_dir) if (p / SNAPSHOT_MARKER).exists()]
+    assert len(snapshots) == 2
+    assert legacy.exists()
+    assert len(backups(rime_dir, "partial_backup")) == 3
+
+    prune_backups(rime_dir, keep=1, kind="partial_backup")
+    assert len(backups(rime_dir, "partial_backup")) == 1
+
+
+def test_unchanged_files_link_to_previous_snapshot(tmp_path):
+    rime_dir = make_rime_dir(
+        tmp_path, {"a.yaml": "a\n", "b.yaml": "b\n", "build/a.bin": "x"}
+    )
+    backup_dir(rime_dir)
+    (rime_dir / "b.yaml").write_text("changed\n")
+    backup_dir(rime_dir)
+
+    first, second = backups(rime_dir)
+    assert os.path.samefile(first / "a.yaml", second / "a.yaml")
+    assert (first / "b.yaml").read_text() == "b\n"
+    assert (second / "b.yaml").read_text() == "changed\n"
+    # build/ 可重新生成，不进入快照
+    assert not (second / "build").exists()
+
+
+def test_identical_snapshot_is_not_created(tmp_path):
+    rime_dir = make_rime_dir(tmp_path, {"a.yaml": "a\n", "lua/x.lua": "x\n"})
+    backup_dir(rime_dir)
+    backup_dir(rime_dir)
+    assert len(backups(rime_dir)) == 1
+
+    # 删除文件也算变化
+    (rime_dir / "lua/x.lua").unlink()
+    backup_dir(rime_dir)
+    assert len(backups(rime_dir)) == 2
+
+
+def test_snapshot_retention_keeps_latest(tmp_path):
+    rime_dir = make_rime_dir(tmp_path, {"a.yaml": "a\n", "b.yaml": ""})
+    # 每次修改都改变大小：快照按大小和修改时间判断文件是否变化
+    for i in range(1, 4):
+        backup_dir(rime_dir, keep=2)
+        (rime_dir / "b.yaml").write_text("b" * i)
+    backup_dir(rime_dir, keep=2)
+
+    remaining = backups(rime_dir)
+    assert [(p / "b.yaml").read_text() for p in remaining] == ["bb", "bbb"]
+    # 清理旧快照不影响仍链接着同一文件的新快照
+    assert all((p / "a.yaml").read_text() == "a\n" for p in remaining)
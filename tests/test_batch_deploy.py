@@ -0,0 +1,42 @@
+import json
+
+import batch_deploy
+import deploy_steps
+
+
+class Manager:
+    def __init__(self, dirs):
+        self.dirs = dirs
+
+    def get_config_dir(self):
+        return self.dirs[0]
+
+    def get_config_dirs(self):
+        return self.dirs
+
+
+def test_dry_run_plans_every_target(tmp_path, monkeypatch, capsys):
+    dirs = [tmp_path / "fcitx5" / "rime", tmp_path / "ibus" / "rime"]
+    for d in dirs:
+        d.mkdir(parents=True)
+        (d / "user.yaml").write_text("var: {}\n")
+    extra = tmp_path / "sync"
+    monkeypatch.setattr(
+        deploy_steps, "load_settings", lambda: {"extra_targets": [str(extra)]}
+    )
+
+    plan = {"steps": [1, 2, 4], "schemas": ["rime_ice"], "source": "rime-ice"}
+    batch_deploy.dry_run(Manager(dirs), plan)
+    out, err = capsys.readouterr()
+    events = [json.loads(line) for line in out.splitlines()]
+
+    assert [(e["step"], e.get("dir")) for e in events] == [
+        (1, None),
+        *((2, str(d)) for d in (*dirs, extra)),
+        *((4, str(d)) for d in (*dirs, extra)),
+    ]
+    assert all("default.custom.yaml" in e["write"] for e in events if e["step"] == 4)
+    # 只是计划，不写入也不报告已同步
+    assert "已同步到 Rime" not in err
+    assert not extra.exists()
+    assert all(sorted(p.name for p in d.iterdir()) == ["user.yaml"] for d in dirs)
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import stat
+
+from blob_store import INDEX_NAME
+
+
+def is_writable(path):
+    return bool(path.stat().st_mode & stat.S_IWUSR)
+
+
+def test_identical_content_is_stored_once(tmp_path, blob_store):
+    a, b = tmp_path / "a" / "x.dict.yaml", tmp_path / "b" / "x.dict.yaml"
+    a.parent.mkdir()
+    b.parent.mkdir()
+    digest = blob_store.write(a, b"data")
+    assert blob_store.write(b, b"data") == digest == hashlib.sha256(b"data").hexdigest()
+
+    assert os.path.samefile(a, b)
+    assert os.path.samefile(a, blob_store.path(digest))
+    # 共享的文件是只读的，原地修改会影响所有链接到它的目录
+    assert not is_writable(a)
+    assert blob_store.holds(digest, a)
+
+
+def test_editable_files_are_written_separately(tmp_path, blob_store):
+    dest = tmp_path / "default.custom.yaml"
+    digest = blob_store.write(dest, b"patch: {}\n")
+    assert dest.read_bytes() == b"patch: {}\n"
+    assert dest.stat().st_nlink == 1
+    assert is_writable(dest)
+    assert not blob_store.holds(digest, dest)
+    # 单独保存的文件沿用清单的记录
+    assert blob_store.trusted(digest, dest)
+
+
+def test_modified_object_is_not_trusted(tmp_path, blob_store):
+    dest = tmp_path / "x.dict.yaml"
+    digest = blob_store.write(dest, b"data")
+    # 用户修改权限后原地编辑了链接的文件
+    dest.chmod(0o644)
+    dest.write_bytes(b"edited data")
+
+    assert not blob_store.intact(digest)
+    assert not blob_store.holds(digest, dest)
+    assert not blob_store.trusted(digest, dest)
+    assert not blob_store.link(digest, tmp_path / "other.dict.yaml")
+
+    # 重新写入时替换存储中的对象，已修改的文件保持原样
+    other = tmp_path / "other.dict.yaml"
+    blob_store.write(other, b"data")
+    assert other.read_bytes() == b"data"
+    assert dest.read_bytes() == b"edited data"
+    assert blob_store.holds(digest, other)
+
+
+def test_prune_keeps_linked_objects(tmp_path, blob_store):
+    blob_store.max_unreferenced = 0
+    dest = tmp_path / "x.dict.yaml"
+    linked = blob_store.write(dest, b"linked")
+    unused = blob_store.put(b"unused")
+
+    blob_store.prune()
+    assert blob_store.path(linked).exists()
+    assert not blob_store.path(unused).exists()
+    with open(blob_store.root / INDEX_NAME, encoding="utf-8") as f:
+        assert set(json.load(f)) == {linked}
+
+
+def test_prune_keeps_recent_unreferenced_objects(tmp_path, blob_store):
+    old = blob_store.put(b"old")
+    recent = blob_store.put(b"recent")
+    blob_store.index[old][2] -= 3600
+    blob_store.max_unreferenced = len(b"recent")
+
+    blob_store.prune()
+    assert not blob_store.path(old).exists()
+    assert blob_store.path(recent).exists()
+
+
+def test_disabled_store_writes_plain_files(tmp_path, blob_store):
+    blob_store.enabled = False
+    dest = tmp_path / "x.dict.yaml"
+    digest = blob_store.write(dest, b"data")
+    assert digest == hashlib.sha256(b"data").hexdigest()
+    assert dest.read_bytes() == b"data"
+    assert is_writable(dest)
+    assert not blob_store.path(digest).exists()
@@ -0,0 +1,70 @@
+import os
+import zipfile
+
+import pytest
+
+import config_integrator
+from config_integrator import ConfigIntegrator, FetchedSource
+
+
+def make_archive(path, files, top="plain-main"):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for rel, text in files.items():
+            zf.writestr(f"{top}/{rel}", text)
+    return path
+
+
+def test_archive_source_without_branch(tmp_path, blob_store, monkeypatch):
+    # 只提供归档地址的配置源（如基准测试中的 bench）没有 branch
+    monkeypatch.setitem(
+        config_integrator.CONFIG_SOURCES, "plain", {"name": "plain", "url": ""}
+    )
+    archive = make_archive(
+        tmp_path / "plain.zip", {"a.dict.yaml": "a\n", "lua/x.lua": "x\n"}
+    )
+    rime_dir = tmp_path / "Rime"
+    integrator = ConfigIntegrator(rime_dir)
+    fetched = FetchedSource("plain", zip_path=archive)
+    assert integrator.install_base_config(fetched=fetched) is None
+    assert (rime_dir / "a.dict.yaml").read_text() == "a\n"
+    assert (rime_dir / "lua" / "x.lua").read_text() == "x\n"
+
+    integrator.install_base_config(incremental=True, fetched=fetched)
+    assert integrator.load_manifest()["source"] == "plain"
+
+
+def test_replicate_links_primary_files(tmp_path, blob_store, monkeypatch):
+    monkeypatch.setitem(
+        config_integrator.CONFIG_SOURCES, "plain", {"name": "plain", "url": ""}
+    )
+    files = {"a.dict.yaml": "a\n", "b.dict.yaml": "b\n", "custom_phrase.txt": "p\n"}
+    primary, secondary = tmp_path / "fcitx5" / "rime", tmp_path / "ibus" / "rime"
+    fetched = FetchedSource("plain", zip_path=make_archive(tmp_path / "v1.zip", files))
+    ConfigIntegrator(primary).install_base_config(fetched=fetched)
+
+    replica = ConfigIntegrator(secondary)
+    replica.replicate_base_config(primary)
+    assert os.path.samefile(primary / "a.dict.yaml", secondary / "a.dict.yaml")
+    # 供用户编辑的文件各目录单独保存
+    assert (secondary / "custom_phrase.txt").read_text() == "p\n"
+    assert not os.path.samefile(
+        primary / "custom_phrase.txt", secondary / "custom_phrase.txt"
+    )
+    assert replica.load_manifest()["files"] == (
+        ConfigIntegrator(primary).load_manifest()["files"]
+    )
+
+    # 增量更新：只同步变化的文件，删除上游已移除的文件
+    del files["b.dict.yaml"]
+    files["a.dict.yaml"] = "a2\n"
+    fetched = FetchedSource("plain", zip_path=make_archive(tmp_path / "v2.zip", files))
+    ConfigIntegrator(primary).install_base_config(incremental=True, fetched=fetched)
+    replica.replicate_base_config(primary, incremental=True)
+    assert (secondary / "a.dict.yaml").read_text() == "a2\n"
+    assert os.path.samefile(primary / "a.dict.yaml", secondary / "a.dict.yaml")
+    assert not (secondary / "b.dict.yaml").exists()
+
+
+def test_replicate_requires_primary_manifest(tmp_path, blob_store):
+    with pytest.raises(RuntimeError):
+        ConfigIntegrator(tmp_path / "ibus").replicate_base_config(tmp_path / "fcitx5")
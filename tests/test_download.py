@@ -0,0 +1,152 @@
+import hashlib
+import io
+import os
+import random
+import threading
+import zipfile
+
+import pytest
+
+import utils
+from benchmark import FakeGitHub
+from integrity import IntegrityError, StreamVerifier
+
+
+def make_zip(size=2 * 1024 * 1024, seed=0):
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for i in range(8):
+            zf.writestr(f"top/d{i}.dict.yaml", rng.randbytes(size // 8))
+    return buffer.getvalue()
+
+
+def verify_with(data):
+    sha256 = hashlib.sha256(data).hexdigest()
+    return lambda headers: StreamVerifier(sha256, check_zip=True)
+
+
+@pytest.fixture
+def archive():
+    return make_zip()
+
+
+@pytest.fixture
+def ranged(monkeypatch):
+    """让测试用的小归档也走分段下载。"""
+    monkeypatch.setattr(utils, "PARALLEL_MIN_BYTES", 256 * 1024)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(utils, "_backoff", lambda attempt: 0)
+
+
+def test_single_stream_resumes_after_interruptions(
+    tmp_path, scheduler, archive, no_backoff
+):
+    dest = tmp_path / "out.zip"
+    with FakeGitHub(fail_rate=0.5, seed=3) as server:
+        url = server.publish("main.zip", archive)
+        utils.download_file(
+            url, dest, max_retries=10, chunks=1, verify=verify_with(archive)
+        )
+        # 中断后只请求剩余字节，总传输量远小于每次重新下载
+        assert server.requests > 1
+        assert server.bytes_sent < len(archive) * 2
+    assert dest.read_bytes() == archive
+
+
+def test_ranged_download_verifies_in_order(tmp_path, scheduler, archive, ranged):
+    dest = tmp_path / "out.zip"
+    with FakeGitHub() as server:
+        url = server.publish("main.zip", archive)
+        utils.download_file(url, dest, chunks=4, verify=verify_with(archive))
+        assert server.requests == 4
+    assert dest.read_bytes() == archive
+
+
+def test_ranged_download_retries_segments(
+    tmp_path, scheduler, archive, ranged, no_backoff
+):
+    dest = tmp_path / "out.zip"
+    with FakeGitHub(fail_rate=0.3, seed=1) as server:
+        url = server.publish("main.zip", archive)
+        utils.download_file(
+            url, dest, max_retries=5, chunks=4, verify=verify_with(archive)
+        )
+    assert dest.read_bytes() == archive
+
+
+def test_ranged_download_with_small_feed_buffer(
+    tmp_path, scheduler, archive, ranged, monkeypatch
+):
+    # 缓存上限远小于分段大小时，后面的分段等待校验追上，不会死锁
+    monkeypatch.setattr(utils._OrderedFeed.__init__, "__defaults__", (64 * 1024,))
+    dest = tmp_path / "out.zip"
+    with FakeGitHub(bandwidth=50 * 1024 * 1024) as server:
+        url = server.publish("main.zip", archive)
+        utils.download_file(url, dest, chunks=4, verify=verify_with(archive))
+    assert dest.read_bytes() == archive
+
+
+def test_corrupt_content_is_rejected(tmp_path, scheduler, archive, ranged):
+    corrupt = bytearray(archive)
+    corrupt[len(corrupt) // 2] ^= 0xFF
+    with FakeGitHub() as server:
+        url = server.publish("main.zip", bytes(corrupt))
+        with pytest.raises(IntegrityError):
+            utils.download_file(
+                url, tmp_path / "out.zip", chunks=4, verify=verify_with(archive)
+            )
+        # 校验失败的地址不会被续传或重试
+        assert server.requests == 4
+
+
+def test_fails_over_to_next_address_on_bad_content(
+    tmp_path, scheduler, archive, monkeypatch
+):
+    dest = tmp_path / "out.zip"
+    with FakeGitHub() as mirror, FakeGitHub() as origin:
+        bad = mirror.publish("main.zip", make_zip(seed=1))
+        good = origin.publish("main.zip", archive)
+        # 返回错误内容的镜像排在最前面
+        monkeypatch.setattr(scheduler, "candidates", lambda url, size=None: [bad, good])
+        utils.download_file(good, dest, verify=verify_with(archive))
+        assert mirror.requests == 1
+    assert dest.read_bytes() == archive
+    assert scheduler._entry(bad)["failures"] == 1
+
+
+def test_ordered_feed_reassembles_out_of_order_chunks():
+    data = os.urandom(300 * 1024)
+    bounds = [(0, 100 * 1024), (100 * 1024, 200 * 1024), (200 * 1024, len(data))]
+    verifier = StreamVerifier(hashlib.sha256(data).hexdigest())
+    stopped = threading.Event()
+    feed = utils._OrderedFeed(len(bounds), verifier, stopped, limit=32 * 1024)
+
+    def segment(index, start, end):
+        for pos in range(start, end, 4096):
+            feed.put(index, data[pos : min(pos + 4096, end)])
+        feed.finish(index)
+
+    # 后面的分段先开始
+    threads = [
+        threading.Thread(target=segment, args=(i, *bounds[i]), daemon=True)
+        for i in reversed(range(len(bounds)))
+    ]
+    for thread in threads:
+        thread.start()
+    feed.run()
+    for thread in threads:
+        thread.join(5)
+    assert verifier.finish() == hashlib.sha256(data).hexdigest()
+
+
+def test_ordered_feed_returns_when_stopped():
+    stopped = threading.Event()
+    feed = utils._OrderedFeed(2, StreamVerifier(), stopped)
+    feed.put(1, b"later")
+    stopped.set()
+    # 第一个分段没有数据也没有完成，取消后 run 不再等待
+    feed.run()
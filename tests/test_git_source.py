@@ -0,0 +1,149 @@
+import subprocess
+import zipfile
+
+import pytest
+
+import config_integrator
+from config_integrator import ConfigIntegrator
+from git_source import GitSource, git_available
+
+pytestmark = pytest.mark.skipif(not git_available(), reason="需要 git")
+
+
+class Upstream:
+    """临时的上游裸仓库，通过一个工作副本提交并推送。"""
+
+    def __init__(self, root):
+        self.bare = root / "upstream.git"
+        self.work = root / "work"
+        self.url = self.bare.as_uri()
+        subprocess.run(
+            ["git", "init", "--bare", "--quiet", "-b", "main", str(self.bare)],
+            check=True,
+        )
+        subprocess.run(
+            ["git", "init", "--quiet", "-b", "main", str(self.work)], check=True
+        )
+        self.git("remote", "add", "origin", self.url)
+
+    def git(self, *args):
+        return subprocess.run(
+            [
+                "git",
+                "-C",
+                str(self.work),
+                "-c",
+                "user.name=test",
+                "-c",
+                "user.email=test@example.com",
+                *args,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def commit(self, files, removed=()):
+        for rel, text in files.items():
+            path = self.work / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+        for rel in removed:
+            self.git("rm", "--quiet", rel)
+        self.git("add", "-A")
+        self.git("commit", "--quiet", "-m", "update")
+        self.git("push", "--quiet", "origin", "main")
+        return self.git("rev-parse", "HEAD").strip()
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    return Upstream(tmp_path)
+
+
+def test_fetch_only_reports_changed_paths(tmp_path, upstream):
+    first = upstream.commit(
+        {"a.dict.yaml": "a\n", "b.dict.yaml": "b\n", "lua/x.lua": "x\n"}
+    )
+    source = GitSource(upstream.url, "main", cache_dir=tmp_path / "cache")
+    assert source.fetch() == first
+    source.pin(first, "test")
+
+    second = upstream.commit(
+        {"b.dict.yaml": "b2\n", "c.dict.yaml": "c\n"}, removed=["lua/x.lua"]
+    )
+    assert source.fetch() == second
+    # 浅克隆只取最新提交，已安装的提交通过引用保留在本地
+    assert source.resolve(first) == first
+    assert source.changed_paths(first, second) == {
+        "b.dict.yaml",
+        "c.dict.yaml",
+        "lua/x.lua",
+    }
+
+
+def test_changed_paths_without_old_commit(tmp_path, upstream):
+    upstream.commit({"a.dict.yaml": "a\n"})
+    source = GitSource(upstream.url, "main", cache_dir=tmp_path / "cache")
+    head = source.fetch()
+    assert source.changed_paths("0" * 40, head) is None
+
+
+def test_archive_exports_only_requested_paths(tmp_path, upstream):
+    upstream.commit({"a.dict.yaml": "a\n", "b.dict.yaml": "b\n"})
+    source = GitSource(upstream.url, "main", cache_dir=tmp_path / "cache")
+    head = source.fetch()
+
+    archive = source.archive(head, tmp_path / "delta.zip", "src-main", {"b.dict.yaml"})
+    with zipfile.ZipFile(archive) as zf:
+        assert [n for n in zf.namelist() if not n.endswith("/")] == [
+            "src-main/b.dict.yaml"
+        ]
+
+    with source.tree(head) as tree:
+        assert tree.names == {"a.dict.yaml", "b.dict.yaml"}
+        assert tree.read("a.dict.yaml") == b"a\n"
+        with pytest.raises(KeyError):
+            tree.read("missing.yaml")
+
+
+def test_incremental_upgrade_exports_only_changed_files(
+    tmp_path, upstream, blob_store, monkeypatch
+):
+    first = upstream.commit(
+        {"a.dict.yaml": "a\n", "b.dict.yaml": "b\n", "default.yaml": "d\n"}
+    )
+    monkeypatch.setitem(
+        config_integrator.CONFIG_SOURCES,
+        "test",
+        {"name": "test", "url": "", "repo": upstream.url, "branch": "main"},
+    )
+    exported = []
+    archive = GitSource.archive
+
+    def spy(self, commit, dest, prefix, paths=None):
+        exported.append(paths)
+        return archive(self, commit, dest, prefix, paths)
+
+    monkeypatch.setattr(GitSource, "archive", spy)
+
+    rime_dir = tmp_path / "Rime"
+    integrator = ConfigIntegrator(rime_dir)
+    assert integrator.install_base_config("test", fetch_mode="git") == first
+    assert exported == [None]
+
+    second = upstream.commit({"b.dict.yaml": "b2\n"}, removed=["default.yaml"])
+    commit = integrator.install_base_config(
+        "test", incremental=True, fetch_mode="git", installed_commit=first
+    )
+    assert commit == second
+    assert exported[1] == {"b.dict.yaml"}
+    assert (rime_dir / "b.dict.yaml").read_text() == "b2\n"
+    assert (rime_dir / "a.dict.yaml").read_text() == "a\n"
+    assert not (rime_dir / "default.yaml").exists()
+
+    # 上游没有变化时不导出任何文件
+    integrator.install_base_config(
+        "test", incremental=True, fetch_mode="git", installed_commit=second
+    )
+    assert len(exported) == 2
@@ -0,0 +1,190 @@
+import sys
+
+import pytest
+
+import install_probe
+from install_probe import ProbeCache, is_outdated, probe_package, version_key
+from rime_manager import LinuxRimeManager, WindowsRimeManager
+
+# 桩程序是 sh 脚本
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="需要 /bin/sh")
+
+DEFAULT_QUERIES = dict(install_probe.PACKAGE_QUERIES)
+
+
+class Stubs:
+    """
+    PATH 中只有这里创建的桩程序，每次调用都记录到日志中。
+    """
+
+    def __init__(self, root):
+        self.bin = root / "bin"
+        self.bin.mkdir()
+        self.log = root / "calls.log"
+        self.log.touch()
+
+    def add(self, name, output="", code=0):
+        script = self.bin / name
+        script.write_text(
+            "#!/bin/sh\n"
+            f'echo "{name} $*" >> "{self.log}"\n'
+            f"printf '%s' '{output}'\n"
+            f"exit {code}\n"
+        )
+        script.chmod(0o755)
+
+    def calls(self, name=None):
+        lines = self.log.read_text().splitlines()
+        return [line for line in lines if name is None or line.split()[0] == name]
+
+
+@pytest.fixture
+def stubs(tmp_path, monkeypatch):
+    stubs = Stubs(tmp_path)
+    monkeypatch.setenv("PATH", str(stubs.bin))
+    monkeypatch.setattr(install_probe, "probe_cache", ProbeCache(tmp_path / "p.json"))
+    # 软件包数据库改为临时文件，测试中修改它们模拟安装或卸载软件
+    databases = tmp_path / "db"
+    databases.mkdir()
+    for tool, (args, _, parse) in list(install_probe.PACKAGE_QUERIES.items()):
+        db = databases / tool
+        db.write_text("0")
+        monkeypatch.setitem(install_probe.PACKAGE_QUERIES, tool, (args, [db], parse))
+    stubs.databases = databases
+    return stubs
+
+
+def dpkg_installed(version):
+    return f"install ok installed\t{version}"
+
+
+def test_version_key_ignores_epoch():
+    assert version_key("1:5.0.16-1") == (5, 0, 16, 1)
+    assert version_key("0.15.0") > version_key("0.9.30")
+    assert is_outdated("fcitx5-rime", "1:4.9.0-1")
+    assert not is_outdated("fcitx5-rime", "5.1.4-1")
+    assert not is_outdated("fcitx5-rime", None)
+    assert not is_outdated("unknown-package", "0.1")
+
+
+def test_missing_binary_needs_no_query(stubs):
+    stubs.add("dpkg-query", dpkg_installed("5.1.4-1"))
+    assert probe_package("fcitx5-rime", "fcitx5") == {
+        "installed": False,
+        "version": None,
+    }
+    assert stubs.calls() == []
+
+
+def test_probe_is_cached_until_database_changes(stubs):
+    stubs.add("fcitx5")
+    stubs.add("dpkg-query", dpkg_installed("5.1.4-1"))
+    for _ in range(3):
+        result = probe_package("fcitx5-rime", "fcitx5")
+    assert result == {"installed": True, "version": "5.1.4-1"}
+    assert len(stubs.calls("dpkg-query")) == 1
+
+    (stubs.databases / "dpkg-query").write_text("changed")
+    probe_package("fcitx5-rime", "fcitx5")
+    assert len(stubs.calls("dpkg-query")) == 2
+
+
+def test_rpm_probe_follows_database_file(stubs):
+    # 默认按数据库文件而不是 /var/lib/rpm 目录的 mtime 判断是否变化
+    assert "/var/lib/rpm/rpmdb.sqlite" in DEFAULT_QUERIES["rpm"][1]
+    stubs.add("rpm", "5.1.4-1.fc40")
+    assert probe_package("fcitx5-rime")["version"] == "5.1.4-1.fc40"
+    probe_package("fcitx5-rime")
+    assert len(stubs.calls("rpm")) == 1
+
+    # 原地修改数据库文件（目录的 mtime 不变）
+    with open(stubs.databases / "rpm", "a") as f:
+        f.write("1")
+    probe_package("fcitx5-rime")
+    assert len(stubs.calls("rpm")) == 2
+
+
+@pytest.fixture
+def linux(stubs):
+    stubs.add("fcitx5")
+    stubs.add("sudo")
+    manager = LinuxRimeManager("fcitx5")
+    manager.interactive = False
+    return manager
+
+
+def test_current_install_skips_package_manager(stubs, linux):
+    stubs.add("apt")
+    stubs.add("dpkg-query", dpkg_installed("5.1.4-1"))
+    linux.install_rime()
+    assert stubs.calls("sudo") == []
+
+
+def test_outdated_install_is_upgraded(stubs, linux):
+    stubs.add("apt")
+    stubs.add("dpkg-query", dpkg_installed("1:4.9.0-1"))
+    linux.install_rime()
+    assert stubs.calls("sudo") == ["sudo -n apt-get install -y fcitx5-rime"]
+
+
+def test_outdated_install_uses_dnf_upgrade(stubs, linux):
+    stubs.add("dnf")
+    stubs.add("rpm", "4.9.0-1.fc40")
+    linux.install_rime()
+    assert stubs.calls("sudo") == ["sudo -n dnf upgrade -y fcitx5-rime"]
+
+
+def test_missing_package_is_installed(stubs, linux):
+    stubs.add("dnf")
+    stubs.add("rpm", "package fcitx5-rime is not installed", code=1)
+    linux.install_rime()
+    assert stubs.calls("sudo") == ["sudo -n dnf install -y fcitx5-rime"]
+
+
+@pytest.fixture
+def windows(stubs, tmp_path, monkeypatch):
+    program_files = tmp_path / "Program Files"
+    monkeypatch.setenv("ProgramFiles", str(program_files))
+    monkeypatch.delenv("ProgramFiles(x86)", raising=False)
+    stubs.add("winget")
+    stubs.program_files = program_files
+    manager = WindowsRimeManager()
+    manager.interactive = False
+    return manager
+
+
+def add_weasel(stubs, version):
+    install = stubs.program_files / "Rime" / f"weasel-{version}"
+    install.mkdir(parents=True)
+    (install / "WeaselDeployer.exe").touch()
+
+
+def test_weasel_current_skips_winget(stubs, windows):
+    add_weasel(stubs, "0.14.3")
+    add_weasel(stubs, "0.16.1")
+    windows.install_rime()
+    assert stubs.calls("winget") == []
+
+
+def test_weasel_outdated_is_upgraded(stubs, windows):
+    add_weasel(stubs, "0.14.3")
+    windows.install_rime()
+    [call] = stubs.calls("winget")
+    assert call.startswith("winget upgrade Rime.Weasel")
+
+
+def test_weasel_missing_is_installed(stubs, windows):
+    windows.install_rime()
+    [call] = stubs.calls("winget")
+    assert call.startswith("winget install Rime.Weasel")
+
+
+def test_stop_rime_only_kills_running_processes(stubs, windows):
+    stubs.add("taskkill")
+    stubs.add("tasklist", '"explorer.exe","1","Console","1","10 K"')
+    windows.stop_rime()
+    assert stubs.calls("taskkill") == []
+
+    stubs.add("tasklist", '"WeaselServer.exe","2","Console","1","10 K"')
+    windows.stop_rime()
+    assert stubs.calls("taskkill") == ["taskkill /F /IM WeaselServer.exe"]
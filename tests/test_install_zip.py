@@ -0,0 +1,73 @@
+import hashlib
+import zipfile
+
+import pytest
+
+import utils
+
+FILES = {
+    "default.yaml": b"schema_list: []\n",
+    "cn_dicts/8105.dict.yaml": b"---\n" * 1000,
+    "lua/date.lua": b"return 0\n",
+}
+
+
+def make_archive(path, files, top="rime-ice-main"):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for rel, data in files.items():
+            zf.writestr(f"{top}/{rel}", data)
+    return path
+
+
+@pytest.fixture(params=[True, False], ids=["blobs", "stream"])
+def store(request, blob_store):
+    """分别通过内容存储和直接流式写入安装。"""
+    blob_store.enabled = request.param
+    return blob_store
+
+
+def test_install_strips_top_directory(tmp_path, store):
+    archive = make_archive(tmp_path / "main.zip", FILES)
+    dest = tmp_path / "Rime"
+    written = set()
+
+    files = utils.install_zip(archive, dest, written=written)
+    assert files == {rel: hashlib.sha256(d).hexdigest() for rel, d in FILES.items()}
+    assert written == set(FILES)
+    for rel, data in FILES.items():
+        assert (dest / rel).read_bytes() == data
+
+
+def test_unchanged_members_are_skipped(tmp_path, store):
+    dest = tmp_path / "Rime"
+    utils.install_zip(make_archive(tmp_path / "v1.zip", FILES), dest)
+
+    updated = {**FILES, "default.yaml": b"schema_list: [rime_ice]\n"}
+    written = set()
+    files = utils.install_zip(
+        make_archive(tmp_path / "v2.zip", updated), dest, written=written
+    )
+    assert written == {"default.yaml"}
+    assert files["default.yaml"] == hashlib.sha256(updated["default.yaml"]).hexdigest()
+    assert (dest / "default.yaml").read_bytes() == updated["default.yaml"]
+
+    # plan_zip 与实际安装的判断一致
+    to_write, write_bytes, skipped, names = utils.plan_zip(tmp_path / "v2.zip", dest)
+    assert (to_write, write_bytes, skipped, names) == ([], 0, len(FILES), set(FILES))
+
+
+def test_include_limits_members(tmp_path, store):
+    archive = make_archive(tmp_path / "main.zip", FILES)
+    dest = tmp_path / "Rime"
+    files = utils.install_zip(archive, dest, include={"lua/date.lua"})
+    assert list(files) == ["lua/date.lua"]
+    assert not (dest / "default.yaml").exists()
+
+
+def test_members_outside_dest_are_ignored(tmp_path, store):
+    archive = make_archive(
+        tmp_path / "main.zip", {**FILES, "../escape.yaml": b"x"}, top="top"
+    )
+    files = utils.install_zip(archive, tmp_path / "Rime")
+    assert set(files) == set(FILES)
+    assert not (tmp_path / "escape.yaml").exists()
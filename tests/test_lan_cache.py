@@ -0,0 +1,19 @@
+import http_client
+import lan_cache
+
+
+def test_serve_uses_network_settings(monkeypatch):
+    settings = {"proxy": "http://127.0.0.1:7890", "mirrors": ["https://m.example/"]}
+    monkeypatch.setattr(lan_cache, "load_settings", lambda: settings)
+    seen = {}
+
+    def serve(*args):
+        seen["mirrors"] = http_client.mirrors([])
+        seen["proxy"] = http_client._config["proxy"]
+
+    monkeypatch.setattr(lan_cache, "serve", serve)
+    try:
+        assert lan_cache.main(["--port", "0"]) == 0
+    finally:
+        http_client.configure({})
+    assert seen == {"mirrors": ["https://m.example/"], "proxy": "http://127.0.0.1:7890"}
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import transaction
+from transaction import ConfigTransaction, list_generations, rollback
+
+
+@pytest.fixture
+def live(tmp_path):
+    live = tmp_path / "Rime"
+    (live / "build").mkdir(parents=True)
+    (live / "build" / "rime_ice.prism.bin").write_bytes(b"prism")
+    (live / "rime_ice.userdb").mkdir()
+    (live / "rime_ice.userdb" / "data").write_text("词库")
+    (live / "default.custom.yaml").write_text("patch: {}\n")
+    shared = live / "rime_ice.dict.yaml"
+    shared.write_text("v1\n")
+    # 内容存储中的对象是只读的
+    shared.chmod(0o444)
+    return live
+
+
+def replace(path, text):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def test_commit_swaps_in_staged_config(live):
+    with ConfigTransaction(live) as staged:
+        # 运行时数据不进入暂存目录
+        assert not (staged / "build").exists()
+        assert not (staged / "rime_ice.userdb").exists()
+        # 只读文件共享硬链接，可写文件复制
+        assert os.path.samefile(
+            staged / "rime_ice.dict.yaml", live / "rime_ice.dict.yaml"
+        )
+        assert not os.path.samefile(
+            staged / "default.custom.yaml", live / "default.custom.yaml"
+        )
+        replace(staged / "rime_ice.dict.yaml", "v2\n")
+        # 切换前 Rime 目录不受影响
+        assert (live / "rime_ice.dict.yaml").read_text() == "v1\n"
+
+    assert (live / "rime_ice.dict.yaml").read_text() == "v2\n"
+    assert (live / "rime_ice.userdb" / "data").read_text() == "词库"
+    assert (live / "build" / "rime_ice.prism.bin").read_bytes() == b"prism"
+    [generation] = list_generations(live)
+    assert (generation / "rime_ice.dict.yaml").read_text() == "v1\n"
+    assert not (generation / "rime_ice.userdb").exists()
+
+
+def test_error_leaves_live_untouched(live):
+    with pytest.raises(RuntimeError):
+        with ConfigTransaction(live) as staged:
+            replace(staged / "rime_ice.dict.yaml", "v2\n")
+            raise RuntimeError("下载失败")
+
+    assert (live / "rime_ice.dict.yaml").read_text() == "v1\n"
+    assert not staged.exists()
+    assert list_generations(live) == []
+
+
+def test_failed_swap_restores_runtime_data(live, monkeypatch):
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        # 运行时数据移入暂存目录之后，切换暂存目录时失败
+        if str(src).endswith("_staging"):
+            raise OSError("目录被占用")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(transaction.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        with ConfigTransaction(live) as staged:
+            replace(staged / "rime_ice.dict.yaml", "v2\n")
+    monkeypatch.undo()
+
+    assert (live / "rime_ice.dict.yaml").read_text() == "v1\n"
+    assert (live / "rime_ice.userdb" / "data").read_text() == "词库"
+    assert (live / "build" / "rime_ice.prism.bin").read_bytes() == b"prism"
+    assert not staged.exists()
+
+
+def test_rollback_switches_back_and_forth(live):
+    with ConfigTransaction(live) as staged:
+        replace(staged / "rime_ice.dict.yaml", "v2\n")
+
+    assert rollback(live) is not None
+    assert (live / "rime_ice.dict.yaml").read_text() == "v1\n"
+    # 运行时数据随当前目录移动
+    assert (live / "rime_ice.userdb" / "data").read_text() == "词库"
+    # 再次回滚即撤销上一次回滚
+    rollback(live)
+    assert (live / "rime_ice.dict.yaml").read_text() == "v2\n"
+
+
+def test_rollback_without_generations(tmp_path):
+    assert rollback(tmp_path / "Rime") is None
+
+
+def test_old_generations_are_pruned(live):
+    for i in range(4):
+        with ConfigTransaction(live, keep=2) as staged:
+            replace(staged / "rime_ice.dict.yaml", f"v{i + 2}\n")
+
+    generations = list_generations(live)
+    assert [(g / "rime_ice.dict.yaml").read_text() for g in generations] == [
+        "v3\n",
+        "v4\n",
+    ]
@@ -0,0 +1,238 @@
+"""
+事务式安装。
+
+新的配置先在 Rime 目录旁的暂存目录中生成（未变化的只读文件与当前目录共享硬链接），
+全部成功后通过目录重命名切换；中途失败时当前目录完全不受影响。
+被替换下来的目录保留为“版本”，`python main.py rollback` 可立即切回上一个版本。
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import stat
+import sys
+from pathlib import Path
+
+from rich.console import Console
+
+from instrumentation import count, traced
+from materialize import copy_file
+
+console = Console()
+
+# 保留的历史版本数量
+GENERATIONS_KEEP = 3
+# 运行时数据（用户词库、同步记录、安装信息以及 build/ 中的编译产物）由输入法直接读写，
+# 只保留一份，切换版本时随之移动，不与历史版本共享硬链接
+RUNTIME_SUFFIXES = (".userdb", ".userdb.txt")
+RUNTIME_NAMES = {"build", "sync", "installation.yaml", "user.yaml"}
+
+
+def is_runtime_data(name: str) -> bool:
+    return name in RUNTIME_NAMES or name.endswith(RUNTIME_SUFFIXES)
+
+
+def generations_dir(live: Path) -> Path:
+    return live.parent / f".{live.name}_generations"
+
+
+def list_generations(live: Path):
+    """按时间从旧到新列出保存的历史版本。"""
+    gens = generations_dir(live)
+    if not gens.exists():
+        return []
+    return sorted(p for p in gens.iterdir() if p.is_dir())
+
+
+def _new_generation_path(live: Path) -> Path:
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return generations_dir(live) / timestamp
+
+
+def _link_tree(src: Path, dest: Path):
+    """
+    复制目录树（运行时数据除外）。只读的文件（内容存储中的对象）以硬链接共享，
+    可写的文件（用户可能原地修改，Windows 上为全部文件）复制一份，
+    修改 Rime 目录中的文件不会影响历史版本。文件系统不支持硬链接时也改为复制。
+    之后对暂存目录的写入都通过“临时文件 + 重命名”完成，不会修改共享的文件。
+    """
+    for root, dirs, files in os.walk(src):
+        root = Path(root)
+        rel_root = root.relative_to(src)
+        if rel_root == Path("."):
+            dirs[:] = [d for d in dirs if not is_runtime_data(d)]
+            files = [f for f in files if not is_runtime_data(f)]
+        (dest / rel_root).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src_file, dest_file = root / name, dest / rel_root / name
+            if not os.stat(src_file).st_mode & stat.S_IWUSR:
+                try:
+                    os.link(src_file, dest_file)
+                    count(files_linked=1)
+                    continue
+                except OSError:
+                    pass
+            copy_file(src_file, dest_file, fsync=False)
+            count(files_written=1)
+
+
+def _move_runtime_data(src: Path, dest: Path):
+    """将 src 顶层的运行时数据移动到 dest（同一文件系统内重命名）。"""
+    if not src.exists():
+        return
+    for entry in src.iterdir():
+        if is_runtime_data(entry.name):
+            target = dest / entry.name
+            if target.is_dir():
+                shutil.rmtree(target)
+            elif target.exists():
+                target.unlink()
+            os.replace(entry, target)
+
+
+def _reclaim_runtime_data(src: Path, dest: Path):
+    """
+    将 src 中残留的运行时数据移回 dest，dest 中已有的同名项不覆盖。
+    用于切换失败或进程中途退出后，避免用户词库随暂存目录一起被删除。
+    """
+    if not src.exists():
+        return
+    for entry in src.iterdir():
+        if is_runtime_data(entry.name) and not (dest / entry.name).exists():
+            dest.mkdir(parents=True, exist_ok=True)
+            os.replace(entry, dest / entry.name)
+
+
+def _swap(live: Path, replacement: Path):
+    """
+    将 replacement 切换为 live，原来的 live 保存为一个新的历史版本。
+    两次同文件系统内的目录重命名，耗时与目录大小无关。
+    先把原目录整体移走，再从中移出运行时数据；任何一步失败都会把运行时数据
+    和原目录放回原处，运行时数据不会只留在 replacement 中。
+    """
+    displaced = None
+    if live.exists():
+        displaced = _new_generation_path(live)
+        displaced.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(live, displaced)
+    try:
+        if displaced is not None:
+            _move_runtime_data(displaced, replacement)
+        os.replace(replacement, live)
+    except BaseException:
+        if displaced is not None:
+            _reclaim_runtime_data(replacement, displaced)
+            os.replace(displaced, live)
+        raise
+    return displaced
+
+
+def prune_generations(live: Path, keep: int = GENERATIONS_KEEP):
+    """只保留最近 keep 个历史版本。"""
+    generations = list_generations(live)
+    for path in generations[: max(len(generations) - keep, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ConfigTransaction:
+    """
+    with ConfigTransaction(rime_dir) as staged:
+        ...  # 向 staged 写入新配置
+    正常退出时切换到新配置；出现异常时丢弃暂存目录，Rime 目录保持不变。
+    """
+
+    def __init__(self, live: Path, keep: int = GENERATIONS_KEEP):
+        self.live = Path(live)
+        self.keep = keep
+        self.staged = self.live.parent / f".{self.live.name}_staging"
+
+    @traced("transaction_stage")
+    def begin(self) -> Path:
+        if self.staged.exists():
+            # 上次运行在切换途中退出时，暂存目录中可能还留有用户词库等运行时数据
+            _reclaim_runtime_data(self.staged, self.live)
+            shutil.rmtree(self.staged)
+        if self.live.exists():
+            _link_tree(self.live, self.staged)
+        else:
+            self.staged.mkdir(parents=True)
+        return self.staged
+
+    def commit(self):
+        displaced = _swap(self.live, self.staged)
+        prune_generations(self.live, self.keep)
+        if displaced is not None:
+            console.print(
+                "[dim]已切换到新配置，上一版本可通过 `python main.py rollback` 恢复。[/dim]"
+            )
+
+    def abort(self):
+        shutil.rmtree(self.staged, ignore_errors=True)
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.commit()
+            except BaseException:
+                _reclaim_runtime_data(self.staged, self.live)
+                self.abort()
+                console.print("[yellow]安装未完成，Rime 目录保持原样。[/yellow]")
+                raise
+        else:
+            self.abort()
+            console.print("[yellow]安装未完成，Rime 目录保持原样。[/yellow]")
+        return False
+
+
+@traced("rollback")
+def rollback(live: Path) -> Path | None:
+    """
+    切回最近的历史版本，当前配置本身也会保存为一个历史版本，
+    因此再次回滚即可撤销本次回滚。没有历史版本时返回 None。
+    """
+    generations = list_generations(live)
+    if not generations:
+        return None
+    previous = generations[-1]
+    _swap(live, previous)
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py rollback",
+        description="将 Rime 配置目录切回事务式安装前的版本。",
+    )
+    parser.add_argument("--list", action="store_true", help="只列出保存的历史版本")
+    parser.add_argument("--dir", help="Rime 配置目录，默认为当前平台的目录")
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        live = Path(args.dir)
+    else:
+        from rime_manager import get_manager
+
+        live = get_manager().get_config_dir()
+
+    if args.list:
+        generations = list_generations(live)
+        if not generations:
+            console.print("[dim]没有保存的历史版本。[/dim]")
+        for path in generations:
+            console.print(path.name)
+        return 0
+
+    previous = rollback(live)
+    if previous is None:
+        console.print(f"[yellow]{live} 没有可回滚的历史版本。[/yellow]")
+        return 1
+    console.print(f"[green]已回滚到 {previous.name} 的版本，请重新部署 Rime。[/green]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
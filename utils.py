@@ -1,73 +1,429 @@
-import shutil
-import zipfile
-import httpx
 import datetime
+import hashlib
+import os
+import queue
+import shutil
+import threading
 import time
-from pathlib import Path
-from rich.progress import Progress
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
 from rich.console import Console
 
+from blob_store import blobs
+from http_client import get_client, transfer_errors
+from instrumentation import annotate, count, current_span, traced
+from integrity import IntegrityError
+from materialize import Materializer, atomic_writer
+from mirror_scheduler import scheduler
+
 console = Console()
 
 
-GH_MIRRORS = [
-    "https://ghproxy.net/",
-    "https://mirror.ghproxy.com/",
-]
+# 超过该大小且服务器支持 Range 时，拆分为多个分段并行下载
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+# 竞速下载时，前一个候选地址等待多久仍未响应才启动下一个（秒）
+RACE_STAGGER = 0.3
+# 分段下载边下载边校验时，排在后面的分段最多在内存中缓存多少字节等待校验
+FEED_BUFFER_LIMIT = 64 * 1024 * 1024
+
 
+def _backoff(attempt: int) -> float:
+    """重试等待时间: 0.5s, 1s, 2s ..."""
+    return min(0.5 * 2**attempt, 4.0)
 
-def download_file(url: str, dest_path: Path, max_retries: int = 3):
+
+def _race(client, urls, headers, stagger=RACE_STAGGER):
     """
-    使用进度条将文件从 URL 下载到目标路径，支持自动重试和 GitHub 镜像。
+    按顺序向候选地址发起请求，返回最先成功响应的 (url, response)。
+    前一个地址 stagger 秒内没有响应（或已失败）时才启动下一个，
+    因此历史上最快的地址通常独自完成，不必为每个镜像都建立连接。
+    其余较慢的响应到达后会被直接关闭。各地址的响应延迟会被记录。
     """
-    urls_to_try = [url]
+    results = queue.Queue()
+    lock = threading.Lock()
+    decided = False
+
+    def attempt(current_url):
+        start = time.perf_counter()
+        try:
+            request = client.build_request("GET", current_url, headers=headers)
+            response = client.send(request, stream=True, follow_redirects=True)
+        # 任何异常都要交给等待结果的调用方，否则它会一直等待
+        except Exception as e:  # noqa: BLE001
+            scheduler.record_failure(current_url)
+            results.put((current_url, None, e))
+            return
+        if response.status_code >= 400:
+            response.close()
+            scheduler.record_failure(current_url)
+            results.put(
+                (current_url, None, RuntimeError(f"HTTP {response.status_code}"))
+            )
+            return
+        scheduler.record_success(current_url, time.perf_counter() - start)
+        with lock:
+            if decided:
+                response.close()
+                return
+            results.put((current_url, response, None))
+
+    pending = list(urls)
 
-    # 如果是 GitHub 地址，添加一些镜像
-    if "github.com" in url:
-        for mirror in GH_MIRRORS:
-            urls_to_try.append(f"{mirror}{url}")
+    def start_next():
+        threading.Thread(target=attempt, args=(pending.pop(0),), daemon=True).start()
 
+    start_next()
     last_error = None
+    for _ in urls:
+        while True:
+            try:
+                current_url, response, error = results.get(
+                    timeout=stagger if pending else None
+                )
+                break
+            except queue.Empty:
+                start_next()
 
-    for attempt, current_url in enumerate(urls_to_try * max_retries):
-        try:
-            if attempt > 0:
+        if response is None:
+            last_error = error
+            console.print(f"[dim]尝试下载失败 ({current_url}): {error}[/dim]")
+            if pending:
+                start_next()
+            continue
+
+        with lock:
+            decided = True
+        # 关闭在决出胜者前已经到达的其它响应
+        while not results.empty():
+            _, other, _ = results.get_nowait()
+            if other is not None:
+                other.close()
+        return current_url, response
+
+    raise last_error
+
+
+class _OrderedFeed:
+    """
+    分段下载时按文件顺序把数据交给校验器。各分段下载的数据块在内存中排队，
+    文件开头连续的部分一到齐就交给校验器，不需要再从磁盘读回；
+    校验与其余分段的传输同时进行。
+    排在后面的分段缓存的数据超过 limit 时暂停接收，等前面的分段追上。
+    """
+
+    def __init__(self, segments, verifier, stopped, limit=FEED_BUFFER_LIMIT):
+        self.queues = [deque() for _ in range(segments)]
+        self.finished = [False] * segments
+        self.verifier = verifier
+        self.stopped = stopped
+        self.limit = limit
+        # 正在交给校验器的分段，以及其后各分段缓存的字节数
+        self.current = 0
+        self.buffered = 0
+        self.cond = threading.Condition()
+
+    def put(self, index, chunk):
+        with self.cond:
+            while (
+                index != self.current
+                and self.buffered >= self.limit
+                and not self.stopped.is_set()
+            ):
+                self.cond.wait(0.5)
+            self.queues[index].append(chunk)
+            self.buffered += len(chunk)
+            self.cond.notify_all()
+
+    def finish(self, index):
+        """该分段已全部下载。"""
+        with self.cond:
+            self.finished[index] = True
+            self.cond.notify_all()
+
+    def run(self):
+        """在调用线程中按顺序校验，直到全部完成；下载被取消时直接返回。"""
+        while self.current < len(self.queues):
+            with self.cond:
+                pending = self.queues[self.current]
+                while not pending and not self.finished[self.current]:
+                    if self.stopped.is_set():
+                        return
+                    self.cond.wait(0.5)
+                chunks = list(pending)
+                pending.clear()
+                self.buffered -= sum(map(len, chunks))
+                if not chunks:
+                    self.current += 1
+                self.cond.notify_all()
+            for chunk in chunks:
+                self.verifier.update(chunk)
+
+
+def _download_ranged(
+    client, response, dest_path, total, chunks, validator, progress, task, verifier
+):
+    """
+    将文件拆分为若干个字节区间并行下载。
+    第一个区间直接复用已建立的响应，其余区间各自发起 Range 请求，
+    中断后从已写入的位置继续。给出 verifier 时按顺序边下载边校验，
+    任一分段失败或校验失败时其余分段立即停止。
+    """
+    url = str(response.url)
+    # 工作线程没有自己的 Span，计数直接记到发起下载的 Span 上
+    span = current_span()
+    size = -(-total // chunks)
+    bounds = [(i, min(i + size, total) - 1) for i in range(0, total, size)]
+    stopped = threading.Event()
+    feed = _OrderedFeed(len(bounds), verifier, stopped) if verifier else None
+
+    with open(dest_path, "wb") as f:
+        f.truncate(total)
+
+    def fetch_range(index, start, end, first_response=None):
+        pos = start
+        resp = first_response
+        for attempt in range(3):
+            try:
+                if resp is None:
+                    range_headers = {
+                        "Accept-Encoding": "identity",
+                        "Range": f"bytes={pos}-{end}",
+                    }
+                    if validator:
+                        range_headers["If-Range"] = validator
+                    request = client.build_request("GET", url, headers=range_headers)
+                    resp = client.send(request, stream=True, follow_redirects=True)
+                    if resp.status_code != 206:
+                        raise RuntimeError(
+                            f"服务器未按 Range 返回 ({resp.status_code})"
+                        )
+
+                with open(dest_path, "r+b") as f:
+                    f.seek(pos)
+                    for chunk in resp.iter_bytes():
+                        if stopped.is_set():
+                            raise RuntimeError("下载已取消")
+                        chunk = chunk[: end + 1 - pos]
+                        f.write(chunk)
+                        pos += len(chunk)
+                        if feed is not None:
+                            feed.put(index, chunk)
+                        progress.update(task, advance=len(chunk))
+                        if span is not None:
+                            span.add(bytes_downloaded=len(chunk))
+                        if pos > end:
+                            if feed is not None:
+                                feed.finish(index)
+                            return
+                raise RuntimeError("连接提前结束")
+            except Exception as e:
+                if attempt == 2 or stopped.is_set():
+                    # 不再等待其余分段下载完
+                    stopped.set()
+                    raise
+                if span is not None:
+                    span.add(retries=1)
                 console.print(
-                    f"[yellow]重试下载 ({attempt + 1}): {current_url}[/yellow]"
+                    f"[dim]分段 {start}-{end} 中断，将从 {pos} 继续: {e}[/dim]"
                 )
+                time.sleep(_backoff(attempt))
+            finally:
+                if resp is not None:
+                    resp.close()
+                resp = None
 
-            # 设置较长的超时时间
-            timeout = httpx.Timeout(30.0, connect=10.0)
+    with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+        futures = [
+            pool.submit(fetch_range, i, start, end, response if i == 0 else None)
+            for i, (start, end) in enumerate(bounds)
+        ]
+        if feed is not None:
+            try:
+                feed.run()
+            except BaseException:
+                stopped.set()
+                raise
+        for future in futures:
+            future.result()
 
-            with httpx.stream(
-                "GET", current_url, follow_redirects=True, timeout=timeout
-            ) as response:
-                response.raise_for_status()
-                total = int(response.headers.get("Content-Length", 0))
 
-                with open(dest_path, "wb") as f:
-                    with Progress() as progress:
-                        task = progress.add_task(
-                            f"[cyan]正在下载 {dest_path.name}...", total=total
+@traced("download_file")
+def download_file(
+    url: str,
+    dest_path: Path,
+    max_retries: int = 3,
+    headers: dict | None = None,
+    chunks: int = 4,
+    size_hint: int | None = None,
+    verify=None,
+):
+    """
+    使用进度条将文件从 URL 下载到目标路径。
+    源地址和 GitHub 镜像按预计完成时间依次竞速，使用最先响应的一个
+    （size_hint 为预计文件大小，用于估算完成时间）；
+    连接中断后通过 Range 请求从断点继续；
+    大文件在服务器支持 Range 时拆分为 chunks 个分段并行下载。
+    headers 会附加到首个请求上（例如条件请求头）。
+    verify 为函数，接收响应头并返回 integrity.StreamVerifier，下载的数据在写入的同时交给它校验；
+    内容校验失败的地址立即被放弃（不等待、不续传），换下一个地址重新下载。
+    返回响应头；如果服务器返回 304 Not Modified，则不写入文件并返回 None。
+    """
+    annotate(url=url, dest=str(dest_path))
+    # 禁用压缩，保证 Content-Length 与 Range 偏移都对应原始字节
+    base_headers = {"Accept-Encoding": "identity"}
+    headers = {**base_headers, **(headers or {})}
+
+    last_error = None
+    resp_headers = None
+    validator = None
+    served_url = None
+    written = 0
+    verifier = None
+    # 本次下载中返回过错误内容的地址
+    rejected = set()
+    # 可以换地址或重试的异常，其它异常（程序错误）直接抛出
+    errors = transfer_errors()
+
+    from rich.progress import Progress
+
+    # 共享客户端：重试、断点续传和分段请求复用已建立的连接
+    client = get_client()
+
+    with Progress() as progress:
+        task = progress.add_task(f"[cyan]正在下载 {dest_path.name}...", total=None)
+
+        for attempt in range(max_retries):
+            request_headers = dict(headers)
+            # 每次尝试重新排序，期间被熔断的地址不再参与
+            candidates = [
+                u for u in scheduler.candidates(url, size_hint) if u not in rejected
+            ]
+            if not candidates:
+                break
+            if attempt > 0:
+                count(retries=1)
+                if not isinstance(last_error, IntegrityError):
+                    time.sleep(_backoff(attempt - 1))
+                if written and served_url:
+                    # 断点续传: 只向提供前半部分内容的地址请求剩余字节
+                    console.print(
+                        f"[yellow]从 {written} 字节处继续下载 ({attempt + 1}): {served_url}[/yellow]"
+                    )
+                    candidates = [served_url]
+                    request_headers = {**base_headers, "Range": f"bytes={written}-"}
+                    if validator:
+                        request_headers["If-Range"] = validator
+                else:
+                    console.print(f"[yellow]重试下载 ({attempt + 1}): {url}[/yellow]")
+
+            try:
+                served_url, response = _race(client, candidates, request_headers)
+            except errors as e:
+                last_error = e
+                written, served_url = 0, None
+                continue
+
+            started = time.perf_counter()
+            try:
+                if response.status_code == 304:
+                    console.print(f"[green]远程文件未变化: {dest_path.name}[/green]")
+                    return None
+
+                if response.status_code != 206 or not written:
+                    # 全新的完整响应，从头写入
+                    written = 0
+                    resp_headers = response.headers
+                    validator = resp_headers.get("ETag") or resp_headers.get(
+                        "Last-Modified"
+                    )
+                    total = int(resp_headers.get("Content-Length", 0))
+                    progress.update(task, total=total or None, completed=0)
+                    verifier = verify(resp_headers) if verify else None
+
+                    if (
+                        chunks > 1
+                        and total >= PARALLEL_MIN_BYTES
+                        and resp_headers.get("Accept-Ranges") == "bytes"
+                    ):
+                        _download_ranged(
+                            client,
+                            response,
+                            dest_path,
+                            total,
+                            chunks,
+                            validator,
+                            progress,
+                            task,
+                            verifier,
                         )
-                        for chunk in response.iter_bytes():
-                            f.write(chunk)
-                            progress.update(task, advance=len(chunk))
+                        if verifier is not None:
+                            verifier.finish()
+                        scheduler.record_transfer(
+                            served_url, total, time.perf_counter() - started
+                        )
+                        console.print(f"[green]成功下载: {dest_path}[/green]")
+                        return resp_headers
 
-            console.print(f"[green]成功下载: {dest_path}[/green]")
-            return  # 下载成功，退出函数
+                resumed_from = written
+                with open(dest_path, "ab" if written else "wb") as f:
+                    for chunk in response.iter_bytes():
+                        f.write(chunk)
+                        written += len(chunk)
+                        if verifier is not None:
+                            verifier.update(chunk)
+                        progress.update(task, advance=len(chunk))
+                        count(bytes_downloaded=len(chunk))
 
-        except Exception as e:
-            last_error = e
-            console.print(f"[dim]尝试下载失败 ({current_url}): {e}[/dim]")
-            if attempt < (len(urls_to_try) * max_retries) - 1:
-                time.sleep(2)  # 等待一会儿再重试
-            continue
+                total = int(resp_headers.get("Content-Length", 0))
+                if total and written < total:
+                    raise RuntimeError(f"下载不完整 ({written}/{total})")
+                if verifier is not None:
+                    verifier.finish()
+
+                scheduler.record_transfer(
+                    served_url, written - resumed_from, time.perf_counter() - started
+                )
+                console.print(f"[green]成功下载: {dest_path}[/green]")
+                return resp_headers  # 下载成功，退出函数
+
+            except IntegrityError as e:
+                # 内容有误：不从断点续传，本次下载不再使用该地址
+                last_error = e
+                written = 0
+                rejected.add(served_url)
+                scheduler.record_failure(served_url)
+                count(integrity_failures=1)
+                console.print(
+                    f"[yellow]{served_url} 返回的内容校验失败，改用其它地址: {e}[/yellow]"
+                )
+            except errors as e:
+                last_error = e
+                scheduler.record_failure(served_url)
+                console.print(f"[dim]尝试下载失败 ({served_url}): {e}[/dim]")
+            finally:
+                response.close()
 
     console.print(f"[red]所有下载尝试均失败: {url}[/red]")
     raise last_error
 
 
+def remote_size(url: str):
+    """
+    通过 HEAD 请求获取远程文件大小，服务器未提供或请求失败时返回 None。
+    """
+    try:
+        response = get_client().head(url, timeout=10.0)
+        response.raise_for_status()
+        return int(response.headers["Content-Length"])
+    except (KeyError, *transfer_errors()):
+        return None
+
+
+@traced("extract_zip")
 def extract_zip(zip_path: Path, extract_to: Path):
     """
     将 Zip 文件解压到指定目录。
@@ -75,22 +431,389 @@ def extract_zip(zip_path: Path, extract_to: Path):
     try:
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
             zip_ref.extractall(extract_to)
+            infos = [i for i in zip_ref.infolist() if not i.is_dir()]
+            count(
+                files_written=len(infos), bytes_written=sum(i.file_size for i in infos)
+            )
         console.print(f"[green]成功解压到: {extract_to}[/green]")
     except Exception as e:
         console.print(f"[red]解压失败 {zip_path}: {e}[/red]")
         raise
 
 
-def backup_dir(target_dir: Path):
+def file_sha256(path: Path) -> str:
+    """
+    计算文件内容的 SHA-256 摘要。
     """
-    如果目标目录存在，则通过重命名（添加时间戳）来备份该目录。
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def zip_members(zip_ref: zipfile.ZipFile):
+    """
+    遍历 Zip 中的文件成员，返回 (相对路径, ZipInfo)。
+    GitHub 归档会带一个顶层目录 (如 rime-ice-main/)，这里将其去掉。
+    """
+    infos = [i for i in zip_ref.infolist() if not i.is_dir()]
+    tops = {i.filename.split("/", 1)[0] for i in infos}
+    strip = len(tops) == 1 and all("/" in i.filename for i in infos)
+
+    for info in infos:
+        rel = info.filename.split("/", 1)[1] if strip else info.filename
+        parts = PurePosixPath(rel).parts
+        # 跳过空路径以及可能越出目标目录的成员
+        if not parts or rel.startswith("/") or ".." in parts:
+            continue
+        yield rel, info
+
+
+def _file_crc_sha256(path: Path):
     """
+    一次读取同时计算文件的 CRC32 与 SHA-256。
+    """
+    crc = 0
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            crc = zlib.crc32(block, crc)
+            h.update(block)
+    return crc, h.hexdigest()
+
+
+def extract_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path):
+    """
+    将单个 Zip 成员写入目标路径（父目录需已存在），返回内容的 SHA-256。
+    内容先存入内容寻址存储再硬链接过去，存储中已有相同内容时不再写入；
+    存储不可用时流式写入临时文件、落盘后再原子重命名。
+    """
+    if blobs.enabled:
+        digest = blobs.write(dest, zip_ref.read(info))
+        count(files_written=1)
+        return digest
+
+    h = hashlib.sha256()
+    with zip_ref.open(info) as src, atomic_writer(dest) as f:
+        for block in iter(lambda: src.read(1024 * 1024), b""):
+            h.update(block)
+            f.write(block)
+    count(files_written=1, bytes_written=info.file_size)
+    return h.hexdigest()
+
+
+def _unchanged_digest(info: zipfile.ZipInfo, dest: Path):
+    """
+    磁盘上的文件与 Zip 成员大小和 CRC 都一致时返回其 SHA-256，否则返回 None。
+    """
+    if dest.is_file() and dest.stat().st_size == info.file_size:
+        crc, digest = _file_crc_sha256(dest)
+        if crc == info.CRC:
+            return digest
+    return None
+
+
+def plan_zip(zip_path: Path, dest_dir: Path, include=None):
+    """
+    不写入任何文件，只计算 install_zip 将要写入和跳过的成员。
+    返回 (需要写入的相对路径列表, 写入字节数, 跳过数量, 全部相对路径集合)。
+    """
+    to_write, write_bytes, skipped, files = [], 0, 0, set()
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for rel, info in zip_members(zip_ref):
+            if include is not None and rel not in include:
+                continue
+            files.add(rel)
+            if _unchanged_digest(info, dest_dir / rel) is not None:
+                skipped += 1
+            else:
+                to_write.append(rel)
+                write_bytes += info.file_size
+    return to_write, write_bytes, skipped, files
+
+
+@traced("install_zip")
+def install_zip(zip_path: Path, dest_dir: Path, include=None, written=None):
+    """
+    不经过临时目录，直接将 Zip 成员写入 dest_dir（去掉 GitHub 归档的顶层目录）。
+    大小和 CRC 与磁盘上现有文件一致的成员会被跳过。
+    include 不为 None 时只安装其中列出的相对路径。
+    各成员的比较和写入在线程池中并发进行。
+    written 不为 None 时，实际写入的相对路径会加入其中。
+    返回 {相对路径: SHA-256}，可直接用作安装清单。
+    """
+    annotate(archive=str(zip_path), dest=str(dest_dir))
+    files = {}
+    written_count = skipped = 0
+
+    def install_member(member):
+        rel, info = member
+        dest = dest_dir / rel
+        digest = _unchanged_digest(info, dest)
+        if digest is not None:
+            count(files_skipped=1)
+            return rel, digest, False
+        return rel, extract_member(zip_ref, info, dest), True
+
+    try:
+        with (
+            zipfile.ZipFile(zip_path, "r") as zip_ref,
+            Materializer() as materializer,
+        ):
+            members = [
+                (rel, info)
+                for rel, info in zip_members(zip_ref)
+                if include is None or rel in include
+            ]
+            materializer.makedirs(dest_dir / rel for rel, _ in members)
+            for rel, digest, wrote in materializer.map(install_member, members):
+                files[rel] = digest
+                if wrote:
+                    written_count += 1
+                    if written is not None:
+                        written.add(rel)
+                else:
+                    skipped += 1
+    except Exception as e:
+        console.print(f"[red]安装失败 {zip_path}: {e}[/red]")
+        raise
+    console.print(
+        f"[dim]已写入 {written_count} 个文件，跳过 {skipped} 个未变化的文件。[/dim]"
+    )
+    return files
+
+
+# 快照备份目录中的标记文件，用于找到上一次的完整快照
+SNAPSHOT_MARKER = ".rime_auto_deploy_snapshot"
+# 快照中不包含的目录（部署时可重新生成）
+SNAPSHOT_EXCLUDE = {"build"}
+# 默认保留最近的备份数量
+BACKUP_KEEP = 10
+
+# Linux 下的 FICLONE ioctl，用于在 btrfs/xfs 等文件系统上创建 reflink
+_FICLONE = 0x40049409
+
+
+def _reflink_or_copy(src: Path, dest: Path):
+    """
+    文件系统支持时使用 reflink（写时复制）克隆文件，否则普通复制。
+    """
+    try:
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dest)
+    except (ImportError, OSError):
+        shutil.copy2(src, dest)
+
+
+def _list_backups(target_dir: Path, kind: str = "backup"):
+    """按时间从旧到新列出 target_dir 的 {目录名}_{kind}_{时间} 备份目录。"""
+    prefix = f"{target_dir.name}_{kind}_"
+    return sorted(p for p in target_dir.parent.glob(f"{prefix}*") if p.is_dir())
+
+
+def unique_backup_path(target_dir: Path, kind: str = "backup") -> Path:
+    """
+    新备份目录的路径 {目录名}_{kind}_{时间}，同一秒内已有备份时加序号。
+    序号总是大于同一秒内已有的序号（即使较早的备份已被清理），按名称排序即按创建顺序。
+    kind 为 "backup"（完整快照）或 "partial_backup"（增量更新时只备份被替换的文件）。
+    """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = f"{target_dir.name}_{kind}_{timestamp}"
+    existing = [p.name[len(name) :] for p in target_dir.parent.glob(f"{name}*")]
+    if not existing:
+        return target_dir.parent / name
+    suffixes = [int(s[1:]) for s in existing if s[1:].isdigit()]
+    return target_dir.parent / f"{name}_{max(suffixes, default=0) + 1:03d}"
+
+
+def _previous_snapshot(target_dir: Path) -> Path | None:
+    """最近一个完整的快照备份（中途失败的备份没有标记文件）。"""
+    for path in reversed(_list_backups(target_dir)):
+        if (path / SNAPSHOT_MARKER).exists():
+            return path
+    return None
+
+
+def _snapshot_actions(target_dir: Path, previous: Path | None, shared=None):
+    """
+    逐项决定快照的写法，产生 (相对路径, 源路径, 方式)：
+    "dir" 为目录；"previous" 与上一个快照中大小和修改时间都相同，直接链接过去；
+    "shared" 为内容存储中未被修改的对象，直接链接；"copy" 需要复制。
+    shared 为 {相对路径（POSIX 形式）: SHA-256}，链接前会再次确认文件仍是完好的对象，
+    其余文件（包括被原地修改过的）一律复制，备份不会与可能被修改的文件共享 inode。
+    """
+    for root, dirs, files in os.walk(target_dir):
+        root = Path(root)
+        rel_root = root.relative_to(target_dir)
+        if rel_root == Path("."):
+            dirs[:] = [d for d in dirs if d not in SNAPSHOT_EXCLUDE]
+        yield rel_root, root, "dir"
+
+        for name in files:
+            rel = rel_root / name
+            src = root / name
+            if previous is not None:
+                try:
+                    st, old_st = src.stat(), (previous / rel).stat()
+                    if (
+                        st.st_size == old_st.st_size
+                        and st.st_mtime_ns == old_st.st_mtime_ns
+                    ):
+                        yield rel, src, "previous"
+                        continue
+                except OSError:
+                    pass
+            if shared and blobs.holds(shared.get(rel.as_posix()), src):
+                yield rel, src, "shared"
+            else:
+                yield rel, src, "copy"
+
+
+def _removed_since(previous: Path, seen) -> bool:
+    """上一个快照中是否有现在已删除的文件。"""
+    for root, _, files in os.walk(previous):
+        rel_root = Path(root).relative_to(previous)
+        for name in files:
+            if rel_root / name not in seen and name != SNAPSHOT_MARKER:
+                return True
+    return False
+
+
+def _snapshot(
+    target_dir: Path, snapshot_path: Path, previous: Path | None, shared=None
+):
+    """
+    将 target_dir 复制为快照。与上一个快照中大小和修改时间都相同的文件
+    直接硬链接过去（类似 rsync --link-dest），其余文件以 reflink 或复制方式写入。
+    shared 见 _snapshot_actions，其中完好的内容存储对象直接硬链接。
+    返回 True 表示快照与上一个完全相同。
+    """
+    identical = previous is not None
+    seen = set()
+
+    for rel, src, action in _snapshot_actions(target_dir, previous, shared):
+        dest = snapshot_path / rel
+        if action == "dir":
+            dest.mkdir(parents=True, exist_ok=True)
+            continue
+        seen.add(rel)
+        if action == "previous":
+            try:
+                os.link(previous / rel, dest)
+                count(files_linked=1)
+                continue
+            except OSError:
+                pass
+        identical = False
+        if action == "shared":
+            try:
+                os.link(src, dest)
+                count(files_linked=1)
+                continue
+            except OSError:
+                pass
+        _reflink_or_copy(src, dest)
+        count(files_written=1, bytes_written=dest.stat().st_size)
+
+    return identical and not _removed_since(previous, seen)
+
+
+def plan_backup(target_dir: Path, shared=None):
+    """
+    不写入，估算 backup_dir 创建快照时的文件操作：
+    返回 {"files", "link", "copy", "bytes", "new_backup"}，
+    bytes 只计需要复制的文件；new_backup=False 表示与上次快照相同，不会产生新备份。
+    """
+    plan = {"files": 0, "link": 0, "copy": 0, "bytes": 0, "new_backup": False}
+    if not target_dir.exists():
+        return plan
+    previous = _previous_snapshot(target_dir)
+    seen = set()
+    for rel, src, action in _snapshot_actions(target_dir, previous, shared):
+        if action == "dir":
+            continue
+        seen.add(rel)
+        plan["files"] += 1
+        if action == "copy":
+            plan["copy"] += 1
+            plan["bytes"] += src.stat().st_size
+        else:
+            plan["link"] += 1
+        if action != "previous":
+            plan["new_backup"] = True
+    if previous is None or _removed_since(previous, seen):
+        plan["new_backup"] = True
+    if not plan["new_backup"]:
+        plan.update(link=0, copy=0, bytes=0)
+    return plan
+
+
+def prune_backups(
+    target_dir: Path, keep: int | None = BACKUP_KEEP, keep_days=None, kind="backup"
+):
+    """
+    清理旧备份：只保留最近 keep 个，并删除超过 keep_days 天的备份。
+    最新的一个备份总是保留。kind="backup" 时只计入完整的快照（带标记文件），
+    其它同名前缀的目录不参与计数，也不会被清理。
+    """
+    backups = _list_backups(target_dir, kind)
+    if kind == "backup":
+        backups = [p for p in backups if (p / SNAPSHOT_MARKER).exists()]
+    cutoff = None
+    if keep_days is not None:
+        cutoff = time.time() - keep_days * 86400
+
+    for i, path in enumerate(backups[:-1]):
+        too_many = keep is not None and len(backups) - i > keep
+        too_old = cutoff is not None and path.stat().st_mtime < cutoff
+        if too_many or too_old:
+            shutil.rmtree(path, ignore_errors=True)
+            console.print(f"[dim]已清理旧备份: {path.name}[/dim]")
+
+
+@traced("backup_dir")
+def backup_dir(
+    target_dir: Path,
+    snapshot: bool = True,
+    keep: int | None = BACKUP_KEEP,
+    keep_days=None,
+    shared=None,
+):
+    """
+    备份目标目录。
+    snapshot=True 时创建快照备份：原目录保持不动（build/ 与用户词库不受影响），
+    未变化的文件硬链接到上一个快照，与上一个快照完全相同时不产生新备份；
+    shared 为已安装文件的 {相对路径: SHA-256}，其中仍是完好存储对象的文件直接硬链接而不复制。
+    snapshot=False 时沿用旧行为，通过重命名（添加时间戳）将整个目录移走。
+    """
+    annotate(target=str(target_dir), snapshot=snapshot)
     if target_dir.exists():
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = target_dir.parent / f"{target_dir.name}_backup_{timestamp}"
+        backup_path = unique_backup_path(target_dir)
         try:
-            shutil.move(str(target_dir), str(backup_path))
-            console.print(f"[yellow]已将现有配置备份至: {backup_path}[/yellow]")
+            if snapshot:
+                previous = _previous_snapshot(target_dir)
+                try:
+                    identical = _snapshot(target_dir, backup_path, previous, shared)
+                except BaseException:
+                    shutil.rmtree(backup_path, ignore_errors=True)
+                    raise
+                if identical:
+                    shutil.rmtree(backup_path)
+                    console.print(
+                        f"[dim]配置与上次备份相同，沿用已有备份: {previous}[/dim]"
+                    )
+                    return
+                (backup_path / SNAPSHOT_MARKER).touch()
+                console.print(
+                    f"[yellow]已创建现有配置的快照备份: {backup_path}[/yellow]"
+                )
+            else:
+                shutil.move(str(target_dir), str(backup_path))
+                console.print(f"[yellow]已将现有配置备份至: {backup_path}[/yellow]")
         except PermissionError:
             console.print("[bold red]备份失败: 权限被拒绝。[/bold red]")
             console.print(
@@ -100,5 +823,6 @@ def backup_dir(target_dir: Path):
         except Exception as e:
             console.print(f"[red]备份失败 {target_dir}: {e}[/red]")
             raise
+        prune_backups(target_dir, keep=keep, keep_days=keep_days)
     else:
         console.print(f"[dim]未在 {target_dir} 发现现有目录，跳过备份。[/dim]")
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import yaml
+
+from instrumentation import count
+from materialize import atomic_write
+
+# 记录每个生成文件的输入指纹与输出状态，用于跳过未变化的同步
+MERGE_CACHE_NAME = ".rime_auto_deploy_merge_cache.json"
+
+
+class PatchDocument:
+    """
+    一个 Rime *.custom.yaml 文件的结构化表示。
+    原始文本会被保留：只有 patch 内容实际发生变化时才重新序列化，
+    因此不需要注入的文件会原样保留注释和格式。
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        data = yaml.safe_load(text) if text.strip() else None
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            raise ValueError("custom.yaml 顶层必须是映射")
+        self.data = data
+        self.modified = False
+
+    @classmethod
+    def load(cls, path: Path):
+        """读取文件；文件不存在时返回空文档。"""
+        if not path.exists():
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read())
+
+    @property
+    def patch(self):
+        patch = self.data.get("patch")
+        if not isinstance(patch, dict):
+            patch = {}
+            self.data["patch"] = patch
+        return patch
+
+    def setdefault(self, key, value):
+        """
+        patch 中没有 key 时写入 value，返回 True 表示有修改。
+        """
+        if key in self.patch:
+            return False
+        self.patch[key] = value
+        self.modified = True
+        return True
+
+    def set(self, key, value):
+        """
+        将 patch 中的 key 设为 value，返回 True 表示有修改。
+        """
+        if self.patch.get(key) == value:
+            return False
+        self.patch[key] = value
+        self.modified = True
+        return True
+
+    def dump(self) -> str:
+        """
+        输出文件内容。未修改时返回原始文本，否则按固定规则序列化。
+        """
+        if not self.modified:
+            return self.text
+        return yaml.safe_dump(
+            self.data,
+            allow_unicode=True,
+            default_flow_style=False,
+            sort_keys=False,
+        )
+
+
+def write_if_changed(path: Path, content: str, dry_run=False) -> bool:
+    """
+    内容的 SHA-256 与磁盘上的文件一致时不写入（保持原 mtime），
+    否则写入临时文件、落盘后原子替换。返回 True 表示发生了（或 dry_run 时将会发生）写入。
+    """
+    data = content.encode("utf-8")
+    if path.is_file() and path.stat().st_size == len(data):
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    if dry_run:
+        return True
+
+    atomic_write(path, data)
+    count(files_written=1, bytes_written=len(data))
+    return True
+
+
+class MergeCache:
+    """
+    记录每个目标文件由哪些输入生成，以及生成后的大小和 mtime。
+    输入与目标文件都没有变化时，无需再次读取、解析或比较内容。
+    """
+
+    def __init__(self, rime_config_dir: Path):
+        self.path = rime_config_dir / MERGE_CACHE_NAME
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        self.dirty = False
+
+    @staticmethod
+    def key(source: Path | None, *params):
+        """由源文件的大小、mtime 以及合并参数组成输入指纹。"""
+        parts = [str(p) for p in params]
+        if source is not None:
+            st = source.stat()
+            parts += [source.name, str(st.st_size), str(st.st_mtime_ns)]
+        return "|".join(parts)
+
+    def fresh(self, dest: Path, key: str) -> bool:
+        entry = self.entries.get(dest.name)
+        if entry is None or entry["key"] != key or not dest.exists():
+            return False
+        st = dest.stat()
+        return entry["stat"] == [st.st_size, st.st_mtime_ns]
+
+    def record(self, dest: Path, key: str):
+        st = dest.stat()
+        self.entries[dest.name] = {"key": key, "stat": [st.st_size, st.st_mtime_ns]}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = False